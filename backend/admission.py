@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+from typing import Optional
+
+import jwt
+from starlette.routing import compile_path
+
+import config
+import db
+from cache import TTLCache
+from metrics import prometheus_counter
+from serialization import FastJSONResponse
+
+# Допуск запросов до обработчика: token bucket на клиента (пользователь из JWT или IP) — общий и для
+# отдельных маршрутов (429 + Retry-After), и предел одновременно выполняемых запросов воркера: при его
+# достижении запрос ждёт не дольше ADMISSION_QUEUE_TIMEOUT_MS и получает 503, а не висит в очереди
+# pool.acquire(). Хранилище счётчиков подключаемое: memory (в воркере) или postgres (общее, таблица
+# rate_limits из миграции 0010). Если хранилище не ответило вовремя, запрос пропускается.
+
+logger = logging.getLogger(__name__)
+
+# Без ограничения числа одновременных запросов: проверка доступности для балансировщика и поток SSE,
+# который не держит соединение с БД
+IN_FLIGHT_EXEMPT = {"/health", "/appointments/stream"}
+RATE_LIMIT_EXEMPT = {"/health"}
+UNMATCHED_ROUTE = "unmatched"
+PRUNE_INTERVAL = 600
+
+
+def parse_limit(value: str) -> tuple:
+    # "20/40" -> (20.0 запросов в секунду, запас 40)
+    rate, burst = value.split("/")
+    return float(rate), float(burst)
+
+
+def parse_routes(value: str) -> dict:
+    # "POST /auth/login=1/10; GET /cars=10/20" -> {"POST /auth/login": (1.0, 10.0), ...}
+    rules = {}
+    for item in (part.strip() for part in value.split(";")):
+        if item:
+            route, limit = item.rsplit("=", 1)
+            rules[" ".join(route.split())] = parse_limit(limit)
+    return rules
+
+
+DEFAULT_LIMIT = parse_limit(config.RATE_LIMIT_DEFAULT)
+ROUTE_LIMITS = parse_routes(config.RATE_LIMIT_ROUTES)
+
+stats = Counter()
+limited_by_rule = Counter()
+_in_flight = 0
+_slots = asyncio.Semaphore(config.ADMISSION_MAX_IN_FLIGHT)
+_routes = TTLCache(4096, ttl=3600)
+_table = None
+
+
+class MemoryBackend:
+    # Счётчики в памяти воркера. Запросы клиента расходятся по WEB_CONCURRENCY воркерам, поэтому
+    # скорость и запас каждого воркера — доля от общего лимита
+    def __init__(self):
+        self.buckets = TTLCache(config.RATE_LIMIT_KEYS_MAX, ttl=3600)
+        self.share = max(config.WEB_CONCURRENCY, 1)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> tuple:
+        rate = rate / self.share
+        burst = max(burst / self.share, cost)
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self.buckets.set(key, (tokens, now))
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class PostgresBackend:
+    # Общие для всех воркеров счётчики: один вызов rate_limit_take на ключ через отдельный маленький пул,
+    # чтобы проверка лимита не стояла в очереди основного пула, который она и защищает
+    def __init__(self):
+        self.pool = None
+        self.next_prune = 0.0
+
+    async def start(self):
+        self.pool = await db.create_pool(min_size=1, max_size=config.RATE_LIMIT_POOL_MAX_SIZE)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> tuple:
+        row = await self.pool.fetchrow(
+            "SELECT allowed, tokens FROM rate_limit_take($1, $2, $3, $4)", key, rate, burst, cost
+        )
+        if time.monotonic() >= self.next_prune:
+            self.next_prune = time.monotonic() + PRUNE_INTERVAL
+            asyncio.create_task(self.prune())
+        return row["allowed"], 0.0 if row["allowed"] else (cost - row["tokens"]) / rate
+
+    async def prune(self):
+        # полностью восстановившиеся корзины не отличаются от отсутствующих
+        try:
+            await self.pool.execute("DELETE FROM rate_limits WHERE updated_at < now() - interval '1 hour'")
+        except Exception:
+            logger.exception("Не удалось очистить rate_limits")
+
+
+BACKENDS = {"memory": MemoryBackend, "postgres": PostgresBackend}
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[config.RATE_LIMIT_BACKEND]()
+    return _backend
+
+
+async def start():
+    await backend().start()
+
+
+async def close():
+    await backend().close()
+
+
+def identity(scope) -> str:
+    # Пользователь из подписанного токена, без обращения к БД; без токена (или с негодным) — IP
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                payload = jwt.decode(value[7:].decode(), config.SECRET_KEY, algorithms=[config.ALGORITHM])
+                return f"user:{payload.get('uid') or payload.get('sub')}"
+            except Exception:
+                break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def _route_table(app) -> list:
+    # Шаблоны маршрутов с префиксами роутеров из схемы OpenAPI: в отличие от app.router.routes
+    # (вложенные роутеры там — служебные обёртки) не зависит от внутреннего устройства FastAPI.
+    # Порядок — порядок регистрации, как и при маршрутизации. В схему не попадают маршруты с
+    # include_in_schema=False: такие маршруты верхнего уровня (/docs, /openapi.json) добавляются из
+    # app.router.routes, а внутри подключённых роутеров они остаются в корзине UNMATCHED_ROUTE —
+    # для лимитов по маршруту им нужен include_in_schema=True.
+    global _table
+    if _table is None:
+        _table = [
+            (compile_path(path)[0], {method.upper() for method in operations}, path)
+            for path, operations in app.openapi()["paths"].items()
+        ]
+        documented = {template for _, _, template in _table}
+        _table += [
+            (compile_path(route.path)[0], set(route.methods), route.path)
+            for route in app.router.routes
+            if getattr(route, "methods", None) and getattr(route, "path", None) and route.path not in documented
+        ]
+    return _table
+
+
+def route_path(scope) -> str:
+    # Шаблон маршрута ("/cars/{car_id}") ещё до маршрутизации: middleware выполняется раньше роутера
+    method = "GET" if scope["method"] == "HEAD" else scope["method"]
+    key = (method, scope["path"])
+    path = _routes.get(key)
+    if path is None:
+        path = UNMATCHED_ROUTE
+        for regex, methods, template in _route_table(scope["app"]):
+            if method in methods and regex.match(scope["path"]):
+                path = template
+                break
+        _routes.set(key, path)
+    return path
+
+
+async def check_rate(scope, route: str) -> Optional[float]:
+    # None — запрос допущен, иначе через сколько секунд повторить
+    who = identity(scope)
+    rule = f"{scope['method']} {route}"
+    checks = [("default", who, DEFAULT_LIMIT)]
+    if rule in ROUTE_LIMITS:
+        checks.append((rule, f"{rule}|{who}", ROUTE_LIMITS[rule]))
+    retry_after = None
+    for name, key, (rate, burst) in checks:
+        try:
+            allowed, wait = await asyncio.wait_for(
+                backend().take(key, rate, burst), config.RATE_LIMIT_BACKEND_TIMEOUT
+            )
+        except Exception:
+            stats["backend_errors"] += 1
+            continue
+        if not allowed:
+            limited_by_rule[name] += 1
+            retry_after = max(retry_after or 0.0, wait)
+    return retry_after
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> FastJSONResponse:
+    return FastJSONResponse(
+        {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        route = route_path(scope)
+        if config.RATE_LIMIT_ENABLED and route not in RATE_LIMIT_EXEMPT:
+            retry_after = await check_rate(scope, route)
+            if retry_after is not None:
+                stats["rate_limited"] += 1
+                response = _reject(429, "Слишком много запросов, повторите позже", retry_after)
+                return await response(scope, receive, send)
+        if route in IN_FLIGHT_EXEMPT:
+            return await self.app(scope, receive, send)
+        if _slots.locked():
+            try:
+                await asyncio.wait_for(_slots.acquire(), config.ADMISSION_QUEUE_TIMEOUT_MS / 1000)
+            except asyncio.TimeoutError:
+                stats["shed"] += 1
+                response = _reject(503, "Сервер перегружен, повторите позже", config.ADMISSION_RETRY_AFTER)
+                return await response(scope, receive, send)
+        else:
+            await _slots.acquire()
+        stats["admitted"] += 1
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight -= 1
+            _slots.release()
+
+
+def snapshot() -> dict:
+    return {
+        **stats,
+        "in_flight": _in_flight,
+        "max_in_flight": config.ADMISSION_MAX_IN_FLIGHT,
+        "backend": config.RATE_LIMIT_BACKEND,
+        "limited_by_rule": dict(limited_by_rule),
+    }
+
+
+def prometheus() -> str:
+    lines = []
+    lines += prometheus_counter(
+        "admission_requests_total", "Решения допуска запросов",
+        {(("result", result),): stats[result] for result in ("admitted", "rate_limited", "shed")})
+    lines += prometheus_counter(
+        "admission_rate_limited_total", "Отказы 429 по правилам",
+        {(("rule", rule),): count for rule, count in limited_by_rule.items()})
+    lines += prometheus_counter(
+        "admission_backend_errors_total", "Хранилище счётчиков не ответило (запрос пропущен)",
+        {(): stats["backend_errors"]})
+    lines += prometheus_counter("admission_in_flight", "Выполняющиеся запросы воркера", {(): _in_flight}, kind="gauge")
+    return "\n".join(lines) + "\n"
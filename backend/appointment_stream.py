@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+from datetime import date
+from typing import Optional
+
+import config
+from pagination import Where
+
+# Рассылка изменений записей подписчикам SSE. Одно соединение воркера слушает канал appointment_events
+# (триггер миграции 0009) и раскладывает события по очередям подписчиков с учётом их фильтров. После
+# переподключения пропущенное досылается из таблицы appointment_events начиная с Last-Event-ID.
+# Уведомления приходят в порядке коммитов, а id выдаются до коммита: событие с меньшим id может быть
+# зафиксировано позже курсора клиента. Поэтому продолжение с курсора досылает не только id > курсора,
+# но и события транзакций, не завершённых к моменту курсора (xact_id >= xact_xmin курсора, миграция
+# 0013); из них отбрасываются те, у записи которых есть более новое событие, чтобы не откатить её.
+# Если соединение LISTEN оборвалось, уведомления за время обрыва потеряны: после переподключения все
+# потоки закрываются, и EventSource, переподключившись с Last-Event-ID, дочитывает их из журнала.
+# Чтобы Last-Event-ID был и у потока без событий, первое сообщение несёт id последнего события.
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "appointment_events"
+# id последнего события на момент чтения списка GET /appointments: поток, открытый с cursor=<он>,
+# дошлёт изменения, сделанные между чтением списка и подпиской
+STREAM_CURSOR_HEADER = "X-Stream-Cursor"
+EVENT_COLUMNS = "id, appointment_id, op, day, old_day, employee_id, old_employee_id, row"
+PRUNE_INTERVAL = 3600
+
+_subscribers = set()
+stats = {"events": 0, "delivered": 0, "overflows": 0, "resets": 0, "resyncs": 0}
+
+
+class Subscriber:
+    __slots__ = ("queue", "day", "employee_id", "overflowed")
+
+    def __init__(self, day: Optional[date], employee_id: Optional[int]):
+        self.queue = asyncio.Queue(maxsize=config.STREAM_QUEUE_SIZE)
+        self.day = day
+        self.employee_id = employee_id
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        # Событие интересно и по новому, и по прежнему дню/мастеру: перенос убирает запись со старой доски
+        if self.day is not None and self.day.isoformat() not in (event["day"], event["old_day"]):
+            return False
+        if self.employee_id is not None and self.employee_id not in (event["employee_id"], event["old_employee_id"]):
+            return False
+        return True
+
+
+def subscribe(day: Optional[date] = None, employee_id: Optional[int] = None) -> Subscriber:
+    subscriber = Subscriber(day, employee_id)
+    _subscribers.add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber: Subscriber):
+    _subscribers.discard(subscriber)
+
+
+def _on_notify(conn, pid, channel, payload):
+    event = json.loads(payload)
+    stats["events"] += 1
+    for subscriber in list(_subscribers):
+        if subscriber.overflowed or not subscriber.matches(event):
+            continue
+        try:
+            subscriber.queue.put_nowait(event)
+            stats["delivered"] += 1
+        except asyncio.QueueFull:
+            # клиент не успевает читать: поток закрывается, EventSource переподключится и дочитает из журнала
+            subscriber.overflowed = True
+            stats["overflows"] += 1
+
+
+def resync():
+    # Вызывается после переподключения LISTEN: None в очереди завершает поток подписчика
+    stats["resyncs"] += 1
+    for subscriber in list(_subscribers):
+        try:
+            subscriber.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            subscriber.overflowed = True
+
+
+async def start_listener(listener):
+    await listener.add_listener(CHANNEL, _on_notify, on_reconnect=resync)
+
+
+async def last_event_id(conn) -> int:
+    # Курсор для продолжения: события с меньшим id, которые этот снимок ещё не видит, backlog дошлёт
+    # по xact_xmin этого события
+    return await conn.fetchval("SELECT COALESCE(max(id), 0) FROM appointment_events")
+
+
+def _filters(day: Optional[date], employee_id: Optional[int]) -> Where:
+    return (
+        Where()
+        .add("{} IN (day, old_day)", day)
+        .add("{} IN (employee_id, old_employee_id)", employee_id)
+    )
+
+
+async def backlog(conn, after: int, day: Optional[date], employee_id: Optional[int]) -> Optional[list]:
+    # События, которых не было у клиента на момент курсора after; None — продолжить нельзя (курсор
+    # уже удалён из журнала или пропущено слишком много), клиенту нужно перечитать список целиком.
+    # after = 0 — журнал был пуст: всё, что в нём есть сейчас, появилось позже.
+    if after > 0 and not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM appointment_events WHERE id = $1)", after):
+        return None
+    where = _filters(day, employee_id)
+    where.args.append(after)
+    cursor = f"${len(where.args)}"
+    # Условия фильтра без префикса таблицы: в подзапросе они относятся к n, снаружи — к e
+    matches = " AND ".join(where.conditions) or "TRUE"
+    rows = await conn.fetch(
+        f"""
+        SELECT {EVENT_COLUMNS} FROM appointment_events e
+        WHERE {matches} AND (
+            e.id > {cursor}
+            OR e.id < {cursor}
+               AND e.xact_id >= (SELECT xact_xmin FROM appointment_events WHERE id = {cursor})
+               AND NOT EXISTS (
+                   SELECT 1 FROM appointment_events n
+                   WHERE n.appointment_id = e.appointment_id AND n.id > e.id AND {matches}
+               )
+        )
+        ORDER BY id LIMIT {config.STREAM_BACKLOG_LIMIT + 1}
+        """,
+        *where.args,
+    )
+    if len(rows) > config.STREAM_BACKLOG_LIMIT:
+        return None
+    return [dict(row, day=_iso(row["day"]), old_day=_iso(row["old_day"])) for row in rows]
+
+
+def _iso(value: Optional[date]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps({"op": event["op"], "appointment": event["row"]}, default=str, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: appointment\ndata: {data}\n\n"
+
+
+async def _reset(pool) -> str:
+    # Клиент перечитывает GET /appointments; id — последнее событие, чтобы следующее переподключение
+    # продолжило с него, а не получило reset снова
+    stats["resets"] += 1
+    async with pool.acquire() as conn:
+        last_id = await last_event_id(conn)
+    return f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+
+
+async def events(pool, day: Optional[date], employee_id: Optional[int], after: Optional[int]):
+    # Подписка оформляется до чтения журнала: событие, пришедшее во время чтения, попадёт в очередь,
+    # а повтор уже отправленного из журнала отбрасывается по id
+    subscriber = subscribe(day, employee_id)
+    try:
+        yield f"retry: {config.STREAM_RETRY_MS}\n\n"
+        sent = set()
+        if after is None:
+            # только id, без события: EventSource запомнит его как Last-Event-ID
+            async with pool.acquire() as conn:
+                last_id = await last_event_id(conn)
+            yield f"id: {last_id}\n\n"
+        else:
+            async with pool.acquire() as conn:
+                missed = await backlog(conn, after, day, employee_id)
+            if missed is None:
+                yield await _reset(pool)
+            else:
+                for event in missed:
+                    sent.add(event["id"])
+                    yield format_event(event)
+        while not subscriber.overflowed:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), config.STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # комментарий SSE: не даёт прокси закрыть простаивающее соединение
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                break
+            if event["id"] in sent:
+                continue
+            yield format_event(event)
+    finally:
+        unsubscribe(subscriber)
+
+
+async def prune(pool) -> str:
+    return await pool.execute(
+        "DELETE FROM appointment_events WHERE created_at < now() - make_interval(secs => $1)",
+        config.STREAM_RETENTION_HOURS * 3600,
+    )
+
+
+async def run_pruner(pool):
+    while True:
+        try:
+            await prune(pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка очистки журнала appointment_events")
+        await asyncio.sleep(PRUNE_INTERVAL)
+
+
+def snapshot() -> dict:
+    return {**stats, "subscribers": len(_subscribers)}
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import gzip
+import logging
+import shutil
+from datetime import date, datetime, time
+from pathlib import Path
+
+import config
+import db
+from rollups import COMPLETED_STATUSES
+from schedule import CANCELLED_STATUSES
+
+# Перенос закрытой истории из appointments/payments в секционированный по месяцам архив (миграция 0011)
+# и выгрузка старых секций архива в сжатые CSV-файлы. В архив уходят записи старше ARCHIVE_AFTER_MONTHS:
+# отменённые или выполненные и оплаченные, без отзывов (отзывы ссылаются на запись внешним ключом) и без
+# незакрытого резерва запчастей. Вместе с записью переносятся её платежи и строки резерва. Перенос идёт
+# пачками в транзакциях с app.archiving = 'on': триггеры агрегатов, отчётов и потока записей его не видят,
+# а client_stats копит ушедшее в archived_* колонках. Горячие таблицы перестают расти с историей.
+# Ключи идемпотентности платежей старше ARCHIVE_AFTER_MONTHS после переноса не проверяются.
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock: архивирование выполняет только один воркер одновременно
+LOCK_KEY = 7301003
+# Архивная таблица -> колонка секционирования
+ARCHIVE_TABLES = {"appointments_archive": "appointment_date", "payments_archive": "payment_date"}
+
+state = {"last_run": None, "last_moved": 0, "last_exported": 0, "moved_total": 0}
+
+# Кандидаты на перенос по порядку appointment_date, id; $5/$6 — последняя строка предыдущей пачки,
+# чтобы оставшиеся в горячей таблице (неоплаченные, с отзывами) не перечитывались каждой пачкой
+CANDIDATES_SQL = """
+SELECT a.id, a.appointment_date FROM appointments a
+WHERE a.appointment_date < $1
+  AND (a.appointment_date, a.id) > ($5, $6)
+  AND (COALESCE(a.status, '') = ANY($2::text[]) OR (a.status = ANY($3::text[]) AND a.paid_at IS NOT NULL))
+  AND NOT EXISTS (SELECT 1 FROM reviews r WHERE r.appointment_id = a.id)
+  AND NOT EXISTS (
+      SELECT 1 FROM part_reservations pr WHERE pr.appointment_id = a.id AND pr.status = 'reserved'
+  )
+ORDER BY a.appointment_date, a.id
+LIMIT $4
+FOR UPDATE OF a SKIP LOCKED
+"""
+
+# Ушедшее в архив добавляется к archived_* (visit_count и т.п. не меняются: для клиента ничего не удалено)
+CLIENT_STATS_SQL = """
+INSERT INTO client_stats AS cs (
+    client_id, visit_count, last_visit, total_spent, archived_visits, archived_last_visit, archived_spent
+)
+SELECT client_id, visits, last_visit, spent, visits, last_visit, spent FROM (
+    SELECT a.client_id,
+           count(*) FILTER (WHERE COALESCE(a.status, '') <> ALL($2::text[])) AS visits,
+           max(a.appointment_date) FILTER (WHERE COALESCE(a.status, '') <> ALL($2::text[])) AS last_visit,
+           COALESCE(sum(paid.amount), 0) AS spent
+    FROM appointments a
+    LEFT JOIN LATERAL (
+        SELECT sum(p.amount) AS amount FROM payments p WHERE p.appointment_id = a.id AND p.status = 'paid'
+    ) paid ON TRUE
+    WHERE a.id = ANY($1::int[])
+    GROUP BY a.client_id
+) moved
+ON CONFLICT (client_id) DO UPDATE
+    SET archived_visits = cs.archived_visits + EXCLUDED.archived_visits,
+        archived_last_visit = GREATEST(cs.archived_last_visit, EXCLUDED.archived_last_visit),
+        archived_spent = cs.archived_spent + EXCLUDED.archived_spent
+"""
+
+# Запросы переноса пачки и число параметров: $1 id записей, $2 отменённые статусы. Порядок важен.
+# Строки архива — все колонки горячей таблицы и archived_at в конце (LIKE в миграции 0011):
+# новая колонка горячей таблицы добавляется и в архивную
+MOVE_SQL = [
+    ("INSERT INTO payments_archive SELECT p.*, CURRENT_TIMESTAMP FROM payments p "
+     "WHERE p.appointment_id = ANY($1::int[])", 1),
+    ("INSERT INTO part_reservations_archive SELECT r.*, CURRENT_TIMESTAMP FROM part_reservations r "
+     "WHERE r.appointment_id = ANY($1::int[])", 1),
+    ("INSERT INTO appointments_archive SELECT a.*, CURRENT_TIMESTAMP FROM appointments a "
+     "WHERE a.id = ANY($1::int[])", 1),
+    (CLIENT_STATS_SQL, 2),
+    ("DELETE FROM payments WHERE appointment_id = ANY($1::int[])", 1),
+    ("DELETE FROM part_reservations WHERE appointment_id = ANY($1::int[])", 1),
+    ("DELETE FROM appointments WHERE id = ANY($1::int[])", 1),
+]
+
+PARTITIONS_SQL = """
+SELECT parent.relname AS parent, child.relname AS child
+FROM pg_inherits i
+JOIN pg_class parent ON parent.oid = i.inhparent
+JOIN pg_class child ON child.oid = i.inhrelid
+WHERE parent.relname = ANY($1::text[])
+"""
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def archive_cutoff(today: date = None) -> date:
+    # Первый месяц, который ещё остаётся в горячих таблицах
+    return add_months(month_start(today or date.today()), -config.ARCHIVE_AFTER_MONTHS)
+
+
+def cold_cutoff(today: date = None):
+    # Первый месяц, который остаётся в БД; None — выгрузка в файлы выключена
+    if not config.ARCHIVE_COLD_DIR or config.ARCHIVE_COLD_AFTER_MONTHS <= 0:
+        return None
+    return add_months(month_start(today or date.today()), -config.ARCHIVE_COLD_AFTER_MONTHS)
+
+
+async def monthly_partitions(conn) -> set:
+    # {(архивная таблица, месяц)} существующих секций, без DEFAULT
+    rows = await conn.fetch(PARTITIONS_SQL, list(ARCHIVE_TABLES))
+    partitions = set()
+    for row in rows:
+        suffix = row["child"][len(row["parent"]) + 1:]
+        if suffix != "default":
+            year, month = suffix.split("_")
+            partitions.add((row["parent"], date(int(year), int(month), 1)))
+    return partitions
+
+
+async def ensure_partition(conn, table: str, month: date, known: set):
+    if (table, month) in known:
+        return
+    # Границы — вычисленные даты, не пользовательский ввод; DDL не принимает параметры
+    await conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+    known.add((table, month))
+
+
+async def ensure_partitions(conn, known: set) -> int:
+    # Секции заводятся заранее — от самого старого месяца горячей таблицы (но не старше границы выгрузки
+    # в файлы) до ARCHIVE_PARTITIONS_AHEAD месяцев после границы архива, чтобы перенос не ждал DDL
+    oldest = await conn.fetchval("SELECT min(appointment_date) FROM appointments")
+    last = add_months(archive_cutoff(), config.ARCHIVE_PARTITIONS_AHEAD)
+    month = month_start(oldest) if oldest is not None else archive_cutoff()
+    if cold_cutoff() is not None:
+        month = max(month, cold_cutoff())
+    created = len(known)
+    while month < last:
+        for table in ARCHIVE_TABLES:
+            await ensure_partition(conn, table, month, known)
+        month = add_months(month, 1)
+    return len(known) - created
+
+
+async def move_batch(conn, known: set, after: tuple) -> tuple:
+    # Переносит одну пачку; возвращает (число записей, последняя строка пачки)
+    async with conn.transaction():
+        await conn.execute("SET LOCAL app.archiving = 'on'")
+        rows = await conn.fetch(
+            CANDIDATES_SQL, datetime.combine(archive_cutoff(), time.min), list(CANCELLED_STATUSES), COMPLETED_STATUSES,
+            config.ARCHIVE_BATCH_SIZE, *after,
+        )
+        if not rows:
+            return 0, after
+        ids = [row["id"] for row in rows]
+        # Платёж может быть проведён в другом месяце, чем запись
+        months = await conn.fetch(
+            "SELECT DISTINCT date_trunc('month', payment_date)::date AS month FROM payments "
+            "WHERE appointment_id = ANY($1::int[]) AND payment_date IS NOT NULL",
+            ids,
+        )
+        for row in months:
+            await ensure_partition(conn, "payments_archive", row["month"], known)
+        for month in {month_start(row["appointment_date"]) for row in rows}:
+            await ensure_partition(conn, "appointments_archive", month, known)
+        args = [ids, list(CANCELLED_STATUSES)]
+        for sql, count in MOVE_SQL:
+            await conn.execute(sql, *args[:count])
+    last = rows[-1]
+    return len(ids), (last["appointment_date"], last["id"])
+
+
+async def archive_closed(conn, known: set) -> int:
+    moved = 0
+    after = (datetime.min, 0)
+    while True:
+        count, after = await move_batch(conn, known, after)
+        if not count:
+            return moved
+        moved += count
+
+
+def _compress(source: Path, target: Path):
+    with open(source, "rb") as raw, gzip.open(target, "wb") as packed:
+        shutil.copyfileobj(raw, packed)
+
+
+async def export_partition(conn, table: str, month: date) -> dict:
+    # Секция блокируется от записи на время выгрузки, затем отсоединяется и удаляется в той же транзакции:
+    # строки, пришедшие в архив этого месяца позже, попадут в новую секцию и в следующую выгрузку
+    name = partition_name(table, month)
+    directory = Path(config.ARCHIVE_COLD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    exported_at = datetime.utcnow()
+    target = directory / f"{name}_{exported_at:%Y%m%d%H%M%S}.csv.gz"
+    raw = target.with_suffix("")
+    committed = False
+    try:
+        async with conn.transaction():
+            await conn.execute(f"LOCK TABLE {name} IN EXCLUSIVE MODE")
+            status = await conn.copy_from_table(name, output=str(raw), format="csv", header=True)
+            await asyncio.to_thread(_compress, raw, target)
+            segment = {
+                "table_name": table,
+                "month": month,
+                "path": str(target),
+                "row_count": int(status.split()[-1]),
+                "bytes": target.stat().st_size,
+            }
+            await conn.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            await conn.execute(f"DROP TABLE {name}")
+            await conn.execute(
+                "INSERT INTO archive_segments (table_name, month, path, row_count, bytes, exported_at) "
+                "VALUES ($1, $2, $3, $4, $5, $6)",
+                table, month, segment["path"], segment["row_count"], segment["bytes"], exported_at,
+            )
+        committed = True
+    finally:
+        raw.unlink(missing_ok=True)
+        if not committed:
+            target.unlink(missing_ok=True)
+    return segment
+
+
+async def export_cold(conn, known: set) -> int:
+    cutoff = cold_cutoff()
+    if cutoff is None:
+        return 0
+    exported = 0
+    for table, month in sorted(known):
+        if month >= cutoff:
+            continue
+        # пустые секции не выгружаются: файлы без строк не нужны
+        if not await conn.fetchval(f"SELECT EXISTS (SELECT 1 FROM {partition_name(table, month)})"):
+            continue
+        segment = await export_partition(conn, table, month)
+        known.discard((table, month))
+        logger.info("Секция %s выгружена: %s строк, %s", partition_name(table, month),
+                    segment["row_count"], segment["path"])
+        exported += 1
+    return exported
+
+
+async def run(pool) -> dict:
+    # Полный проход: секции, перенос, выгрузка; None в "moved", если архивирование уже идёт в другом воркере
+    async with pool.acquire() as conn:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LOCK_KEY):
+            return {"moved": None}
+        try:
+            known = await monthly_partitions(conn)
+            created = await ensure_partitions(conn, known)
+            moved = await archive_closed(conn, known)
+            exported = await export_cold(conn, known)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+    state.update(last_run=datetime.utcnow(), last_moved=moved, last_exported=exported)
+    state["moved_total"] += moved
+    return {"partitions_created": created, "moved": moved, "exported": exported}
+
+
+async def run_scheduler(pool):
+    if not config.ARCHIVE_ENABLED:
+        return
+    while True:
+        try:
+            await run(pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка архивирования")
+        await asyncio.sleep(config.ARCHIVE_INTERVAL_SECONDS)
+
+
+def snapshot() -> dict:
+    return {"enabled": config.ARCHIVE_ENABLED, "cutoff": archive_cutoff(), "cold_cutoff": cold_cutoff(), **state}
+
+
+async def _main(args):
+    pool = await db.create_pool(args.dsn, min_size=1, max_size=1)
+    try:
+        if args.command == "partitions":
+            async with pool.acquire() as conn:
+                for table, month in sorted(await monthly_partitions(conn)):
+                    print(partition_name(table, month))
+        else:
+            print(await run(pool))
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Архив закрытых записей и платежей")
+    parser.add_argument("command", nargs="?", choices=["run", "partitions"], default="run")
+    parser.add_argument("--dsn", help="строка подключения (по умолчанию DATABASE_URL)")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request
+
+import config
+from metrics import Histogram
+
+# Журнал изменений (audit_logs) без синхронного INSERT в каждом запросе: обработчики кладут события
+# в ограниченную очередь воркера, фоновая задача пишет их пачками через COPY. Если очередь полна или
+# БД не принимает пачку, события дописываются в файл (по строке JSON) и загружаются позже.
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["user_id", "action", "table_name", "record_id", "timestamp"]
+SPILL_DIR = Path(config.AUDIT_SPILL_DIR)
+
+_queue: Optional[asyncio.Queue] = None
+stats = {
+    "queued": 0,
+    "written": 0,
+    "batches": 0,
+    "spilled": 0,
+    "replayed": 0,
+    "write_errors": 0,
+}
+batch_latency = Histogram()
+
+
+def _spill_path() -> Path:
+    return SPILL_DIR / f"audit-{os.getpid()}.ndjson"
+
+
+def _spill(events: list):
+    # Дописываем в файл своего pid; fsync не делаем — достаточно переживать медленную или недоступную БД
+    SPILL_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_spill_path(), "a", encoding="utf-8") as f:
+        for user_id, action, table_name, record_id, ts in events:
+            f.write(json.dumps([user_id, action, table_name, record_id, ts.isoformat()]) + "\n")
+    stats["spilled"] += len(events)
+
+
+def record_many(request: Request, action: str, table_name: str, record_ids: list):
+    # Не ждёт БД и не блокирует обработчик: что не поместилось в очередь, уходит на диск одной записью
+    user = getattr(request.state, "user", None)
+    user_id = user["id"] if user else None
+    now = datetime.utcnow()
+    events = [(user_id, action, table_name, record_id, now) for record_id in record_ids]
+    overflow = events
+    if _queue is not None:
+        overflow = []
+        for event in events:
+            try:
+                _queue.put_nowait(event)
+                stats["queued"] += 1
+            except asyncio.QueueFull:
+                overflow.append(event)
+    if overflow:
+        _spill(overflow)
+
+
+def record(request: Request, action: str, table_name: str, record_id: Optional[int]):
+    record_many(request, action, table_name, [record_id])
+
+
+async def _write(pool, events: list):
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        await conn.copy_records_to_table(
+            "audit_logs", records=events, columns=COLUMNS, timeout=config.AUDIT_WRITE_TIMEOUT
+        )
+    batch_latency.observe(time.perf_counter() - started)
+    stats["written"] += len(events)
+    stats["batches"] += 1
+
+
+async def _flush_batch(pool, events: list, spill: bool = True) -> bool:
+    try:
+        await _write(pool, events)
+        return True
+    except asyncio.CancelledError:
+        if spill:
+            _spill(events)
+        raise
+    except Exception:
+        stats["write_errors"] += 1
+        logger.exception("Не удалось записать %s событий аудита, сохраняю на диск", len(events))
+        if spill:
+            _spill(events)
+        return False
+
+
+def _read_spill(path: Path) -> list:
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                user_id, action, table_name, record_id, ts = json.loads(line)
+            except ValueError:
+                # строка, недописанная при аварийной остановке
+                logger.warning("Пропущена повреждённая строка в %s", path)
+                continue
+            events.append((user_id, action, table_name, record_id, datetime.fromisoformat(ts)))
+    return events
+
+
+def _claimed_by_live_worker(path: Path) -> bool:
+    # audit-<pid>.replay-<pid>: файл уже загружает другой воркер; если тот умер — забираем
+    pid = int(path.suffix.rsplit("-", 1)[-1])
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+async def replay_spilled(pool):
+    # Загружает файлы, накопленные любым воркером. Файл сначала переименовывается, чтобы его не взяли
+    # двое, и удаляется только после записи всех событий (доставка «хотя бы один раз»).
+    if not SPILL_DIR.exists():
+        return
+    for path in sorted(SPILL_DIR.glob("audit-*")):
+        if ".replay-" in path.name:
+            if _claimed_by_live_worker(path):
+                continue
+            claimed = path
+        else:
+            claimed = path.with_suffix(f".replay-{os.getpid()}")
+            try:
+                path.rename(claimed)
+            except OSError:
+                continue
+        events = _read_spill(claimed)
+        for start in range(0, len(events), config.AUDIT_BATCH_SIZE):
+            chunk = events[start:start + config.AUDIT_BATCH_SIZE]
+            if not await _flush_batch(pool, chunk, spill=False):
+                _spill(events[start:])
+                claimed.unlink()
+                return
+            stats["replayed"] += len(chunk)
+        claimed.unlink()
+
+
+async def run_writer(pool):
+    # Пачка закрывается по размеру (AUDIT_BATCH_SIZE) или по времени (AUDIT_FLUSH_INTERVAL_MS)
+    global _queue
+    _queue = asyncio.Queue(maxsize=config.AUDIT_QUEUE_SIZE)
+    interval = config.AUDIT_FLUSH_INTERVAL_MS / 1000
+    loop = asyncio.get_running_loop()
+    await replay_spilled(pool)
+    while True:
+        events = [await _queue.get()]
+        deadline = loop.time() + interval
+        try:
+            while len(events) < config.AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    events.append(await asyncio.wait_for(_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # остановка во время сбора пачки: собранное не теряем
+            _spill(events)
+            raise
+        if await _flush_batch(pool, events) and _spill_path().exists():
+            await replay_spilled(pool)
+
+
+def _drain() -> list:
+    events = []
+    while _queue is not None and not _queue.empty():
+        events.append(_queue.get_nowait())
+    return events
+
+
+async def flush(pool):
+    # Вызывается из main.shutdown() после остановки run_writer: дописываем остаток очереди
+    events = _drain()
+    for start in range(0, len(events), config.AUDIT_BATCH_SIZE):
+        await _flush_batch(pool, events[start:start + config.AUDIT_BATCH_SIZE])
+
+
+def snapshot() -> dict:
+    return {
+        **stats,
+        "queue_size": _queue.qsize() if _queue is not None else 0,
+        "batch_latency": batch_latency.snapshot(),
+    }
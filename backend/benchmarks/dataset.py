@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+import asyncpg
+
+import config
+import migrations
+import rollups
+from hashing import pwd_context
+
+# Синтетический набор данных для нагрузочных тестов: таблицы init.sql от 10^5 до 10^7 записей.
+# Строки генерируются на стороне PostgreSQL (generate_series), схема — init.sql, затем миграции:
+# индексы строятся один раз по готовым данным, а client_stats и report_dirty_days заполняются
+# начальным заполнением миграций 0002/0004. Запуск из backend/ на пустой БД:
+#   python -m benchmarks.dataset --appointments 1000000 --reset
+BD_DIR = Path(__file__).resolve().parent.parent.parent / "bd"
+BENCH_PASSWORD = "bench"
+CHUNK = 1_000_000
+
+FIRST_NAMES = ["Ivan", "Petr", "Anna", "Elena", "Sergey", "Olga", "Dmitry", "Maria", "Alexey", "Natalia",
+               "Andrey", "Irina", "Mikhail", "Tatiana", "Nikolay", "Svetlana"]
+LAST_NAMES = ["Ivanov", "Petrov", "Sidorov", "Smirnov", "Kuznetsov", "Popov", "Vasiliev", "Sokolov",
+              "Mikhailov", "Novikov", "Fedorov", "Morozov", "Volkov", "Alekseev", "Lebedev", "Semenov"]
+CARS = ["Toyota|Camry", "Toyota|Corolla", "Toyota|RAV4", "Kia|Rio", "Hyundai|Solaris", "Lada|Vesta",
+        "Lada|Granta", "Volkswagen|Polo", "Skoda|Octavia", "Renault|Logan", "Ford|Focus", "BMW|X5",
+        "Mercedes|E-Class", "Nissan|Qashqai", "Mazda|CX-5", "Honda|Accord"]
+COLORS = ["Black", "White", "Silver", "Grey", "Blue", "Red", "Green"]
+
+# Порядок важен: внешние ключи ссылаются на уже загруженные таблицы. $-параметры — в sizes().
+# "+ g * 0" в LATERAL привязывает подзапрос к строке, иначе random() в нём вычисляется один раз.
+STEPS = [
+    ("categories", """
+        INSERT INTO categories (name, description)
+        SELECT 'Категория ' || g, 'Синтетическая категория' FROM generate_series(1, $1) g
+    """, ["categories"]),
+    ("services", """
+        INSERT INTO services (category_id, name, description, price, duration)
+        SELECT 1 + g % $2, 'Service ' || g, 'Synthetic service',
+               round((10 + power(random(), 2) * 490)::numeric, 2),
+               (ARRAY[30, 45, 60, 60, 60, 90, 120, 180])[1 + floor(random() * 8)::int]
+        FROM generate_series(1, $1) g
+    """, ["services", "categories"]),
+    # Первые mechanics сотрудников — мастера, остальные — администраторы и менеджеры
+    ("employees", """
+        INSERT INTO employees (first_name, last_name, role, phone, email)
+        SELECT ($3::text[])[1 + g % array_length($3::text[], 1)], 'Employee ' || g,
+               CASE WHEN g <= $2 THEN 'mechanic' ELSE (ARRAY['manager', 'admin'])[1 + g % 2] END,
+               '+7900' || lpad(g::text, 7, '0'), 'employee' || g || '@example.com'
+        FROM generate_series(1, $1) g
+    """, ["employees", "mechanics", "first_names"]),
+    ("clients", """
+        INSERT INTO clients (first_name, last_name, phone, email, client_type, discount, created_at)
+        SELECT ($2::text[])[1 + floor(random() * array_length($2::text[], 1))::int],
+               ($3::text[])[1 + floor(random() * array_length($3::text[], 1))::int],
+               '+7916' || lpad(g::text, 7, '0'), 'client' || g || '@example.com',
+               CASE WHEN random() < 0.85 THEN 'physical' ELSE 'legal' END,
+               (ARRAY[0, 0, 0, 0, 0, 3, 5, 10])[1 + floor(random() * 8)::int],
+               now() - random() * interval '5 years'
+        FROM generate_series(1, $1) g
+    """, ["clients", "first_names", "last_names"]),
+    # У каждого клиента хотя бы одна машина, у части — две и больше
+    ("cars", """
+        INSERT INTO cars (client_id, make, model, year, license_plate, vin, color, mileage, status)
+        SELECT 1 + (g - 1) % $2,
+               split_part(m, '|', 1), split_part(m, '|', 2),
+               2000 + floor(power(random(), 0.5) * 25)::int,
+               chr(65 + g % 26) || lpad((g % 1000)::text, 3, '0') || chr(65 + (g / 26) % 26) || chr(65 + (g / 676) % 26)
+                   || (77 + g % 120),
+               'SYN' || lpad(g::text, 14, '0'),
+               ($4::text[])[1 + floor(random() * array_length($4::text[], 1))::int],
+               floor(random() * 300000)::int,
+               CASE WHEN random() < 0.95 THEN 'active' ELSE 'inactive' END
+        FROM generate_series(1, $1) g,
+             LATERAL (SELECT ($3::text[])[1 + floor(random() * array_length($3::text[], 1))::int + g * 0] AS m) pick
+    """, ["cars", "clients", "car_models", "colors"]),
+    ("parts", """
+        INSERT INTO parts (name, sku, stock_qty, purchase_price, sale_price)
+        SELECT 'Part ' || g, 'SKU-' || lpad(g::text, 6, '0'), 20 + floor(random() * 480)::int, price,
+               round(price * (1.3 + random() * 0.5), 2)
+        FROM generate_series(1, $1) g,
+             LATERAL (SELECT round((1 + random() * 199 + g * 0)::numeric, 2) AS price) p
+    """, ["parts"]),
+    ("service_parts", """
+        INSERT INTO service_parts (service_id, part_id, quantity)
+        SELECT s.id, 1 + floor(random() * $1)::int, 1 + floor(random() * 4)::int
+        FROM services s, generate_series(1, 3) k
+        WHERE random() < 0.6
+        ON CONFLICT DO NOTHING
+    """, ["parts"]),
+]
+
+# Записи пачками: популярные машины и услуги встречаются чаще (степенное распределение),
+# время — рабочие часы с шагом 15 минут, 3% записей в будущем. $1/$2 — границы пачки.
+APPOINTMENTS_SQL = """
+    INSERT INTO appointments (client_id, car_id, service_id, employee_id, appointment_date, status, created_at)
+    SELECT c.client_id, c.id, a.service_id, a.employee_id, a.appointment_date,
+           CASE WHEN a.appointment_date > now() THEN 'scheduled'
+                WHEN a.r < 0.85 THEN 'completed'
+                WHEN a.r < 0.95 THEN 'cancelled'
+                ELSE 'no-show' END,
+           a.appointment_date - random() * interval '14 days'
+    FROM (
+        SELECT 1 + floor($3 * power(random(), 2))::int AS car_id,
+               1 + floor($4 * power(random(), 1.5))::int AS service_id,
+               1 + floor(random() * $5)::int AS employee_id,
+               date_trunc('day', now())
+                   + (floor(random() * ($6 + 30))::int - $6) * interval '1 day'
+                   + interval '9 hours' + floor(random() * 32) * interval '15 minutes' AS appointment_date,
+               random() AS r
+        FROM generate_series($1, $2) g
+    ) a
+    JOIN cars c ON c.id = a.car_id
+"""
+
+# Платежи и отзывы — по выполненным записям
+FOLLOWUP_STEPS = [
+    ("payments", """
+        INSERT INTO payments (appointment_id, amount, payment_date, payment_method, status)
+        SELECT a.id, round(s.price * (1 - COALESCE(cl.discount, 0) / 100), 2),
+               a.appointment_date + interval '2 hours',
+               (ARRAY['card', 'card', 'card', 'cash', 'transfer'])[1 + floor(random() * 5)::int],
+               CASE WHEN random() < 0.97 THEN 'paid' ELSE 'pending' END
+        FROM appointments a
+        JOIN services s ON s.id = a.service_id
+        JOIN clients cl ON cl.id = a.client_id
+        WHERE a.status = 'completed'
+    """),
+    ("reviews", """
+        INSERT INTO reviews (appointment_id, client_id, service_id, rating, comment, created_at)
+        SELECT a.id, a.client_id, a.service_id,
+               CASE WHEN r < 0.5 THEN 5 WHEN r < 0.8 THEN 4 WHEN r < 0.9 THEN 3 WHEN r < 0.96 THEN 2 ELSE 1 END,
+               CASE WHEN random() < 0.4 THEN 'Synthetic review' END,
+               a.appointment_date + random() * interval '3 days'
+        FROM (SELECT id, client_id, service_id, appointment_date, random() AS r
+              FROM appointments WHERE status = 'completed') a
+        WHERE random() < 0.3
+    """),
+]
+
+
+def sizes(appointments: int) -> dict:
+    clients = max(appointments // 8, 100)
+    return {
+        "appointments": appointments,
+        "clients": clients,
+        "cars": clients * 13 // 10,
+        "categories": 12,
+        "services": 120,
+        "employees": 60,
+        "mechanics": 45,
+        "parts": 3000,
+        "days": 3 * 365,
+        "first_names": FIRST_NAMES,
+        "last_names": LAST_NAMES,
+        "car_models": CARS,
+        "colors": COLORS,
+    }
+
+
+async def _timed(label: str, coro):
+    started = time.perf_counter()
+    result = await coro
+    print(f"{label:24s} {time.perf_counter() - started:8.1f} s")
+    return result
+
+
+async def load(conn, appointments: int, users: int):
+    size = sizes(appointments)
+    for table, sql, params in STEPS:
+        await _timed(table, conn.execute(sql, *[size[name] for name in params]))
+    for start in range(1, appointments + 1, CHUNK):
+        end = min(start + CHUNK - 1, appointments)
+        await _timed(f"appointments {end}", conn.execute(
+            APPOINTMENTS_SQL, start, end, size["cars"], size["services"], size["mechanics"], size["days"]
+        ))
+    for table, sql in FOLLOWUP_STEPS:
+        await _timed(table, conn.execute(sql))
+    password_hash = pwd_context.hash(BENCH_PASSWORD)
+    await conn.executemany(
+        "INSERT INTO users (username, password_hash, full_name, role) VALUES ($1, $2, $3, 'user') "
+        "ON CONFLICT (username) DO NOTHING",
+        [(f"bench{i}", password_hash, f"Bench User {i}") for i in range(1, users + 1)],
+    )
+
+
+async def _main(args):
+    dsn = args.dsn or config.DATABASE_URL
+    conn = await asyncpg.connect(dsn)
+    try:
+        if args.reset:
+            await conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+            await conn.execute((BD_DIR / "init.sql").read_text(encoding="utf-8"))
+        await load(conn, args.appointments, args.users)
+        # индексы, триггеры и начальное заполнение агрегатов — по уже загруженным данным
+        await _timed("migrations", migrations.apply_migrations(conn))
+        await _timed("analyze", conn.execute("ANALYZE"))
+    finally:
+        await conn.close()
+    pool = await asyncpg.create_pool(dsn, min_size=1, max_size=1)
+    try:
+        await _timed("report rollups", rollups.refresh(pool))
+    finally:
+        await pool.close()
+    print(f"Пользователи bench1..bench{args.users}, пароль {BENCH_PASSWORD!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочного теста")
+    parser.add_argument("--dsn", help="строка подключения (по умолчанию DATABASE_URL)")
+    parser.add_argument("--appointments", type=int, default=100_000, help="число записей (10^5..10^7)")
+    parser.add_argument("--users", type=int, default=50, help="пользователи bench1..benchN для входа")
+    parser.add_argument("--reset", action="store_true", help="пересоздать схему public из init.sql")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,45 @@
+import random
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import serialization
+
+# Сравнение сериализации списка из 10k строк: прежний путь (dict + jsonable_encoder + json)
+# и serialization.dumps. Запуск из backend/: python -m benchmarks.serialization
+ROWS = 10_000
+REPEAT = 20
+
+
+def make_rows(count: int) -> list:
+    start = datetime(2023, 1, 1, 9, 0)
+    return [
+        {
+            "id": i,
+            "name": f"Service {i}",
+            "description": "Engine oil and filter change",
+            "price": Decimal(random.randint(1000, 99999)) / 100,
+            "category_id": random.randint(1, 20),
+            "duration": random.choice([30, 60, 90]),
+            "created_at": start + timedelta(minutes=15 * i),
+        }
+        for i in range(count)
+    ]
+
+
+def stdlib_path(rows):
+    return JSONResponse(content=jsonable_encoder([dict(row) for row in rows])).body
+
+
+def fast_path(rows):
+    return serialization.dumps(rows)
+
+
+if __name__ == "__main__":
+    rows = make_rows(ROWS)
+    for name, func in (("jsonable_encoder + json", stdlib_path), ("serialization.dumps", fast_path)):
+        seconds = min(timeit.repeat(lambda: func(rows), number=1, repeat=REPEAT))
+        print(f"{name:26s} {seconds * 1000:8.2f} ms / {ROWS} rows")
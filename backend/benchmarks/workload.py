@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.dataset import BENCH_PASSWORD, CARS, LAST_NAMES, sizes
+
+# Нагрузочный тест API: N виртуальных пользователей в течение заданного времени выполняют смесь
+# сценариев (вход, списки и поиск, запись на обслуживание, закрытие заказа, отзыв) против запущенного
+# сервера на данных benchmarks.dataset. По каждому эндпоинту — p50/p95/p99 и запросов в секунду;
+# p95 сравнивается с bd/load_baseline.json. Нужен httpx (pip install httpx). Запуск из backend/:
+#   python -m benchmarks.workload --appointments 1000000 --duration 60 --concurrency 32
+#   python -m benchmarks.workload ... --update   # перезаписать базовые результаты
+BD_DIR = Path(__file__).resolve().parent.parent.parent / "bd"
+BASELINE_PATH = BD_DIR / "load_baseline.json"
+P95_TOLERANCE = 0.25
+# Ответы, которые для сценария — ожидаемый исход, а не ошибка: занятое время, устаревшая версия,
+# нехватка запчастей
+EXPECTED_REJECTIONS = {409, 412}
+
+# Доли сценариев в смеси; чтения преобладают, как в рабочем дне сервиса
+SCENARIOS = {
+    "browse": 40,
+    "search": 20,
+    "book": 15,
+    "close_job": 10,
+    "review": 5,
+    "reports": 5,
+    "login": 5,
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def observe(self, name: str, seconds: float, status: int):
+        self.latencies[name].append(seconds)
+        if status in EXPECTED_REJECTIONS:
+            self.rejected[name] += 1
+        elif status >= 400:
+            self.errors[name] += 1
+
+    def report(self, elapsed: float) -> dict:
+        result = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+                "errors": self.errors[name],
+                "rejected": self.rejected[name],
+            }
+        return result
+
+
+def _percentile(values: list, q: float) -> float:
+    # values отсортирован; ближайший ранг — без интерполяции, как принято в отчётах нагрузочных тестов
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, size: dict, number: int):
+        self.client = client
+        self.stats = stats
+        self.size = size
+        self.username = f"bench{number}"
+        self.headers = {}
+        # Свои записи пользователя: забронированные ждут закрытия, закрытые — отзыва
+        self.booked = []
+        self.completed = []
+
+    async def call(self, name: str, method: str, url: str, headers: dict = None, **kwargs) -> httpx.Response:
+        # name — шаблон эндпоинта, по нему группируется статистика
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers={**self.headers, **(headers or {})}, **kwargs)
+        except httpx.HTTPError:
+            self.stats.observe(name, time.perf_counter() - started, 599)
+            return None
+        self.stats.observe(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    def _client_car(self) -> tuple:
+        # Машина g принадлежит клиенту 1 + (g - 1) % clients (см. шаг cars в dataset)
+        car_id = random.randint(1, self.size["cars"])
+        return 1 + (car_id - 1) % self.size["clients"], car_id
+
+    async def login(self):
+        response = await self.call(
+            "POST /auth/login", "POST", "/auth/login",
+            data={"username": self.username, "password": BENCH_PASSWORD},
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def browse(self):
+        client_id, car_id = self._client_car()
+        await self.call("GET /clients", "GET", "/clients", params={"limit": 50, "sort": "last_name"})
+        await self.call("GET /clients/{id}", "GET", f"/clients/{client_id}")
+        await self.call("GET /clients/{id}/cars", "GET", f"/clients/{client_id}/cars")
+        await self.call("GET /cars/{id}", "GET", f"/cars/{car_id}")
+        since = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=random.randint(0, 365))
+        await self.call(
+            "GET /appointments", "GET", "/appointments",
+            params={"date_from": since.isoformat(), "date_to": (since + timedelta(days=1)).isoformat(), "limit": 50},
+        )
+
+    async def search(self):
+        q = random.choice([
+            random.choice(LAST_NAMES)[:random.randint(3, 6)],
+            random.choice(CARS).split("|")[1],
+            f"SKU-{random.randint(1, self.size['parts']):06d}",
+        ])
+        await self.call("GET /search", "GET", "/search", params={"q": q})
+
+    async def book(self):
+        client_id, car_id = self._client_car()
+        service_id = random.randint(1, self.size["services"])
+        day = date.today() + timedelta(days=random.randint(1, 14))
+        response = await self.call(
+            "GET /availability", "GET", "/availability", params={"service_id": service_id, "date": day.isoformat()}
+        )
+        if response is None or response.status_code != 200:
+            return
+        options = [(emp["employee_id"], slot) for emp in response.json()["employees"] for slot in emp["slots"]]
+        if not options:
+            return
+        employee_id, slot = random.choice(options)
+        response = await self.call("POST /appointments", "POST", "/appointments", json={
+            "client_id": client_id,
+            "car_id": car_id,
+            "service_id": service_id,
+            "employee_id": employee_id,
+            "appointment_date": slot,
+            "status": "scheduled",
+        })
+        if response is not None and response.status_code == 200:
+            self.booked.append(response.json())
+
+    async def close_job(self):
+        if not self.booked:
+            return await self.book()
+        appointment = self.booked.pop(0)
+        response = await self.call("GET /appointments/{id}", "GET", f"/appointments/{appointment['id']}")
+        if response is None or response.status_code != 200:
+            return
+        current = response.json()
+        await self.call(
+            "POST /inventory/appointments/{id}/consume", "POST", f"/inventory/appointments/{current['id']}/consume"
+        )
+        response = await self.call(
+            "PATCH /appointments/{id}", "PATCH", f"/appointments/{current['id']}",
+            json={"status": "completed"}, headers={"If-Match": f'"{current["version"]}"'},
+        )
+        if response is not None and response.status_code == 200:
+            self.completed.append(current)
+
+    async def review(self):
+        if not self.completed:
+            return await self.close_job()
+        appointment = self.completed.pop(0)
+        await self.call("POST /reviews", "POST", "/reviews/", json={
+            "client_id": appointment["client_id"],
+            "appointment_id": appointment["id"],
+            "service_id": appointment["service_id"],
+            "rating": random.choice([5, 5, 5, 4, 4, 3, 2, 1]),
+            "comment": "Benchmark review",
+        })
+
+    async def reports(self):
+        date_from = date.today() - timedelta(days=random.choice([7, 30, 90]))
+        await self.call("GET /reports/revenue", "GET", "/reports/revenue", params={"date_from": date_from.isoformat()})
+
+    async def run(self, deadline: float):
+        await self.login()
+        names = list(SCENARIOS)
+        weights = list(SCENARIOS.values())
+        while time.perf_counter() < deadline:
+            await getattr(self, random.choices(names, weights)[0])()
+
+
+async def run(base_url: str, size: dict, concurrency: int, duration: float, users: int) -> dict:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            VirtualUser(client, stats, size, 1 + i % users).run(deadline) for i in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    return stats.report(elapsed)
+
+
+def compare(report: dict, baseline: dict) -> list:
+    failures = []
+    for name, result in report.items():
+        expected = baseline.get(name, {}).get("p95_ms")
+        if expected is not None and result["p95_ms"] > expected * (1 + P95_TOLERANCE):
+            failures.append(f"{name}: p95 {result['p95_ms']:.1f} мс выше базового {expected:.1f} мс")
+        if result["errors"]:
+            failures.append(f"{name}: ошибок {result['errors']} из {result['count']}")
+    return failures
+
+
+def _main(args) -> int:
+    size = sizes(args.appointments)
+    report = asyncio.run(run(args.url, size, args.concurrency, args.duration, args.users))
+    total = sum(result["rps"] for result in report.values())
+    print(f"{'эндпоинт':44s} {'запросов':>8s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'ошибки':>7s}")
+    for name, result in report.items():
+        print(f"{name:44s} {result['count']:8d} {result['rps']:8.1f} {result['p50_ms']:8.1f} "
+              f"{result['p95_ms']:8.1f} {result['p99_ms']:8.1f} {result['errors']:7d}")
+    print(f"Всего: {total:.1f} запросов/с, {args.concurrency} пользователей, {args.duration:.0f} с")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Базовые результаты записаны в {BASELINE_PATH}")
+        return 0
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    failures = compare(report, baseline)
+    if failures:
+        print("\n".join(["", "Регрессии:"] + failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API на синтетических данных")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="адрес запущенного сервера")
+    parser.add_argument("--appointments", type=int, default=100_000, help="размер набора, как в benchmarks.dataset")
+    parser.add_argument("--users", type=int, default=50, help="сколько пользователей bench1..benchN создано")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность прогона, с")
+    parser.add_argument("--output", help="сохранить отчёт в JSON-файл")
+    parser.add_argument("--update", action="store_true", help="записать результаты как базовые")
+    sys.exit(_main(parser.parse_args()))
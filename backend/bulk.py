@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+import audit
+import config
+
+
+async def read_rows(request: Request) -> list:
+    # Тело запроса: JSON-массив объектов или CSV с заголовком (Content-Type: text/csv)
+    content_type = request.headers.get("content-type", "")
+    body = await request.body()
+    if "csv" in content_type:
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            rows = [{key: (value if value != "" else None) for key, value in row.items()} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Некорректный CSV: {e}")
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Некорректный JSON: {e}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Ожидается JSON-массив")
+    if len(rows) > config.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Не больше {config.BULK_MAX_ROWS} строк за запрос")
+    return rows
+
+
+def validate_rows(rows: list, model, key: str = None):
+    # Возвращает [(номер строки, модель)] и список ошибок по строкам; номера строк с 1
+    valid = []
+    errors = []
+    seen = {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": ["строка должна быть объектом"]})
+            continue
+        try:
+            item = model(**row)
+        except ValidationError as e:
+            errors.append({
+                "row": number,
+                "errors": [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()],
+            })
+            continue
+        value = getattr(item, key) if key else None
+        if value is not None:
+            if value in seen:
+                errors.append({"row": number, "errors": [f"{key} повторяется в строке {seen[value]}"]})
+                continue
+            seen[value] = number
+        valid.append((number, item))
+    return valid, errors
+
+
+async def reject_missing(conn, valid: list, errors: list, field: str, table: str) -> list:
+    # Проверка внешних ключей одним запросом вместо ошибки COPY на всю пачку
+    ids = list({getattr(item, field) for _, item in valid if getattr(item, field) is not None})
+    if not ids:
+        return valid
+    existing = {row["id"] for row in await conn.fetch(f"SELECT id FROM {table} WHERE id = ANY($1::int[])", ids)}
+    kept = []
+    for number, item in valid:
+        value = getattr(item, field)
+        if value is not None and value not in existing:
+            errors.append({"row": number, "errors": [f"{field}: запись {value} не найдена в {table}"]})
+        else:
+            kept.append((number, item))
+    return kept
+
+
+async def merge_rows(conn, table: str, columns: list, items: list, key: str = None) -> dict:
+    # Загрузка через COPY во временную таблицу и слияние двумя set-based запросами в одной транзакции.
+    # Уникального ограничения на key может не быть, поэтому вместо ON CONFLICT таблица блокируется от
+    # параллельных вставок на время слияния.
+    records = [tuple(getattr(item, col) for col in columns) for item in items]
+    cols = ", ".join(columns)
+    staging = f"_bulk_{table}"
+    # id изменённых строк по действию — для журнала аудита
+    ids = {"insert": [], "update": []}
+    if not records:
+        return ids
+    async with conn.transaction():
+        await conn.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA")
+        await conn.copy_records_to_table(staging, records=records, columns=columns)
+        if key:
+            await conn.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            assignments = ", ".join(f"{col} = s.{col}" for col in columns if col != key)
+            ids["update"] = [row["id"] for row in await conn.fetch(
+                f"UPDATE {table} t SET {assignments} FROM {staging} s WHERE t.{key} = s.{key} RETURNING t.id"
+            )]
+            ids["insert"] = [row["id"] for row in await conn.fetch(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {staging} s "
+                f"WHERE s.{key} IS NULL OR NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key}) "
+                f"RETURNING id"
+            )]
+        else:
+            ids["insert"] = [row["id"] for row in await conn.fetch(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {staging} RETURNING id"
+            )]
+    return ids
+
+
+async def import_rows(request: Request, table: str, model, columns: list, key: str = None,
+                      foreign_keys: dict = None, after=None) -> dict:
+    # after(conn, items) — дополнительный шаг в той же транзакции, что и слияние; его dict добавляется к ответу
+    rows = await read_rows(request)
+    valid, errors = validate_rows(rows, model, key)
+    extra = {}
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        for field, ref_table in (foreign_keys or {}).items():
+            valid = await reject_missing(conn, valid, errors, field, ref_table)
+        items = [item for _, item in valid]
+        try:
+            async with conn.transaction():
+                ids = await merge_rows(conn, table, columns, items, key)
+                if after is not None and items:
+                    extra = await after(conn, items)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    for action, record_ids in ids.items():
+        audit.record_many(request, action, table, record_ids)
+    errors.sort(key=lambda err: err["row"])
+    return {
+        "received": len(rows),
+        "inserted": len(ids["insert"]),
+        "updated": len(ids["update"]),
+        "failed": len(errors),
+        "errors": errors,
+        **extra,
+    }
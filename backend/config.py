@@ -1,13 +1,164 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Пул соединений asyncpg
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Общий лимит соединений на все воркеры: если задан, каждый воркер берёт свою долю (DB_POOL_MAX_SIZE
+# пересчитывается ниже, после настроек, от которых зависит число служебных соединений воркера)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+DB_MAX_QUERIES = int(os.getenv("DB_MAX_QUERIES", "50000"))
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30")) or None
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_SEARCH_PATH = os.getenv("DB_SEARCH_PATH", "")
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0").lower() in ("1", "true", "yes")
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+DB_POOL_CLOSE_TIMEOUT = float(os.getenv("DB_POOL_CLOSE_TIMEOUT", "10"))
+
+# Кэш ответов справочников; RESPONSE_CACHE_NOTIFY рассылает инвалидацию другим воркерам через LISTEN/NOTIFY.
+# Без рассылки изменение сбрасывает кэш только обработавшего его воркера, остальные до RESPONSE_CACHE_TTL
+# отдают старые ответы, поэтому при нескольких воркерах она включена всегда; выключить можно при одном
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_NOTIFY = (os.getenv("RESPONSE_CACHE_NOTIFY", "1").lower() in ("1", "true", "yes")
+                         or WEB_CONCURRENCY > 1)
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Кэш проверенных токенов; AUTH_STATELESS=1 доверяет подписанным claims (uid, role) без запроса к БД
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "0").lower() in ("1", "true", "yes")
+
+# Хэширование паролей: стоимость bcrypt и ограниченный пул потоков с очередью
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Пагинация списков
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "1000"))
+
+# Массовая загрузка: максимум строк в одном запросе
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+
+# Сколько последних обслуживаний показывать в профиле клиента (дальше — /clients/{id}/history)
+CLIENT_HISTORY_PREVIEW = int(os.getenv("CLIENT_HISTORY_PREVIEW", "10"))
+
+# Расписание: рабочие часы, шаг сетки слотов, длительность услуги по умолчанию (мин) и кэш дней
+WORKDAY_START = os.getenv("WORKDAY_START", "09:00")
+WORKDAY_END = os.getenv("WORKDAY_END", "18:00")
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "15"))
+DEFAULT_SERVICE_DURATION = int(os.getenv("DEFAULT_SERVICE_DURATION", "60"))
+BOOKABLE_ROLES = [role.strip() for role in os.getenv("BOOKABLE_ROLES", "mechanic").split(",") if role.strip()]
+AVAILABILITY_TTL = float(os.getenv("AVAILABILITY_TTL", "60"))
+AVAILABILITY_DAYS_CACHED = int(os.getenv("AVAILABILITY_DAYS_CACHED", "62"))
+
+# Потоковая выгрузка: сколько строк забирать из серверного курсора за раз
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Отчёты: период фонового пересчёта изменённых дней (сек), дней за транзакцию и кэш готовых отчётов
+REPORTS_REFRESH_INTERVAL = float(os.getenv("REPORTS_REFRESH_INTERVAL", "60"))
+REPORTS_REFRESH_BATCH_DAYS = int(os.getenv("REPORTS_REFRESH_BATCH_DAYS", "31"))
+REPORTS_CACHE_TTL = float(os.getenv("REPORTS_CACHE_TTL", "300"))
+REPORTS_CACHE_SIZE = int(os.getenv("REPORTS_CACHE_SIZE", "256"))
+
+# Склад: слушать уведомления о низком остатке (канал low_stock, отдельное соединение на воркер)
+INVENTORY_LOW_STOCK_LISTEN = os.getenv("INVENTORY_LOW_STOCK_LISTEN", "1").lower() in ("1", "true", "yes")
+
+# Аудит: очередь событий воркера, размер пачки COPY, период сброса (мс), таймаут записи (сек)
+# и каталог для событий, которые не удалось записать в БД
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_WRITE_TIMEOUT = float(os.getenv("AUDIT_WRITE_TIMEOUT", "5"))
+AUDIT_SPILL_DIR = os.getenv("AUDIT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "autoservice-audit"))
+
+# Инструментирование запросов: заголовок Server-Timing, время каждого SQL-запроса (хук asyncpg),
+# порог медленного запроса в мс (0 — не логировать), предел числа различных запросов в метриках
+# и выборочный профилировщик /internal/profile (по умолчанию выключен)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() in ("1", "true", "yes")
+INSTRUMENT_QUERIES = os.getenv("INSTRUMENT_QUERIES", "1").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "500"))
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+# Поток изменений записей (SSE /appointments/stream): LISTEN appointment_events на воркер, очередь
+# событий на подписчика, период пустых строк-пингов (сек), пауза переподключения клиента (мс),
+# сколько пропущенных событий досылать после переподключения и сколько часов хранить журнал
+APPOINTMENT_STREAM = os.getenv("APPOINTMENT_STREAM", "1").lower() in ("1", "true", "yes")
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+STREAM_BACKLOG_LIMIT = int(os.getenv("STREAM_BACKLOG_LIMIT", "5000"))
+STREAM_RETENTION_HOURS = float(os.getenv("STREAM_RETENTION_HOURS", "24"))
+# Соединение LISTEN (listener.py): проверка раз в LISTENER_CHECK_INTERVAL секунд, переподключение
+# с паузой от LISTENER_RETRY_MIN, удваивающейся до LISTENER_RETRY_MAX
+LISTENER_CHECK_INTERVAL = float(os.getenv("LISTENER_CHECK_INTERVAL", "10"))
+LISTENER_CHECK_TIMEOUT = float(os.getenv("LISTENER_CHECK_TIMEOUT", "5"))
+LISTENER_RETRY_MIN = float(os.getenv("LISTENER_RETRY_MIN", "0.5"))
+LISTENER_RETRY_MAX = float(os.getenv("LISTENER_RETRY_MAX", "30"))
+
+# Ограничение нагрузки: token bucket "запросов в секунду/запас" на пользователя (или IP без токена)
+# и для отдельных маршрутов ("METHOD /path=rate/burst; ..."), общее хранилище счётчиков (memory —
+# в воркере, postgres — таблица rate_limits общая для всех воркеров), предел одновременных запросов
+# к БД на воркер и сколько ждать места (мс), прежде чем ответить 503
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "50/100")
+RATE_LIMIT_ROUTES = os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "POST /auth/login=1/10; POST /auth/register=0.2/5; GET /cars=10/20; GET /search=10/20",
+)
+RATE_LIMIT_BACKEND_TIMEOUT = float(os.getenv("RATE_LIMIT_BACKEND_TIMEOUT", "0.05"))
+RATE_LIMIT_KEYS_MAX = int(os.getenv("RATE_LIMIT_KEYS_MAX", "100000"))
+# Отдельный пул счётчиков для RATE_LIMIT_BACKEND=postgres (admission.PostgresBackend)
+RATE_LIMIT_POOL_MAX_SIZE = 2
+
+# Кроме основного пула воркер держит служебные соединения к основной БД: одно LISTEN (listener.py),
+# если включён хоть один подписчик, и пул счётчиков лимитов при RATE_LIMIT_BACKEND=postgres. Всего
+# соединений: WEB_CONCURRENCY * (DB_POOL_MAX_SIZE + DB_AUX_CONNECTIONS) <= DB_CONNECTION_BUDGET, поэтому
+# основному пулу достаётся DB_CONNECTION_BUDGET // WEB_CONCURRENCY - DB_AUX_CONNECTIONS (не меньше 1)
+DB_AUX_CONNECTIONS = (
+    int(RESPONSE_CACHE_NOTIFY or INVENTORY_LOW_STOCK_LISTEN or APPOINTMENT_STREAM)
+    + (RATE_LIMIT_POOL_MAX_SIZE if RATE_LIMIT_BACKEND == "postgres" else 0)
+)
+if DB_CONNECTION_BUDGET:
+    DB_POOL_MAX_SIZE = max(1, DB_CONNECTION_BUDGET // max(WEB_CONCURRENCY, 1) - DB_AUX_CONNECTIONS)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(DB_POOL_MAX_SIZE * 4)))
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "200"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Реплики для чтения: DSN через запятую, размер пула каждой реплики, насколько реплика может отставать
+# от основной БД (сек), как часто проверять отставание (сек) и сколько ждать ответа проверки
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_POOL_MAX_SIZE = int(os.getenv("REPLICA_POOL_MAX_SIZE", str(DB_POOL_MAX_SIZE)))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "0.5"))
+REPLICA_CHECK_TIMEOUT = float(os.getenv("REPLICA_CHECK_TIMEOUT", "1"))
+
+# Архив закрытых записей (миграция 0011): фоновый перенос, через сколько месяцев закрытые и оплаченные
+# записи уходят в архив, размер пачки переноса, период задачи (сек), на сколько месяцев вперёд заводить
+# секции архива, через сколько месяцев секции выгружаются в сжатые файлы и каталог для них (пустой — не выгружать)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0").lower() in ("1", "true", "yes")
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_PARTITIONS_AHEAD = int(os.getenv("ARCHIVE_PARTITIONS_AHEAD", "3"))
+ARCHIVE_COLD_AFTER_MONTHS = int(os.getenv("ARCHIVE_COLD_AFTER_MONTHS", "36"))
+ARCHIVE_COLD_DIR = os.getenv("ARCHIVE_COLD_DIR", "")
@@ -0,0 +1,131 @@
+import json
+import time
+
+import asyncpg
+
+import config
+import instrumentation
+from metrics import Histogram
+
+
+async def init_connection(conn):
+    # Выполняется один раз для каждого нового соединения пула
+    await conn.set_type_codec("json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+    if config.DB_SEARCH_PATH:
+        await conn.execute(f"SET search_path TO {config.DB_SEARCH_PATH}")
+    if config.DB_STATEMENT_TIMEOUT_MS:
+        await conn.execute(f"SET statement_timeout = {int(config.DB_STATEMENT_TIMEOUT_MS)}")
+    if config.INSTRUMENT_QUERIES:
+        conn.add_query_logger(instrumentation.on_query)
+
+
+class _AcquireContext:
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.conn = None
+
+    async def _acquire(self):
+        pool = self.pool
+        pool.waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = await pool._pool.acquire(timeout=self.timeout)
+        except Exception:
+            pool.acquire_errors += 1
+            raise
+        finally:
+            pool.waiting -= 1
+        elapsed = time.perf_counter() - started
+        pool.acquire_latency.observe(elapsed)
+        instrumentation.acquired(elapsed)
+        pool.acquired += 1
+        return conn
+
+    async def __aenter__(self):
+        self.conn = await self._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        conn, self.conn = self.conn, None
+        await self.pool._pool.release(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class MeteredPool:
+    # Обёртка над asyncpg.Pool: считает ожидающих соединения и время ожидания acquire,
+    # остальные методы пула проксируются как есть
+    def __init__(self, pool: asyncpg.Pool, max_size: int):
+        self._pool = pool
+        self.max_size = max_size
+        self.waiting = 0
+        self.acquired = 0
+        self.acquire_errors = 0
+        self.acquire_latency = Histogram()
+
+    def acquire(self, *, timeout=None):
+        return _AcquireContext(self, timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query, *args, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, *, timeout=None):
+        async with self.acquire() as conn:
+            return await conn.executemany(command, args, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def stats(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "acquire_errors": self.acquire_errors,
+            "acquire_seconds": self.acquire_latency.snapshot(),
+        }
+
+
+async def connect(dsn: str = None) -> asyncpg.Connection:
+    # Отдельное долгоживущее соединение вне пула (LISTEN и т.п.)
+    conn = await asyncpg.connect(dsn or config.DATABASE_URL)
+    await init_connection(conn)
+    return conn
+
+
+async def create_pool(dsn: str = None, min_size: int = None, max_size: int = None) -> MeteredPool:
+    min_size = config.DB_POOL_MIN_SIZE if min_size is None else min_size
+    max_size = config.DB_POOL_MAX_SIZE if max_size is None else max_size
+    pool = await asyncpg.create_pool(
+        dsn or config.DATABASE_URL,
+        min_size=min(min_size, max_size),
+        max_size=max_size,
+        max_queries=config.DB_MAX_QUERIES,
+        max_inactive_connection_lifetime=config.DB_MAX_INACTIVE_LIFETIME,
+        command_timeout=config.DB_COMMAND_TIMEOUT,
+        statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+        init=init_connection,
+    )
+    return MeteredPool(pool, max_size)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+import config
+from metrics import Histogram
+
+# bcrypt отпускает GIL, поэтому потоков достаточно, чтобы не блокировать event loop
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=config.HASH_WORKERS, thread_name_prefix="bcrypt")
+
+stats = {
+    "in_flight": 0,   # выполняются или ждут свободного потока
+    "rejected": 0,
+    "completed": 0,
+}
+latency = Histogram()
+queue_wait = Histogram()
+
+
+async def _run(func, *args):
+    # Ограничиваем очередь: при переполнении сразу отвечаем 503, а не копим запросы
+    if stats["in_flight"] >= config.HASH_WORKERS + config.HASH_QUEUE_LIMIT:
+        stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Сервис авторизации перегружен, повторите попытку позже",
+            headers={"Retry-After": str(config.HASH_RETRY_AFTER)},
+        )
+    stats["in_flight"] += 1
+    enqueued = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        result = func(*args)
+        return started, time.perf_counter(), result
+
+    try:
+        started, finished, result = await asyncio.get_running_loop().run_in_executor(_executor, timed)
+    finally:
+        stats["in_flight"] -= 1
+    queue_wait.observe(started - enqueued)
+    latency.observe(finished - started)
+    stats["completed"] += 1
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run(pwd_context.verify, password, password_hash)
+
+
+def snapshot() -> dict:
+    return {
+        "workers": config.HASH_WORKERS,
+        "queue_limit": config.HASH_QUEUE_LIMIT,
+        "queue_depth": max(stats["in_flight"] - config.HASH_WORKERS, 0),
+        **stats,
+        "rounds": config.BCRYPT_ROUNDS,
+        "queue_wait_seconds": queue_wait.snapshot(),
+        "hash_seconds": latency.snapshot(),
+    }
+
+
+def shutdown():
+    _executor.shutdown(wait=True)
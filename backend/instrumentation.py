@@ -0,0 +1,208 @@
+import asyncio
+import functools
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+import config
+from metrics import Histogram, prometheus_counter, prometheus_histogram
+
+# Время запроса по составляющим: ожидание соединения пула, SQL-запросы (хук add_query_logger asyncpg,
+# подключается в db.init_connection) и сериализация ответа. Данные текущего запроса живут в contextvar,
+# их выставляет TimingMiddleware; итог уходит в заголовок Server-Timing и в метрики /internal/metrics.
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = "Server-Timing"
+UNMATCHED_ROUTE = "unmatched"
+OTHER_STATEMENT = "other"
+
+
+class RequestTimings:
+    __slots__ = ("acquire", "acquire_count", "db", "queries", "serialize", "route")
+
+    def __init__(self):
+        self.acquire = 0.0
+        self.acquire_count = 0
+        self.db = 0.0
+        self.queries = 0
+        self.serialize = 0.0
+        self.route = UNMATCHED_ROUTE
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+request_latency = defaultdict(Histogram)
+request_db_time = defaultdict(Histogram)
+request_acquire_time = defaultdict(Histogram)
+request_serialize_time = defaultdict(Histogram)
+responses = Counter()
+query_latency = defaultdict(Histogram)
+slow_queries = Counter()
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize(query: str) -> str:
+    # Литералы -> ?, пробелы схлопываются: запросы с разными значениями попадают в одну серию метрик.
+    # Параметры $n остаются как есть — их значения в текст запроса не попадают.
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub(lambda m: m.group(0) if m.string[m.start() - 1:m.start()] == "$" else "?", query)
+    query = _IN_LIST.sub("(?)", query)
+    return _SPACE.sub(" ", query).strip()
+
+
+def _redact(args) -> str:
+    # В лог попадают только типы параметров: значения могут содержать персональные данные
+    return "[" + ", ".join(type(arg).__name__ for arg in args or ()) + "]"
+
+
+def acquired(seconds: float):
+    # Вызывается из db._AcquireContext: ожидание соединения пула
+    timings = _current.get()
+    if timings is not None:
+        timings.acquire += seconds
+        timings.acquire_count += 1
+
+
+def serialized(seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.serialize += seconds
+
+
+def on_query(record):
+    # Хук asyncpg: вызывается через loop.call_soon с контекстом запроса, выполнившего SQL
+    statement = normalize(record.query)
+    if statement not in query_latency and len(query_latency) >= config.METRICS_MAX_STATEMENTS:
+        statement = OTHER_STATEMENT
+    query_latency[statement].observe(record.elapsed)
+    timings = _current.get()
+    if timings is not None:
+        timings.db += record.elapsed
+        timings.queries += 1
+    if config.SLOW_QUERY_MS and record.elapsed * 1000 >= config.SLOW_QUERY_MS:
+        slow_queries[statement] += 1
+        logger.warning(
+            "Медленный запрос %.1f мс (%s): %s; параметры %s",
+            record.elapsed * 1000,
+            timings.route if timings is not None else "вне запроса",
+            statement,
+            _redact(record.args),
+        )
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    return ", ".join([
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+        f"acquire;dur={timings.acquire * 1000:.1f}",
+        f"serialize;dur={timings.serialize * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+class TimingMiddleware:
+    # Чистый ASGI middleware: заголовок добавляется в http.response.start, без буферизации тела,
+    # поэтому потоковая выгрузка (export) не задерживается
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings.route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+                if config.SERVER_TIMING:
+                    # хук asyncpg отложен через call_soon: даём записать время последних запросов
+                    await asyncio.sleep(0)
+                    header = server_timing(timings, time.perf_counter() - started)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (SERVER_TIMING_HEADER.lower().encode(), header.encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            timings.route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            labels = (("method", scope["method"]), ("route", timings.route))
+            request_latency[labels].observe(time.perf_counter() - started)
+            request_db_time[labels].observe(timings.db)
+            request_acquire_time[labels].observe(timings.acquire)
+            request_serialize_time[labels].observe(timings.serialize)
+            responses[labels + (("status", status),)] += 1
+
+
+def prometheus(pool=None) -> str:
+    lines = []
+    lines += prometheus_histogram(
+        "http_request_duration_seconds", "Время обработки запроса", request_latency)
+    lines += prometheus_histogram(
+        "http_request_db_seconds", "Суммарное время SQL-запросов за HTTP-запрос", request_db_time)
+    lines += prometheus_histogram(
+        "http_request_pool_acquire_seconds", "Ожидание соединения пула за HTTP-запрос", request_acquire_time)
+    lines += prometheus_histogram(
+        "http_request_serialize_seconds", "Сериализация ответа", request_serialize_time)
+    lines += prometheus_counter("http_responses_total", "Ответы по статусу", responses)
+    lines += prometheus_histogram(
+        "db_query_duration_seconds", "Время SQL-запроса (нормализованный текст)",
+        {(("query", statement),): histogram for statement, histogram in query_latency.items()})
+    lines += prometheus_counter(
+        "db_slow_queries_total", f"Запросы дольше {config.SLOW_QUERY_MS:g} мс",
+        {(("query", statement),): count for statement, count in slow_queries.items()})
+    if pool is not None:
+        stats = pool.stats()
+        lines += prometheus_counter(
+            "db_pool_connections", "Соединения пула",
+            {(("state", state),): stats[state] for state in ("size", "idle", "in_use", "waiting")}, kind="gauge")
+        lines += prometheus_histogram("db_pool_acquire_seconds", "Ожидание соединения пула", {(): pool.acquire_latency})
+    return "\n".join(lines) + "\n"
+
+
+_profiling = threading.Lock()
+
+
+def _sample(thread_id: int, seconds: float, interval: float) -> Counter:
+    # Выполняется в отдельном потоке: раз в interval снимает стек потока цикла событий
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+async def profile(seconds: float, interval: float) -> Optional[str]:
+    # Стеки в формате collapsed (flamegraph.pl, speedscope); None — уже идёт другой сеанс
+    if not _profiling.acquire(blocking=False):
+        return None
+    try:
+        stacks = await asyncio.to_thread(_sample, threading.get_ident(), seconds, interval)
+    finally:
+        _profiling.release()
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
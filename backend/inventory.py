@@ -0,0 +1,153 @@
+import json
+import logging
+from collections import deque
+
+from fastapi import HTTPException
+
+# Резерв, списание и возврат запчастей по записи. Каждая операция — один SQL-оператор с условием
+# в UPDATE (остаток проверяется и меняется атомарно, без SELECT-then-UPDATE). Строки parts блокируются
+# в порядке id (CTE locked), поэтому параллельные списания по пересекающимся наборам запчастей
+# не дают взаимоблокировок. Ограничения parts_*_check — последняя линия защиты от ухода в минус.
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_CHANNEL = "low_stock"
+# Последние уведомления о низком остатке, полученные этим воркером
+recent_alerts = deque(maxlen=100)
+
+# Результат операций: по строке на запчасть из нормы услуги, ok = false — не хватило остатка
+RESERVE_SQL = """
+    WITH need AS (
+        SELECT sp.part_id, sp.quantity
+        FROM appointments a
+        JOIN service_parts sp ON sp.service_id = a.service_id
+        WHERE a.id = $1 AND sp.quantity > 0
+          AND NOT EXISTS (
+              SELECT 1 FROM part_reservations r
+              WHERE r.appointment_id = a.id AND r.part_id = sp.part_id AND r.status <> 'released'
+          )
+    ),
+    locked AS (
+        SELECT p.id FROM parts p WHERE p.id IN (SELECT part_id FROM need) ORDER BY p.id FOR UPDATE
+    ),
+    upd AS (
+        UPDATE parts p SET reserved_qty = p.reserved_qty + n.quantity
+        FROM need n JOIN locked l ON l.id = n.part_id
+        WHERE p.id = n.part_id AND p.stock_qty - p.reserved_qty >= n.quantity
+        RETURNING p.id, n.quantity, p.stock_qty, p.reserved_qty
+    ),
+    ins AS (
+        INSERT INTO part_reservations (appointment_id, part_id, quantity, status)
+        SELECT $1, id, quantity, 'reserved' FROM upd
+        ON CONFLICT (appointment_id, part_id) DO UPDATE
+            SET status = 'reserved', quantity = EXCLUDED.quantity, updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT n.part_id, n.quantity, upd.id IS NOT NULL AS ok, upd.stock_qty, upd.reserved_qty
+    FROM need n LEFT JOIN upd ON upd.id = n.part_id
+    ORDER BY n.part_id
+"""
+
+# Списывает всё по норме услуги: зарезервированное — из резерва, остальное — из доступного остатка
+CONSUME_SQL = """
+    WITH need AS (
+        SELECT sp.part_id,
+               CASE WHEN r.status = 'reserved' THEN r.quantity ELSE sp.quantity END AS quantity,
+               COALESCE(r.status = 'reserved', FALSE) AS reserved
+        FROM appointments a
+        JOIN service_parts sp ON sp.service_id = a.service_id
+        LEFT JOIN part_reservations r ON r.appointment_id = a.id AND r.part_id = sp.part_id
+        WHERE a.id = $1 AND sp.quantity > 0 AND r.status IS DISTINCT FROM 'consumed'
+    ),
+    locked AS (
+        SELECT p.id FROM parts p WHERE p.id IN (SELECT part_id FROM need) ORDER BY p.id FOR UPDATE
+    ),
+    upd AS (
+        UPDATE parts p
+        SET stock_qty = p.stock_qty - n.quantity,
+            reserved_qty = p.reserved_qty - CASE WHEN n.reserved THEN n.quantity ELSE 0 END
+        FROM need n JOIN locked l ON l.id = n.part_id
+        WHERE p.id = n.part_id AND (n.reserved OR p.stock_qty - p.reserved_qty >= n.quantity)
+        RETURNING p.id, n.quantity, p.stock_qty, p.reserved_qty
+    ),
+    ins AS (
+        INSERT INTO part_reservations (appointment_id, part_id, quantity, status)
+        SELECT $1, id, quantity, 'consumed' FROM upd
+        ON CONFLICT (appointment_id, part_id) DO UPDATE
+            SET status = 'consumed', quantity = EXCLUDED.quantity, updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT n.part_id, n.quantity, upd.id IS NOT NULL AS ok, upd.stock_qty, upd.reserved_qty
+    FROM need n LEFT JOIN upd ON upd.id = n.part_id
+    ORDER BY n.part_id
+"""
+
+RELEASE_SQL = """
+    WITH rel AS (
+        UPDATE part_reservations
+        SET status = 'released', updated_at = CURRENT_TIMESTAMP
+        WHERE appointment_id = $1 AND status = 'reserved'
+        RETURNING part_id, quantity
+    ),
+    locked AS (
+        SELECT p.id FROM parts p WHERE p.id IN (SELECT part_id FROM rel) ORDER BY p.id FOR UPDATE
+    )
+    UPDATE parts p SET reserved_qty = p.reserved_qty - rel.quantity
+    FROM rel JOIN locked l ON l.id = rel.part_id
+    WHERE p.id = rel.part_id
+    RETURNING p.id AS part_id, rel.quantity, TRUE AS ok, p.stock_qty, p.reserved_qty
+"""
+
+# Приход/списание вручную: остаток не может стать меньше зарезервированного
+ADJUST_SQL = """
+    UPDATE parts SET stock_qty = stock_qty + $2
+    WHERE id = $1 AND stock_qty + $2 >= reserved_qty
+    RETURNING id AS part_id, stock_qty, reserved_qty
+"""
+
+
+async def _apply(conn, query: str, appointment_id: int) -> list:
+    # Оператор и проверка результата в одной транзакции: при нехватке хотя бы одной позиции
+    # откатываются все изменения по записи
+    async with conn.transaction():
+        rows = await conn.fetch(query, appointment_id)
+        if not rows and not await conn.fetchval("SELECT 1 FROM appointments WHERE id = $1", appointment_id):
+            raise HTTPException(status_code=404, detail="Запись не найдена")
+        short = [row["part_id"] for row in rows if not row["ok"]]
+        if short:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Недостаточно запчастей на складе", "part_ids": short},
+            )
+    return rows
+
+
+async def reserve(conn, appointment_id: int) -> list:
+    return await _apply(conn, RESERVE_SQL, appointment_id)
+
+
+async def consume(conn, appointment_id: int) -> list:
+    return await _apply(conn, CONSUME_SQL, appointment_id)
+
+
+async def release(conn, appointment_id: int) -> list:
+    return await _apply(conn, RELEASE_SQL, appointment_id)
+
+
+async def adjust(conn, part_id: int, delta: int):
+    row = await conn.fetchrow(ADJUST_SQL, part_id, delta)
+    if row is None:
+        if not await conn.fetchval("SELECT 1 FROM parts WHERE id = $1", part_id):
+            raise HTTPException(status_code=404, detail="Запчасть не найдена")
+        raise HTTPException(status_code=409, detail="Остаток не может быть меньше зарезервированного")
+    return row
+
+
+def _on_low_stock(conn, pid, channel, payload):
+    alert = json.loads(payload)
+    recent_alerts.append(alert)
+    logger.warning("Низкий остаток: %s (%s), доступно %s при пороге %s",
+                   alert["name"], alert["sku"], alert["stock_qty"] - alert["reserved_qty"],
+                   alert["low_stock_threshold"])
+
+
+async def start_listener(listener):
+    await listener.add_listener(LOW_STOCK_CHANNEL, _on_low_stock)
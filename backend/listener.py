@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+import config
+import db
+
+# Общее соединение воркера для LISTEN: инвалидация кэша ответов, уведомления склада, поток записей.
+# asyncpg не восстанавливает соединение сам, и после обрыва (перезапуск или переключение БД, таймаут
+# простоя на прокси) уведомления просто перестают приходить. Обрыв замечается по сигналу asyncpg или
+# по неудачной проверке SELECT 1 раз в LISTENER_CHECK_INTERVAL; соединение открывается заново с
+# нарастающей паузой, каналы подписываются повторно, и вызываются on_reconnect подписчиков —
+# уведомления за время обрыва потеряны, и подписчик должен восполнить их сам.
+
+logger = logging.getLogger(__name__)
+
+
+class Listener:
+    def __init__(self):
+        self.conn = None
+        self.reconnects = 0
+        self._channels = {}
+        self._on_reconnect = []
+        self._lost = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        self.conn = await self._connect()
+        self._task = asyncio.create_task(self._supervise())
+
+    async def add_listener(self, channel: str, callback, on_reconnect=None):
+        # Та же сигнатура, что у asyncpg.Connection.add_listener, и необязательный on_reconnect()
+        self._channels[channel] = callback
+        if on_reconnect is not None:
+            self._on_reconnect.append(on_reconnect)
+        await self.conn.add_listener(channel, callback)
+
+    async def _connect(self):
+        conn = await db.connect()
+        try:
+            for channel, callback in self._channels.items():
+                await conn.add_listener(channel, callback)
+        except Exception:
+            conn.terminate()
+            raise
+        conn.add_termination_listener(self._terminated)
+        return conn
+
+    def _terminated(self, conn):
+        if conn is self.conn:
+            self._lost.set()
+
+    async def _alive(self) -> bool:
+        try:
+            await asyncio.wait_for(self._lost.wait(), config.LISTENER_CHECK_INTERVAL)
+            return False
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await self.conn.fetchval("SELECT 1", timeout=config.LISTENER_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _supervise(self):
+        while True:
+            if await self._alive():
+                continue
+            logger.warning("Соединение LISTEN потеряно, переподключение")
+            self.conn.terminate()
+            delay = config.LISTENER_RETRY_MIN
+            while True:
+                try:
+                    conn = await self._connect()
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.warning("Не удалось переподключить LISTEN, повтор через %.1f с", delay, exc_info=True)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, config.LISTENER_RETRY_MAX)
+            self._lost.clear()
+            self.conn = conn
+            self.reconnects += 1
+            for callback in self._on_reconnect:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Ошибка обработчика переподключения LISTEN")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.conn is not None:
+            await self.conn.close()
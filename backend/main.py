@@ -1,6 +1,19 @@
-from fastapi import FastAPI
-import asyncpg
+from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import admission
+import archive
+import appointment_stream
+import audit
 import config
+import db
+import hashing
+import instrumentation
+import inventory
+import listener
+import migrations
+import response_cache
+import replicas
+import rollups
 from routers.clients import router as clients_router
 from routers.cars import router as cars_router
 from routers.services import router as services_router
@@ -12,10 +25,33 @@ from routers.employees import router as employees_router
 from routers.parts import router as parts_router
 from routers.categories import router as categories_router
 from routers.reviews import router as reviews_router
+from routers.export import router as export_router
+from routers.internal import router as internal_router
+from routers.availability import router as availability_router
+from routers.search import router as search_router
+from routers.reports import router as reports_router
+from routers.inventory import router as inventory_router
+from routers.audit import router as audit_router
+from routers.payments import router as payments_router, REPLAYED_HEADER
+from routers.views import router as views_router
+from routers.archive import router as archive_router
+from pagination import NEXT_CURSOR_HEADER
+from routers.reports import REFRESHED_AT_HEADER
+from serialization import FastJSONResponse
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Auto Service API")
+app = FastAPI(title="Auto Service API", default_response_class=FastJSONResponse)
+
+# GET-запросы — на реплику, догнавшую последнюю запись клиента (при заданных DATABASE_REPLICA_URLS)
+app.add_middleware(replicas.ReplicaMiddleware)
+
+# Лимиты запросов и предел одновременно выполняемых запросов; внутри TimingMiddleware и CORS,
+# чтобы отказы 429/503 попадали в метрики и читались браузером
+app.add_middleware(admission.AdmissionMiddleware)
+
+# Время запроса по составляющим (Server-Timing и /internal/metrics)
+app.add_middleware(instrumentation.TimingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,16 +59,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        NEXT_CURSOR_HEADER, "ETag", "Last-Modified", REFRESHED_AT_HEADER, instrumentation.SERVER_TIMING_HEADER,
+        REPLAYED_HEADER, "Retry-After", replicas.READ_AFTER_HEADER, appointment_stream.STREAM_CURSOR_HEADER,
+    ],
 )
 
 
 @app.on_event("startup")
 async def startup():
-    app.state.pool = await asyncpg.create_pool(config.DATABASE_URL)
+    app.state.pool = await db.create_pool()
+    if config.MIGRATE_ON_STARTUP:
+        # Миграции применяет первый стартовавший воркер, остальные не ждут его (см. apply_migrations)
+        async with app.state.pool.acquire() as conn:
+            await migrations.apply_migrations(conn, wait=False)
+    # Реплики для чтения: отставание проверяется в фоне, запросы распределяет ReplicaMiddleware
+    app.state.replica_checker = asyncio.create_task(replicas.run_checker(app.state.pool))
+    if config.DATABASE_REPLICA_URLS:
+        app.state.pool = replicas.RoutingPool(app.state.pool)
+    # Хранилище счётчиков лимитов (для postgres — свой маленький пул)
+    await admission.start()
+    # Одно соединение на воркер для LISTEN: инвалидация кэша ответов, уведомления склада, поток записей;
+    # при обрыве переподключается само (listener.py)
+    app.state.listener = None
+    if config.RESPONSE_CACHE_NOTIFY or config.INVENTORY_LOW_STOCK_LISTEN or config.APPOINTMENT_STREAM:
+        app.state.listener = listener.Listener()
+        await app.state.listener.start()
+    if config.RESPONSE_CACHE_NOTIFY:
+        await response_cache.start_listener(app.state.listener)
+    if config.INVENTORY_LOW_STOCK_LISTEN:
+        await inventory.start_listener(app.state.listener)
+    if config.APPOINTMENT_STREAM:
+        await appointment_stream.start_listener(app.state.listener)
+    # Фоновый пересчёт дневных агрегатов отчётов (между воркерами — через advisory lock)
+    app.state.rollups_task = asyncio.create_task(rollups.run_scheduler(app.state.pool))
+    # Пакетная запись журнала аудита
+    app.state.audit_task = asyncio.create_task(audit.run_writer(app.state.pool))
+    # Очистка журнала событий потока записей
+    app.state.stream_pruner = asyncio.create_task(appointment_stream.run_pruner(app.state.pool))
+    # Перенос закрытых месяцев в архив (ARCHIVE_ENABLED; между воркерами — через advisory lock)
+    app.state.archive_task = asyncio.create_task(archive.run_scheduler(app.state.pool))
 
 @app.on_event("shutdown")
 async def shutdown():
-    await app.state.pool.close()
+    for task in (app.state.rollups_task, app.state.audit_task, app.state.stream_pruner, app.state.replica_checker,
+                 app.state.archive_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # События аудита, оставшиеся в очереди, пишем до закрытия пула (при ошибке они уйдут на диск)
+    await audit.flush(app.state.pool)
+    if app.state.listener is not None:
+        await app.state.listener.close()
+    await admission.close()
+    await replicas.close()
+    # uvicorn уже дождался текущих запросов; даём соединениям вернуться в пул, затем закрываем принудительно
+    try:
+        await asyncio.wait_for(app.state.pool.close(), timeout=config.DB_POOL_CLOSE_TIMEOUT)
+    except asyncio.TimeoutError:
+        app.state.pool.terminate()
+    hashing.shutdown()
+
+@app.get("/health", summary="Проверка доступности API и БД")
+async def health(request: Request):
+    try:
+        await request.app.state.pool.fetchval("SELECT 1", timeout=config.HEALTH_CHECK_TIMEOUT)
+    except Exception:
+        raise HTTPException(status_code=503, detail="База данных недоступна")
+    return {"status": "ok"}
 
 # Регистрируем роутеры
 app.include_router(auth_router)
@@ -44,3 +140,13 @@ app.include_router(employees_router)
 app.include_router(parts_router)
 app.include_router(categories_router)
 app.include_router(reviews_router)
+app.include_router(export_router)
+app.include_router(internal_router)
+app.include_router(availability_router)
+app.include_router(search_router)
+app.include_router(reports_router)
+app.include_router(inventory_router)
+app.include_router(audit_router)
+app.include_router(payments_router)
+app.include_router(views_router)
+app.include_router(archive_router)
@@ -0,0 +1,59 @@
+import bisect
+
+# Границы бакетов в секундах, как у prometheus_client по умолчанию
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    # Гистограмма длительностей в памяти процесса (кумулятивные бакеты при выдаче)
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative.append({"le": bound, "count": total})
+        cumulative.append({"le": "+Inf", "count": self.count})
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": cumulative}
+
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    # labels — кортеж пар (имя, значение), как ключи словарей series ниже
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def prometheus_histogram(name: str, help_text: str, series: dict) -> list:
+    # series — {кортеж меток: Histogram}; строки текстового формата Prometheus
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series.items():
+        total = 0
+        bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, histogram.counts):
+            total += count
+            lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {total}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+
+def prometheus_counter(name: str, help_text: str, series: dict, kind: str = "counter") -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in series.items())
+    return lines
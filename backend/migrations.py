@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import re
+from pathlib import Path
+from typing import Optional
+
+import asyncpg
+
+import config
+
+# Версионированные изменения схемы поверх bd/init.sql: bd/migrations/NNNN_name.sql, применяются по порядку имён.
+# Файл, первая строка которого "-- no-transaction", выполняется по одной команде вне транзакции
+# (нужно для CREATE INDEX CONCURRENTLY).
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "bd" / "migrations"
+NO_TRANSACTION_MARKER = "-- no-transaction"
+# Ключ advisory lock, чтобы несколько воркеров при старте не применяли миграции одновременно
+LOCK_KEY = 7301001
+# CREATE INDEX CONCURRENTLY, прерванный ошибкой (в том числе deadlock), оставляет индекс с
+# indisvalid = false, который IF NOT EXISTS затем пропускает: такие индексы пересоздаются
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+INVALID_INDEXES_SQL = """
+SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+WHERE NOT i.indisvalid AND c.relname = ANY($1::text[])
+"""
+
+
+def available_migrations() -> list:
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+
+def _statements(sql: str) -> list:
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def _ensure_table(conn):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+async def applied_migrations(conn) -> set:
+    await _ensure_table(conn)
+    rows = await conn.fetch("SELECT version FROM schema_migrations")
+    return {row["version"] for row in rows}
+
+
+def _concurrent_indexes(statements: list) -> dict:
+    # {имя индекса: создающая его команда}
+    indexes = {}
+    for statement in statements:
+        match = CONCURRENT_INDEX_RE.match(statement)
+        if match:
+            indexes[match.group(1)] = statement
+    return indexes
+
+
+async def invalid_indexes(conn) -> list:
+    # Невалидные индексы из миграций без транзакции (уже применённых в том числе)
+    names = []
+    for path in available_migrations():
+        sql = path.read_text(encoding="utf-8")
+        if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+            names += _concurrent_indexes(_statements(sql))
+    rows = await conn.fetch(INVALID_INDEXES_SQL, names)
+    return [row["relname"] for row in rows]
+
+
+async def _rebuild_invalid_indexes(conn, statements: list):
+    indexes = _concurrent_indexes(statements)
+    for row in await conn.fetch(INVALID_INDEXES_SQL, list(indexes)):
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {row['relname']}")
+        await conn.execute(indexes[row["relname"]])
+
+
+async def apply_migrations(conn, wait: bool = True) -> Optional[list]:
+    # Возвращает список применённых в этот раз версий. wait=False (старт воркера): если миграции уже
+    # применяет другой процесс, сразу None. Ожидающий pg_advisory_lock воркер держит снимок, которого
+    # ждёт CREATE INDEX CONCURRENTLY держателя блокировки, и детектор взаимоблокировок прерывает одного из них.
+    if wait:
+        await conn.execute("SELECT pg_advisory_lock($1)", LOCK_KEY)
+    elif not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LOCK_KEY):
+        return None
+    try:
+        applied = await applied_migrations(conn)
+        done = []
+        for path in available_migrations():
+            version = path.stem
+            sql = path.read_text(encoding="utf-8")
+            no_transaction = sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+            if version in applied:
+                if no_transaction:
+                    await _rebuild_invalid_indexes(conn, _statements(sql))
+                continue
+            if no_transaction:
+                statements = _statements(sql)
+                await _rebuild_invalid_indexes(conn, statements)
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+            else:
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+            done.append(version)
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+
+
+async def _main(args):
+    conn = await asyncpg.connect(args.dsn or config.DATABASE_URL)
+    try:
+        if args.command == "status":
+            applied = await applied_migrations(conn)
+            for path in available_migrations():
+                print(f"{'applied' if path.stem in applied else 'pending'}  {path.stem}")
+            for name in await invalid_indexes(conn):
+                print(f"invalid  {name} (пересоздаётся командой up)")
+        else:
+            done = await apply_migrations(conn)
+            print("\n".join(done) if done else "Нет новых миграций")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    parser.add_argument("--dsn", help="строка подключения (по умолчанию DATABASE_URL)")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+import config
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Where:
+    # Накопитель условий WHERE с позиционными параметрами $1, $2, ...
+    def __init__(self):
+        self.conditions = []
+        self.args = []
+
+    def add(self, clause: str, value):
+        # clause содержит "{}" на месте параметра, например "status = {}"
+        if value is None:
+            return self
+        self.args.append(value)
+        self.conditions.append(clause.format(f"${len(self.args)}"))
+        return self
+
+    def sql(self, conditions=None) -> str:
+        conditions = self.conditions if conditions is None else conditions
+        if not conditions:
+            return ""
+        return " WHERE " + " AND ".join(conditions)
+
+
+class PageParams:
+    def __init__(self, limit: int, sort: str, order: str, cursor: Optional[list]):
+        self.limit = limit
+        self.sort = sort
+        self.order = order
+        self.cursor = cursor
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    payload = json.dumps({"s": sort, "v": [_dump_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_load_value(v) for v in payload["v"]]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    if payload.get("s") != sort:
+        raise HTTPException(status_code=400, detail="Курсор не соответствует сортировке")
+    return values
+
+
+def page_params(*sort_fields: str, default_order: str = "asc"):
+    # Зависимость FastAPI: limit/cursor/sort/order, сортировка только по разрешённым колонкам
+    sort_fields = sort_fields or ("id",)
+
+    def dependency(
+        limit: int = Query(config.PAGE_DEFAULT_LIMIT, ge=1, le=config.PAGE_MAX_LIMIT),
+        cursor: Optional[str] = Query(None, description="Значение X-Next-Cursor предыдущей страницы"),
+        sort: str = Query(sort_fields[0], description="Колонка сортировки: " + ", ".join(sort_fields)),
+        order: str = Query(default_order, description="asc или desc"),
+    ) -> PageParams:
+        if sort not in sort_fields:
+            raise HTTPException(status_code=400, detail=f"Сортировка возможна только по: {', '.join(sort_fields)}")
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order должен быть asc или desc")
+        values = decode_cursor(cursor, sort) if cursor else None
+        return PageParams(limit, sort, order, values)
+
+    return dependency
+
+
+def page_query(select_sql: str, where: Where, page: PageParams, id_column: str = "id") -> tuple:
+    # Keyset-пагинация: (sort, id) > (последнее значение) вместо OFFSET, выбираем limit + 1 строку,
+    # чтобы понять, есть ли следующая страница. Возвращает (запрос, параметры); отдельно от fetch_page,
+    # чтобы plan_check проверял ровно тот же текст запроса
+    args = list(where.args)
+    conditions = list(where.conditions)
+    op = ">" if page.order == "asc" else "<"
+    if page.cursor is not None:
+        if page.sort == id_column:
+            if len(page.cursor) != 1:
+                raise HTTPException(status_code=400, detail="Некорректный курсор")
+            args.append(page.cursor[0])
+            conditions.append(f"{id_column} {op} ${len(args)}")
+        else:
+            if len(page.cursor) != 2:
+                raise HTTPException(status_code=400, detail="Некорректный курсор")
+            args.extend(page.cursor)
+            conditions.append(f"({page.sort}, {id_column}) {op} (${len(args) - 1}, ${len(args)})")
+    order_by = f"{id_column} {page.order}"
+    if page.sort != id_column:
+        order_by = f"{page.sort} {page.order}, {order_by}"
+    return f"{select_sql}{where.sql(conditions)} ORDER BY {order_by} LIMIT {page.limit + 1}", args
+
+
+async def fetch_page(conn, select_sql: str, where: Where, page: PageParams, response: Response, id_column: str = "id"):
+    query, args = page_query(select_sql, where, page, id_column)
+    rows = await conn.fetch(query, *args)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        last_id = last[id_column.split(".")[-1]]
+        key = [last_id] if page.sort == id_column else [last[page.sort.split(".")[-1]], last_id]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page.sort, key)
+    return rows
@@ -0,0 +1,108 @@
+import hashlib
+
+import asyncpg
+from fastapi import HTTPException
+
+# Платежи по записям. Повторный POST с тем же Idempotency-Key не создаёт второй платёж: ключ уникален
+# (миграция 0008), вставка идёт через ON CONFLICT DO NOTHING, а при конфликте возвращается уже
+# сохранённый платёж. Сумма к оплате — услуга со скидкой клиента плюс списанные по записи запчасти;
+# отметка appointments.paid_at ставится и снимается одним UPDATE по всем затронутым записям.
+# Перед вставкой и пересчётом записи блокируются (LOCK_SQL): иначе параллельные частичные оплаты одной
+# записи видят в снимке только свой платёж, и ни одна не ставит paid_at, хотя вместе долг погашен.
+# Пересчёт идёт отдельным оператором после блокировки и видит всё, что успели зафиксировать другие.
+
+PAID_STATUS = "paid"
+PAYMENT_COLUMNS = "id, appointment_id, amount, payment_date, payment_method, status, terminal_ref, created_at"
+
+# Долг по записи: один проход с агрегатами в LATERAL, годится и для одной записи, и для страницы списка
+BALANCE_SQL = """
+    SELECT a.id AS appointment_id, a.client_id, a.appointment_date, a.status, a.paid_at,
+           d.due, COALESCE(pay.amount, 0) AS paid, d.due - COALESCE(pay.amount, 0) AS balance
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    JOIN clients c ON c.id = a.client_id
+    LEFT JOIN LATERAL (
+        SELECT sum(r.quantity * p.sale_price) AS amount
+        FROM part_reservations r JOIN parts p ON p.id = r.part_id
+        WHERE r.appointment_id = a.id AND r.status = 'consumed'
+    ) parts_used ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT sum(amount) AS amount FROM payments WHERE appointment_id = a.id AND status = 'paid'
+    ) pay ON TRUE
+    CROSS JOIN LATERAL (
+        SELECT round(s.price * (1 - COALESCE(c.discount, 0)::numeric / 100), 2)
+               + COALESCE(parts_used.amount, 0) AS due
+    ) d"""
+
+# paid_at меняется только у записей, чьё состояние оплаты изменилось: погашен долг или оплата отменена
+MARK_PAID_SQL = f"""
+    UPDATE appointments a
+    SET paid_at = CASE WHEN b.balance <= 0 THEN now() END
+    FROM ({BALANCE_SQL} WHERE a.id = ANY($1::int[])) b
+    WHERE a.id = b.appointment_id AND (a.paid_at IS NULL) = (b.balance <= 0)
+    RETURNING a.id, a.paid_at
+"""
+
+# Порядок по id — две транзакции с пересекающимися наборами записей не блокируют друг друга крест-накрест
+LOCK_SQL = "SELECT id FROM appointments WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE"
+
+INSERT_SQL = f"""
+    INSERT INTO payments (appointment_id, amount, payment_date, payment_method, status,
+                          idempotency_key, request_hash)
+    VALUES ($1, $2, COALESCE($3, now()), $4, $5, $6, $7)
+    ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+    RETURNING {PAYMENT_COLUMNS}
+"""
+
+
+def request_hash(item) -> str:
+    return hashlib.sha256(item.model_dump_json().encode()).hexdigest()
+
+
+async def lock_appointments(conn, appointment_ids: list):
+    # Только внутри транзакции: блокировка держится до её конца
+    await conn.execute(LOCK_SQL, list(set(appointment_ids)))
+
+
+async def mark_paid(conn, appointment_ids: list) -> list:
+    ids = list(set(appointment_ids))
+    if not ids:
+        return []
+    await lock_appointments(conn, ids)
+    return await conn.fetch(MARK_PAID_SQL, ids)
+
+
+async def create(conn, item, idempotency_key: str = None) -> tuple:
+    # Возвращает (платёж, повтор ли это запроса с уже использованным ключом)
+    digest = request_hash(item)
+    async with conn.transaction():
+        await lock_appointments(conn, [item.appointment_id])
+        try:
+            row = await conn.fetchrow(
+                INSERT_SQL, item.appointment_id, item.amount, item.payment_date, item.payment_method,
+                item.status, idempotency_key, digest
+            )
+        except asyncpg.ForeignKeyViolationError:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        except asyncpg.CheckViolationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if row is None:
+            # ключ уже использован: параллельная вставка дождалась коммита первой и попала сюда
+            existing = await conn.fetchrow(
+                f"SELECT {PAYMENT_COLUMNS}, request_hash FROM payments WHERE idempotency_key = $1", idempotency_key
+            )
+            if existing["request_hash"] != digest:
+                raise HTTPException(status_code=422, detail="Idempotency-Key уже использован с другим телом запроса")
+            return {name: existing[name] for name in existing.keys() if name != "request_hash"}, True
+        if item.status == PAID_STATUS:
+            await mark_paid(conn, [item.appointment_id])
+    return row, False
+
+
+async def settle(conn, items: list) -> dict:
+    # Вызывается bulk.import_rows в транзакции загрузки файла сверки
+    changed = await mark_paid(conn, [item.appointment_id for item in items])
+    return {
+        "appointments_paid": sum(1 for row in changed if row["paid_at"] is not None),
+        "appointments_reopened": sum(1 for row in changed if row["paid_at"] is None),
+    }
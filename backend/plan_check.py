@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import inspect
+import json
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+import asyncpg
+
+import config
+import migrations
+import payments
+from pagination import PageParams, page_query
+from routers import (
+    appointments, archive, audit, auth, cars, clients, export, parts, reports, reviews, search, services, views,
+)
+from routers import payments as payments_router
+
+# Проверка планов запросов роутеров: EXPLAIN (FORMAT JSON) с enable_seqscan=off на засеянной БД.
+# Если в плане остался Seq Scan, подходящего индекса нет. Стоимость сравнивается с bd/plan_baseline.json;
+# без файла или без стоимости запроса в нём проверка не проходит. Тексты запросов не копируются сюда,
+# а собираются из констант и функций самих роутеров (фильтры, fetch_page через page_query), поэтому
+# проверяется ровно то, что выполняет приложение.
+#   python plan_check.py --setup      # пустая БД: init.sql + seed.sql + миграции, затем проверка
+#   python plan_check.py --update     # перезаписать базовые стоимости
+BD_DIR = Path(__file__).resolve().parent.parent / "bd"
+BASELINE_PATH = BD_DIR / "plan_baseline.json"
+COST_TOLERANCE = 0.2
+LIMIT = config.PAGE_DEFAULT_LIMIT
+JULY = (datetime(2023, 7, 1), datetime(2023, 8, 1))
+JULY_DAYS = (date(2023, 7, 1), date(2023, 8, 1))
+
+
+def _filters(dependency, **values):
+    # Зависимость-фильтр роутера, как её вызвал бы FastAPI: непереданные параметры — None
+    return dependency(**{name: values.get(name) for name in inspect.signature(dependency).parameters})
+
+
+def _page(select_sql: str, where, sort: str = "id", order: str = "asc", cursor: list = None,
+          id_column: str = "id") -> tuple:
+    # Первая (cursor=None) или следующая страница — тем же page_query, что и fetch_page
+    return page_query(select_sql, where, PageParams(LIMIT, sort, order, cursor), id_column)
+
+
+def _search(q: str, name: str) -> tuple:
+    return search.search_query(q, [name], 20)
+
+
+def _day_view(day: date) -> tuple:
+    where = _filters(views.day_filters, day=day)
+    return views.day_query(views.parse_fields(views.DEFAULT_DAY_FIELDS), tuple(where.conditions)), where.args
+
+
+QUERIES = {
+    "auth.get_current_user": (auth.CURRENT_USER_SQL, ["admin"]),
+    "clients.get_clients": _page(clients.CLIENTS_SQL, _filters(clients.client_filters), cursor=[0]),
+    "clients.get_clients.by_last_name": _page(
+        clients.CLIENTS_SQL, _filters(clients.client_filters), sort="last_name", cursor=["A", 0]
+    ),
+    "clients.get_client": (clients.CLIENT_DETAIL_SQL, [1, config.CLIENT_HISTORY_PREVIEW + 1]),
+    "clients.get_client_history": _page(
+        clients.HISTORY_SQL, clients.history_filters(1), sort=clients.HISTORY_SORT, order="desc",
+        cursor=[datetime(2030, 1, 1), 2 ** 31 - 1], id_column="a.id",
+    ),
+    "cars.by_client": _page(cars.CARS_SQL, _filters(cars.car_filters, client_id=1)),
+    "appointments.by_client": _page(appointments.APPOINTMENTS_SQL, _filters(appointments.appointment_filters, client_id=1)),
+    "appointments.by_period": _page(
+        appointments.APPOINTMENTS_SQL,
+        _filters(appointments.appointment_filters, date_from=JULY[0], date_to=JULY[1]),
+        sort="appointment_date",
+    ),
+    "appointments.by_car": _page(appointments.APPOINTMENTS_SQL, _filters(appointments.appointment_filters, car_id=1)),
+    "appointments.by_employee": _page(
+        appointments.APPOINTMENTS_SQL,
+        _filters(appointments.appointment_filters, employee_id=1, date_from=JULY[0], date_to=JULY[1]),
+        sort="appointment_date",
+    ),
+    "parts.by_sku": _page(parts.PARTS_SQL, _filters(parts.part_filters, sku="EO-1234")),
+    "reviews.by_appointment": _page(
+        reviews.REVIEWS_SQL, _filters(reviews.review_filters, appointment_id=1), order="desc"
+    ),
+    "services.by_category": _page(services.SERVICES_SQL, _filters(services.service_filters, category_id=1)),
+    "search.clients": _search("ivan", "clients"),
+    # цифр в запросе три и больше — включаются ветви по телефону
+    "search.clients.phone": _search("555", "clients"),
+    "search.cars": _search("A123", "cars"),
+    "search.parts": _search("EO-1", "parts"),
+    "export.payments.by_period": (
+        export.export_query(
+            "payments", export.PAYMENT_COLUMNS, _filters(export.payment_filters, date_from=JULY[0], date_to=JULY[1])
+        ),
+        list(JULY),
+    ),
+    "audit.by_record": _page(
+        audit.AUDIT_SQL,
+        _filters(audit.audit_filters, date_from=JULY[0], date_to=JULY[1], table_name="cars", record_id=1),
+        order="desc",
+    ),
+    "reports.revenue_service": (reports.REVENUE_SQL["service"], list(JULY_DAYS)),
+    "reports.revenue_category": (reports.REVENUE_SQL["category"], list(JULY_DAYS)),
+    "reports.utilization": (reports.UTILIZATION_SQL, reports.utilization_args(*JULY_DAYS)),
+    "reports.parts_margin": (reports.PARTS_MARGIN_SQL, list(JULY_DAYS)),
+    "reports.ratings": (reports.RATINGS_SQL, [*JULY_DAYS, "month"]),
+    "payments.balances.unpaid": _page(
+        payments_router.BALANCES_SQL, payments_router.balance_filters(1, True),
+        sort=payments_router.BALANCE_SORT, id_column=payments_router.BALANCE_SORT,
+    ),
+    "payments.balance": (f"{payments.BALANCE_SQL} WHERE a.id = $1", [1]),
+    "views.day": _day_view(JULY_DAYS[0]),
+    "archive.appointments.by_period": _page(
+        archive.APPOINTMENTS_SQL,
+        _filters(appointments.appointment_filters, date_from=datetime(2022, 1, 1), date_to=datetime(2022, 2, 1)),
+        sort="appointment_date", order="desc",
+    ),
+    "archive.payments.by_appointment": _page(
+        archive.PAYMENTS_SQL, _filters(export.payment_filters, appointment_id=1), order="desc"
+    ),
+}
+
+
+def _seq_scans(plan: dict) -> list:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+async def explain(conn, query: str, args: list) -> dict:
+    raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    return data[0]["Plan"]
+
+
+async def setup(conn):
+    await conn.execute((BD_DIR / "init.sql").read_text(encoding="utf-8"))
+    await conn.execute((BD_DIR / "seed.sql").read_text(encoding="utf-8"))
+    await migrations.apply_migrations(conn)
+    await conn.execute("ANALYZE")
+
+
+async def check(conn, baseline: Optional[dict]) -> tuple:
+    await conn.execute("SET enable_seqscan = off")
+    failures = []
+    costs = {}
+    for name, (query, args) in QUERIES.items():
+        plan = await explain(conn, query, args)
+        cost = plan["Total Cost"]
+        costs[name] = cost
+        scans = _seq_scans(plan)
+        if scans:
+            failures.append(f"{name}: Seq Scan по {', '.join(scans)}")
+        if baseline is None:
+            continue
+        expected = baseline.get(name)
+        if expected is None:
+            # новый запрос без базовой стоимости: иначе его регрессия никогда не будет замечена
+            failures.append(f"{name}: нет базовой стоимости в {BASELINE_PATH.name} (--update)")
+        elif cost > expected * (1 + COST_TOLERANCE):
+            failures.append(f"{name}: стоимость {cost:.2f} выше базовой {expected:.2f}")
+    return failures, costs
+
+
+async def _main(args) -> int:
+    if not args.update and not BASELINE_PATH.exists():
+        # без базовых стоимостей проверка регрессий всегда проходила бы
+        print(f"Нет {BASELINE_PATH}: запишите базовые стоимости на засеянной БД (--setup --update) и закоммитьте файл")
+        return 2
+    conn = await asyncpg.connect(args.dsn or config.DATABASE_URL)
+    try:
+        if args.setup:
+            await setup(conn)
+        # --update: стоимости только записываются, Seq Scan по-прежнему считается ошибкой
+        baseline = None if args.update else json.loads(BASELINE_PATH.read_text())
+        failures, costs = await check(conn, baseline)
+    finally:
+        await conn.close()
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(costs, indent=2, sort_keys=True) + "\n")
+        print(f"Базовые стоимости записаны в {BASELINE_PATH}")
+    for name, cost in costs.items():
+        print(f"{cost:12.2f}  {name}")
+    if failures:
+        print("\n".join(["", "Регрессии планов:"] + failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка планов запросов (EXPLAIN) на засеянной БД")
+    parser.add_argument("--dsn", help="строка подключения (по умолчанию DATABASE_URL)")
+    parser.add_argument("--setup", action="store_true", help="создать схему, засеять и применить миграции")
+    parser.add_argument("--update", action="store_true", help="записать текущие стоимости как базовые")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,291 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import urlsplit
+
+import asyncpg
+
+import admission
+import config
+import db
+from cache import TTLCache
+from metrics import prometheus_counter
+
+# Чтение с реплик. GET-запросы ReplicaMiddleware отправляет на реплику, которая догнала основную БД:
+# раз в REPLICA_CHECK_INTERVAL запоминается позиция WAL основной БД (pg_current_wal_lsn) вместе со
+# временем, и реплика, воспроизведшая эту позицию, содержит всё, что было зафиксировано до этого
+# времени. Ответ на изменяющий запрос несёт метку времени в X-Read-After; чтение с этой меткой
+# (или от того же пользователя в этом воркере) идёт только на реплику, догнавшую метку, иначе — на
+# основную БД. Метки — time.time() разных процессов, поэтому часы серверов API должны быть синхронизированы.
+
+logger = logging.getLogger(__name__)
+
+READ_AFTER_HEADER = "X-Read-After"
+READ_METHODS = {"GET", "HEAD"}
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Проверка доступности основной БД и поток SSE (журнал событий должен совпадать с NOTIFY основной БД)
+PRIMARY_ROUTES = {"/health", "/appointments/stream"}
+# Ошибки, после которых GET повторяется на основной БД, если ответ ещё не начал отправляться;
+# SerializationError — в том числе отмена запроса из-за конфликта с воспроизведением WAL на реплике
+RETRYABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.exceptions.OperatorInterventionError,
+    asyncpg.exceptions.SerializationError,
+)
+
+_current: ContextVar[Optional["Replica"]] = ContextVar("db_replica", default=None)
+_replicas = []
+_rotation = itertools.count()
+# (время, позиция WAL основной БД) за последние REPLICA_MAX_LAG_SECONDS
+_markers = deque(maxlen=int(config.REPLICA_MAX_LAG_SECONDS / config.REPLICA_CHECK_INTERVAL) + 2)
+# Время последней записи пользователя: дольше REPLICA_MAX_LAG_SECONDS хранить не нужно —
+# пригодная реплика к этому времени уже догнала запись
+_last_write = TTLCache(config.RATE_LIMIT_KEYS_MAX, ttl=config.REPLICA_MAX_LAG_SECONDS)
+stats = Counter()
+
+
+class Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        parts = urlsplit(dsn)
+        self.name = f"{parts.hostname}:{parts.port or 5432}{parts.path}"
+        self.pool = None
+        self.healthy = False
+        self.caught_up_at = 0.0
+        self.errors = 0
+        self.reads = 0
+
+    def usable(self, read_after: float, now: float) -> bool:
+        return self.healthy and self.caught_up_at >= read_after and now - self.caught_up_at <= config.REPLICA_MAX_LAG_SECONDS
+
+    def failed(self):
+        self.healthy = False
+        self.errors += 1
+
+
+class RoutingPool:
+    # app.state.pool при настроенных репликах: запросы, которые ReplicaMiddleware отправил на реплику,
+    # получают соединения её пула, остальные (и фоновые задачи) — основной БД
+    def __init__(self, primary: db.MeteredPool):
+        self.primary = primary
+
+    def _target(self):
+        replica = _current.get()
+        return replica.pool if replica is not None else self.primary
+
+    def acquire(self, *, timeout=None):
+        return self._target().acquire(timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        return await self._target().fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return await self._target().fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return await self._target().fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query, *args, timeout=None):
+        return await self._target().execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, *, timeout=None):
+        return await self._target().executemany(command, args, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+
+def parse_lsn(value: str) -> int:
+    # "16/B374D848" -> 0x16B374D848
+    high, low = value.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+async def _check_replica(replica: Replica):
+    try:
+        if replica.pool is None:
+            replica.pool = await asyncio.wait_for(
+                db.create_pool(replica.dsn, max_size=config.REPLICA_POOL_MAX_SIZE), config.REPLICA_CHECK_TIMEOUT
+            )
+        row = await replica.pool.fetchrow(
+            "SELECT pg_is_in_recovery() AS recovery, pg_last_wal_replay_lsn()::text AS lsn",
+            timeout=config.REPLICA_CHECK_TIMEOUT,
+        )
+    except Exception:
+        if replica.healthy:
+            logger.warning("Реплика %s недоступна", replica.name, exc_info=True)
+        replica.failed()
+        return
+    replica.healthy = True
+    if not row["recovery"]:
+        # DSN указывает не на реплику (например, на ту же основную БД): отставания нет
+        replica.caught_up_at = _markers[-1][0]
+    elif row["lsn"] is not None:
+        replayed = parse_lsn(row["lsn"])
+        replica.caught_up_at = max(
+            (marked_at for marked_at, lsn in _markers if lsn <= replayed), default=replica.caught_up_at
+        )
+
+
+async def check(primary: db.MeteredPool):
+    # Время берётся до чтения позиции: всё зафиксированное раньше него лежит в WAL до этой позиции
+    marked_at = time.time()
+    lsn = await primary.fetchval("SELECT pg_current_wal_lsn()::text", timeout=config.REPLICA_CHECK_TIMEOUT)
+    _markers.append((marked_at, parse_lsn(lsn)))
+    await asyncio.gather(*(_check_replica(replica) for replica in _replicas))
+
+
+async def run_checker(primary: db.MeteredPool):
+    global _replicas
+    _replicas = [Replica(dsn) for dsn in config.DATABASE_REPLICA_URLS]
+    if not _replicas:
+        return
+    while True:
+        try:
+            await check(primary)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка проверки отставания реплик")
+        await asyncio.sleep(config.REPLICA_CHECK_INTERVAL)
+
+
+async def close():
+    for replica in _replicas:
+        if replica.pool is not None:
+            await replica.pool.close()
+
+
+def fresh_since(timestamp: float) -> bool:
+    # Видит ли текущий запрос всё, что было зафиксировано до timestamp
+    replica = _current.get()
+    return replica is None or replica.caught_up_at >= timestamp
+
+
+def _read_after(scope) -> float:
+    read_after = _last_write.get(admission.identity(scope), 0.0)
+    for name, value in scope.get("headers", ()):
+        if name == b"x-read-after":
+            try:
+                read_after = max(read_after, float(value))
+            except ValueError:
+                pass
+            break
+    return read_after
+
+
+def choose(read_after: float) -> Optional[Replica]:
+    now = time.time()
+    candidates = [replica for replica in _replicas if replica.usable(read_after, now)]
+    if not candidates:
+        return None
+    return candidates[next(_rotation) % len(candidates)]
+
+
+class ReplicaMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _replicas:
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        if method in WRITE_METHODS:
+            return await self._write(scope, receive, send)
+        if method not in READ_METHODS or admission.route_path(scope) in PRIMARY_ROUTES:
+            return await self.app(scope, receive, send)
+        replica = choose(_read_after(scope))
+        if replica is None:
+            stats["primary"] += 1
+            return await self.app(scope, receive, send)
+
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        token = _current.set(replica)
+        try:
+            await self.app(scope, receive, send_tracking)
+            replica.reads += 1
+            return
+        except RETRYABLE_ERRORS:
+            if started:
+                raise
+            logger.warning("Чтение с реплики %s не удалось, повтор на основной БД", replica.name, exc_info=True)
+            replica.failed()
+            stats["retried"] += 1
+        finally:
+            _current.reset(token)
+
+        # Тело GET уже прочитано первой попыткой: отдаём его пустым, дальше — исходный receive (отключение клиента)
+        replayed = False
+
+        async def receive_again():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return await receive()
+
+        stats["primary"] += 1
+        await self.app(scope, receive_again, send)
+
+    async def _write(self, scope, receive, send):
+        who = admission.identity(scope)
+
+        async def send_marking(message):
+            if message["type"] == "http.response.start":
+                # обработчик уже зафиксировал транзакцию: чтения после этой метки увидят изменение
+                written_at = time.time()
+                _last_write.set(who, written_at)
+                headers = [*message.get("headers", ()), (b"x-read-after", f"{written_at:.6f}".encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_marking)
+
+
+def snapshot() -> dict:
+    now = time.time()
+    return {
+        **stats,
+        "replicas": [
+            {
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag_seconds": round(now - replica.caught_up_at, 3) if replica.caught_up_at else None,
+                "reads": replica.reads,
+                "errors": replica.errors,
+                "pool": replica.pool.stats() if replica.pool is not None else None,
+            }
+            for replica in _replicas
+        ],
+    }
+
+
+def prometheus() -> str:
+    if not _replicas:
+        return ""
+    now = time.time()
+    lines = []
+    lines += prometheus_counter(
+        "db_reads_total", "GET-запросы по месту выполнения",
+        {**{(("target", replica.name),): replica.reads for replica in _replicas},
+         (("target", "primary"),): stats["primary"]})
+    lines += prometheus_counter(
+        "db_replica_retries_total", "GET, повторённые на основной БД после ошибки реплики", {(): stats["retried"]})
+    lines += prometheus_counter(
+        "db_replica_lag_seconds", "Отставание реплики от основной БД",
+        {(("replica", replica.name),): round(now - replica.caught_up_at, 3)
+         for replica in _replicas if replica.caught_up_at}, kind="gauge")
+    return "\n".join(lines) + "\n"
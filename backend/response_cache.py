@@ -0,0 +1,132 @@
+import hashlib
+import time
+from collections import Counter
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+import config
+from cache import TTLCache
+from pagination import NEXT_CURSOR_HEADER
+import replicas
+import serialization
+
+# Кэш готовых JSON-ответов справочников (services, categories, employees)
+NOTIFY_CHANNEL = "cache_invalidate"
+PASSTHROUGH_HEADERS = (NEXT_CURSOR_HEADER,)
+
+_cache = TTLCache(maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+# Время последнего изменения каждой таблицы (секунды, для Last-Modified)
+_last_modified = {}
+# Точное время последней инвалидации: ответ реплики, ещё не получившей изменение, не кэшируется
+_invalidated_at = {}
+# Номер инвалидации пространства имён. lookup запоминает его до запроса к БД, store кэширует ответ,
+# только если номер не изменился: иначе ответ мог быть прочитан до изменения, зафиксированного
+# между запросом и store, и отдавался бы (вместе с 304) до истечения RESPONSE_CACHE_TTL
+_generation = Counter()
+_started_at = int(time.time())
+
+
+class _Entry:
+    def __init__(self, body: bytes, etag: str, last_modified: int, headers: dict):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers
+
+
+def _key(request: Request, namespace: str):
+    return namespace, request.url.path, request.url.query
+
+
+def _validators(entry: _Entry) -> dict:
+    return {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def _not_modified(request: Request, entry: _Entry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return entry.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= entry.last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _respond(request: Request, entry: _Entry) -> Response:
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=_validators(entry))
+    return Response(content=entry.body, media_type="application/json", headers={**entry.headers, **_validators(entry)})
+
+
+def lookup(request: Request, namespace: str) -> Optional[Response]:
+    # Готовый ответ (200 или 304) без обращения к БД, либо None, если в кэше ничего нет
+    entry = _cache.get(_key(request, namespace))
+    if entry is None:
+        # setdefault: пространство имён попадает в _generation и при _resync сбрасывается тоже
+        request.state.cache_generation = _generation.setdefault(namespace, 0)
+        return None
+    return _respond(request, entry)
+
+
+def _etag(content, body: bytes) -> str:
+    # Ответ с одной строкой — её версия (миграция 0006): тот же ETag клиент передаёт в If-Match
+    # при PUT/PATCH (updates.if_match). Версия растёт при любом UPDATE строки. Списки — хэш тела.
+    if hasattr(content, "keys") and "version" in content.keys() and content["version"] is not None:
+        return f'"{content["version"]}"'
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def store(request: Request, response: Response, namespace: str, content) -> Response:
+    body = serialization.dumps(content)
+    headers = {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+    entry = _Entry(
+        body=body,
+        etag=_etag(content, body),
+        last_modified=_last_modified.get(namespace, _started_at),
+        headers=headers,
+    )
+    if (getattr(request.state, "cache_generation", None) == _generation[namespace]
+            and replicas.fresh_since(_invalidated_at.get(namespace, 0.0))):
+        _cache.set(_key(request, namespace), entry)
+    return _respond(request, entry)
+
+
+def invalidate_local(namespace: str):
+    _generation[namespace] += 1
+    _invalidated_at[namespace] = time.time()
+    _last_modified[namespace] = int(_invalidated_at[namespace])
+    _cache.discard_where(lambda key, entry: key[0] == namespace)
+
+
+async def invalidate(request: Request, namespace: str):
+    # Вызывается из обработчиков create/update/delete; другим воркерам рассылается через NOTIFY
+    invalidate_local(namespace)
+    if config.RESPONSE_CACHE_NOTIFY:
+        await request.app.state.pool.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, namespace)
+
+
+def _on_notify(conn, pid, channel, payload):
+    invalidate_local(payload)
+
+
+def _resync():
+    # Уведомления за время обрыва LISTEN потеряны: всё закэшированное воркером могло устареть
+    for namespace in list(_generation):
+        invalidate_local(namespace)
+
+
+async def start_listener(listener):
+    await listener.add_listener(NOTIFY_CHANNEL, _on_notify, on_reconnect=_resync)
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import config
+
+# Инкрементальное обновление дневных агрегатов для /reports (таблицы report_*_daily, миграция 0004).
+# Триггеры складывают изменённые дни в report_dirty_days; здесь они забираются пачкой и пересчитываются
+# целиком (DELETE + INSERT ... SELECT за эти дни) в одной транзакции. Записи читаются из appointments_all:
+# день, часть записей которого уже перенесена в архив (миграция 0011), пересчитывается полностью.
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STATUSES = ["completed", "выполнено"]
+CANCELLED_STATUSES = ["cancelled", "отменено"]
+# Ключ advisory lock: пересчёт выполняет только один воркер одновременно
+LOCK_KEY = 7301002
+
+# Номер пересчёта (входит в ключ кэша отчётов) и время последнего прохода хранятся в БД (миграция 0015):
+# пересчитывает один воркер, а сбросить кэш и отдать X-Report-Refreshed-At должны все
+STATE_SQL = "SELECT generation, refreshed_at, last_days FROM report_refresh_state"
+
+# Запросы пересчёта и число используемых параметров: $1 дни, $2 выполненные статусы, $3 отменённые,
+# $4 длительность услуги по умолчанию
+ROLLUP_SQL = [
+    ("DELETE FROM report_service_daily WHERE day = ANY($1::date[])", 1),
+    ("DELETE FROM report_employee_daily WHERE day = ANY($1::date[])", 1),
+    ("DELETE FROM report_parts_daily WHERE day = ANY($1::date[])", 1),
+    ("DELETE FROM report_rating_daily WHERE day = ANY($1::date[])", 1),
+    ("""
+    INSERT INTO report_service_daily (day, service_id, appointments, completed, revenue)
+    SELECT d.day, a.service_id,
+           count(*),
+           count(*) FILTER (WHERE a.status = ANY($2::text[])),
+           COALESCE(sum(paid.amount), 0)
+    FROM unnest($1::date[]) AS d(day)
+    JOIN appointments_all a ON a.appointment_date >= d.day AND a.appointment_date < d.day + 1
+    LEFT JOIN LATERAL (
+        SELECT sum(p.amount) AS amount FROM (
+            SELECT amount FROM payments WHERE NOT a.archived AND appointment_id = a.id AND status = 'paid'
+            UNION ALL
+            SELECT amount FROM payments_archive WHERE a.archived AND appointment_id = a.id AND status = 'paid'
+        ) p
+    ) paid ON TRUE
+    WHERE COALESCE(a.status, '') <> ALL($3::text[])
+    GROUP BY d.day, a.service_id
+    """, 3),
+    ("""
+    INSERT INTO report_employee_daily (day, employee_id, appointments, booked_minutes)
+    SELECT d.day, a.employee_id, count(*), sum(COALESCE(s.duration, $4))
+    FROM unnest($1::date[]) AS d(day)
+    JOIN appointments_all a ON a.appointment_date >= d.day AND a.appointment_date < d.day + 1
+    JOIN services s ON s.id = a.service_id
+    WHERE a.employee_id IS NOT NULL AND COALESCE(a.status, '') <> ALL($3::text[])
+    GROUP BY d.day, a.employee_id
+    """, 4),
+    ("""
+    INSERT INTO report_parts_daily (day, part_id, quantity, revenue, cost)
+    SELECT d.day, sp.part_id, sum(sp.quantity),
+           sum(sp.quantity * p.sale_price), sum(sp.quantity * p.purchase_price)
+    FROM unnest($1::date[]) AS d(day)
+    JOIN appointments_all a ON a.appointment_date >= d.day AND a.appointment_date < d.day + 1
+    JOIN service_parts sp ON sp.service_id = a.service_id
+    JOIN parts p ON p.id = sp.part_id
+    WHERE a.status = ANY($2::text[])
+    GROUP BY d.day, sp.part_id
+    """, 2),
+    ("""
+    INSERT INTO report_rating_daily (day, service_id, reviews, rating_sum)
+    SELECT d.day, COALESCE(r.service_id, a.service_id), count(*), sum(r.rating)
+    FROM unnest($1::date[]) AS d(day)
+    JOIN reviews r ON r.created_at >= d.day AND r.created_at < d.day + 1
+    JOIN appointments a ON a.id = r.appointment_id
+    WHERE r.rating IS NOT NULL
+    GROUP BY d.day, COALESCE(r.service_id, a.service_id)
+    """, 1),
+]
+
+
+async def refresh_batch(conn, batch_size: int) -> list:
+    # Забирает до batch_size изменённых дней и пересчитывает их. Удаление из report_dirty_days в той же
+    # транзакции: изменение, пришедшее во время пересчёта, снова отметит день и попадёт в следующий проход.
+    async with conn.transaction():
+        rows = await conn.fetch(
+            """
+            DELETE FROM report_dirty_days
+            WHERE day IN (SELECT day FROM report_dirty_days ORDER BY day LIMIT $1 FOR UPDATE SKIP LOCKED)
+            RETURNING day
+            """,
+            batch_size
+        )
+        days = sorted(row["day"] for row in rows)
+        if not days:
+            return []
+        args = [days, COMPLETED_STATUSES, CANCELLED_STATUSES, config.DEFAULT_SERVICE_DURATION]
+        for sql, count in ROLLUP_SQL:
+            await conn.execute(sql, *args[:count])
+        # в той же транзакции: новый номер виден вместе с пересчитанными агрегатами
+        await conn.execute("UPDATE report_refresh_state SET generation = generation + 1")
+    return days
+
+
+async def state(conn) -> dict:
+    row = await conn.fetchrow(STATE_SQL)
+    return dict(row) if row else {"generation": 0, "refreshed_at": None, "last_days": 0}
+
+
+async def refresh(pool) -> int:
+    # Полный проход по изменённым дням; возвращает число пересчитанных дней (0, если пересчёт уже идёт)
+    total = 0
+    async with pool.acquire() as conn:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LOCK_KEY):
+            return 0
+        try:
+            while True:
+                days = await refresh_batch(conn, config.REPORTS_REFRESH_BATCH_DAYS)
+                if not days:
+                    break
+                total += len(days)
+            await conn.execute(
+                "UPDATE report_refresh_state SET refreshed_at = now() AT TIME ZONE 'UTC',"
+                " last_days = CASE WHEN $1 > 0 THEN $1 ELSE last_days END",
+                total,
+            )
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+    return total
+
+
+async def run_scheduler(pool):
+    while True:
+        await asyncio.sleep(config.REPORTS_REFRESH_INTERVAL)
+        try:
+            await refresh(pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка пересчёта агрегатов отчётов")
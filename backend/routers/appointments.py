@@ -1,7 +1,16 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Header, Request, Response, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+from typing import List, Optional
 import asyncpg
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+import appointment_stream
+import config
+import schedule
+import audit
+import updates
 
 router = APIRouter()
 
@@ -11,48 +20,174 @@ class AppointmentModel(BaseModel):
     service_id: int
     appointment_date: datetime
     status: str
+    employee_id: Optional[int] = None
 
-@router.post("/appointments", summary="Запись на обслуживание")
+class AppointmentDB(AppointmentModel):
+    id: int
+    status: Optional[str] = None
+    version: Optional[int] = None
+
+AppointmentPatch = updates.partial_model(AppointmentModel, "AppointmentPatch")
+APPOINTMENT_COLUMNS = "id, client_id, car_id, service_id, employee_id, appointment_date, status, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+APPOINTMENTS_SQL = "SELECT id, client_id, car_id, service_id, employee_id, appointment_date, status FROM appointments"
+# Поля, от которых зависит занятость мастера
+SCHEDULE_FIELDS = {"employee_id", "appointment_date", "service_id", "status"}
+
+@router.post("/appointments", response_model=AppointmentDB, summary="Запись на обслуживание")
 async def create_appointment(appointment: AppointmentModel, request: Request):
     pool = request.app.state.pool
+    length = None
     async with pool.acquire() as conn:
-        try:
-            result = await conn.fetchrow(
-                "INSERT INTO appointments (client_id, car_id, service_id, appointment_date, status) "
-                "VALUES ($1, $2, $3, $4, $5) "
-                "RETURNING id, client_id, car_id, service_id, appointment_date, status",
-                appointment.client_id, appointment.car_id, appointment.service_id, appointment.appointment_date, appointment.status
-            )
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
+        async with conn.transaction():
+            if appointment.employee_id is not None and appointment.status not in schedule.CANCELLED_STATUSES:
+                # Проверка пересечения с записями мастера с учётом длительности услуги
+                duration = await conn.fetchval("SELECT duration FROM services WHERE id=$1", appointment.service_id)
+                length = schedule.service_length(duration)
+                conflict = await schedule.check_conflict(
+                    conn, appointment.employee_id, appointment.appointment_date, length
+                )
+                if conflict is not None:
+                    raise HTTPException(status_code=409, detail=f"Сотрудник занят в это время (запись {conflict})")
+            try:
+                result = await conn.fetchrow(
+                    "INSERT INTO appointments (client_id, car_id, service_id, employee_id, appointment_date, status) "
+                    "VALUES ($1, $2, $3, $4, $5, $6) "
+                    "RETURNING id, client_id, car_id, service_id, employee_id, appointment_date, status",
+                    appointment.client_id, appointment.car_id, appointment.service_id, appointment.employee_id,
+                    appointment.appointment_date, appointment.status
+                )
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+    if length is not None:
+        schedule.booked(result["id"], result["employee_id"], result["appointment_date"], length)
+    audit.record(request, "insert", "appointments", result["id"])
     return dict(result)
 
-@router.get("/appointments", summary="Список записей")
-async def get_appointments(request: Request):
+
+def appointment_filters(
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+    car_id: Optional[int] = None,
+    service_id: Optional[int] = None,
+    employee_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> Where:
+    return (
+        Where()
+        .add("status = {}", status)
+        .add("client_id = {}", client_id)
+        .add("car_id = {}", car_id)
+        .add("service_id = {}", service_id)
+        .add("employee_id = {}", employee_id)
+        .add("appointment_date >= {}", date_from)
+        .add("appointment_date < {}", date_to)
+    )
+
+
+@router.get("/appointments", response_model=List[AppointmentDB], summary="Список записей")
+async def get_appointments(
+    request: Request,
+    response: Response,
+    where: Where = Depends(appointment_filters),
+    page: PageParams = Depends(page_params("id", "appointment_date")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, client_id, car_id, service_id, appointment_date, status FROM appointments"
+        if config.APPOINTMENT_STREAM:
+            # до чтения списка: изменения после этой точки поток дошлёт по cursor
+            response.headers[appointment_stream.STREAM_CURSOR_HEADER] = str(await appointment_stream.last_event_id(conn))
+        rows = await fetch_page(
+            conn, APPOINTMENTS_SQL, where, page, response
         )
-    return [dict(row) for row in rows]
+    return json_response(rows, response)
+
+@router.get("/appointments/stream", summary="Поток изменений записей (Server-Sent Events)")
+async def stream_appointments(
+    request: Request,
+    day: Optional[date] = Query(None, alias="date", description="только записи этого дня"),
+    employee_id: Optional[int] = None,
+    cursor: Optional[int] = Query(None, description="id последнего полученного события, если нет Last-Event-ID"),
+    last_event_id: Optional[int] = Header(None, description="выставляется EventSource при переподключении"),
+):
+    # Вместо опроса GET /appointments: события insert/update/delete с полной строкой записи
+    if not config.APPOINTMENT_STREAM:
+        raise HTTPException(status_code=404, detail="Поток изменений выключен (APPOINTMENT_STREAM)")
+    after = last_event_id if last_event_id is not None else cursor
+    return StreamingResponse(
+        appointment_stream.events(request.app.state.pool, day, employee_id, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@router.get("/appointments/{appointment_id}", summary="Получить запись по ID")
+@router.get("/appointments/{appointment_id}", response_model=AppointmentDB, summary="Получить запись по ID")
 async def get_appointment(appointment_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         appointment = await conn.fetchrow(
-            "SELECT id, client_id, car_id, service_id, appointment_date FROM appointments WHERE id=$1",
+            f"SELECT {APPOINTMENT_COLUMNS} FROM appointments WHERE id=$1",
             appointment_id
         )
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
-    return dict(appointment)
+    return json_response(appointment)
+
+async def _update_appointment(request: Request, appointment_id: int, fields: dict, version: Optional[int]):
+    pool = request.app.state.pool
+    current = None
+    length = None
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if SCHEDULE_FIELDS & fields.keys():
+                # Перенос, смена мастера или услуги: та же проверка пересечений, что и при создании
+                current = await conn.fetchrow(
+                    "SELECT employee_id, appointment_date, service_id, status FROM appointments WHERE id=$1 FOR UPDATE",
+                    appointment_id
+                )
+                if not current:
+                    raise HTTPException(status_code=404, detail="Appointment not found")
+                merged = {**dict(current), **fields}
+                if merged["employee_id"] is not None and merged["status"] not in schedule.CANCELLED_STATUSES:
+                    duration = await conn.fetchval("SELECT duration FROM services WHERE id=$1", merged["service_id"])
+                    length = schedule.service_length(duration)
+                    conflict = await schedule.check_conflict(
+                        conn, merged["employee_id"], merged["appointment_date"], length, exclude_id=appointment_id
+                    )
+                    if conflict is not None:
+                        raise HTTPException(status_code=409, detail=f"Сотрудник занят в это время (запись {conflict})")
+            updated = await updates.update_row(
+                conn, "appointments", appointment_id, fields, APPOINTMENT_COLUMNS,
+                version=version, not_found="Appointment not found"
+            )
+    if current is not None:
+        schedule.released(appointment_id, current["appointment_date"])
+    if length is not None:
+        schedule.booked(appointment_id, updated["employee_id"], updated["appointment_date"], length)
+    audit.record(request, "update", "appointments", updated["id"])
+    return json_response(updated)
+
+@router.put("/appointments/{appointment_id}", response_model=AppointmentDB, summary="Обновление записи")
+async def update_appointment(appointment_id: int, appointment: AppointmentModel, request: Request,
+                             version: Optional[int] = Depends(updates.if_match)):
+    return await _update_appointment(
+        request, appointment_id, updates.changes(appointment, partial=False), version
+    )
+
+@router.patch("/appointments/{appointment_id}", response_model=AppointmentDB, summary="Частичное обновление записи")
+async def patch_appointment(appointment_id: int, appointment: AppointmentPatch, request: Request,
+                            version: Optional[int] = Depends(updates.if_match)):
+    return await _update_appointment(request, appointment_id, updates.changes(appointment), version)
 
 @router.delete("/appointments/{appointment_id}", summary="Отмена записи")
 async def delete_appointment(appointment_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        result = await conn.execute("DELETE FROM appointments WHERE id=$1", appointment_id)
-        if result == "DELETE 0":
+        deleted = await conn.fetchrow(
+            "DELETE FROM appointments WHERE id=$1 RETURNING appointment_date", appointment_id
+        )
+        if not deleted:
             raise HTTPException(status_code=404, detail="Appointment not found")
+    schedule.released(appointment_id, deleted["appointment_date"])
+    audit.record(request, "delete", "appointments", appointment_id)
     return {"message": "Appointment cancelled successfully"}
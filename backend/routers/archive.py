@@ -0,0 +1,119 @@
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+from routers.auth import get_current_user
+from routers.appointments import appointment_filters
+from routers.export import payment_filters
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+
+router = APIRouter(
+    prefix="/archive",
+    tags=["Archive"],
+    dependencies=[Depends(get_current_user)]
+)
+
+# Чтение архива закрытых записей (archive.py, миграция 0011). Фильтр по периоду (date_from/date_to)
+# отсекает секции других месяцев; без него запрос проходит по всем секциям архива.
+APPOINTMENT_COLUMNS = (
+    "id, client_id, car_id, service_id, employee_id, appointment_date, status, paid_at, version, archived_at"
+)
+PAYMENT_COLUMNS = "id, appointment_id, amount, payment_date, payment_method, status, terminal_ref, archived_at"
+SEGMENT_COLUMNS = "id, table_name, month, row_count, bytes, exported_at"
+# Запросы списков (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+APPOINTMENTS_SQL = f"SELECT {APPOINTMENT_COLUMNS} FROM appointments_archive"
+PAYMENTS_SQL = f"SELECT {PAYMENT_COLUMNS} FROM payments_archive"
+
+class ArchivedAppointment(BaseModel):
+    id: int
+    client_id: int
+    car_id: int
+    service_id: int
+    employee_id: Optional[int] = None
+    appointment_date: datetime
+    status: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    version: Optional[int] = None
+    archived_at: datetime
+
+class ArchivedPayment(BaseModel):
+    id: int
+    appointment_id: int
+    amount: float
+    payment_date: Optional[datetime] = None
+    payment_method: Optional[str] = None
+    status: Optional[str] = None
+    terminal_ref: Optional[str] = None
+    archived_at: datetime
+
+class ArchivedAppointmentDetail(ArchivedAppointment):
+    payments: List[ArchivedPayment]
+
+class ArchiveSegment(BaseModel):
+    id: int
+    table_name: str
+    month: date
+    row_count: int
+    bytes: int
+    exported_at: datetime
+
+@router.get("/appointments", response_model=List[ArchivedAppointment], summary="Архивные записи")
+async def get_archived_appointments(
+    request: Request,
+    response: Response,
+    where: Where = Depends(appointment_filters),
+    page: PageParams = Depends(page_params("appointment_date", "id", default_order="desc")),
+):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await fetch_page(
+            conn, APPOINTMENTS_SQL, where, page, response
+        )
+    return json_response(rows, response)
+
+@router.get("/appointments/{appointment_id}", response_model=ArchivedAppointmentDetail,
+            summary="Архивная запись с платежами")
+async def get_archived_appointment(appointment_id: int, request: Request):
+    async with request.app.state.pool.acquire() as conn:
+        appointment = await conn.fetchrow(
+            f"SELECT {APPOINTMENT_COLUMNS} FROM appointments_archive WHERE id = $1", appointment_id
+        )
+        if not appointment:
+            raise HTTPException(status_code=404, detail="Запись в архиве не найдена")
+        payments = await conn.fetch(
+            f"SELECT {PAYMENT_COLUMNS} FROM payments_archive WHERE appointment_id = $1 ORDER BY id", appointment_id
+        )
+    return json_response({**appointment, "payments": [dict(row) for row in payments]})
+
+@router.get("/payments", response_model=List[ArchivedPayment], summary="Архивные платежи")
+async def get_archived_payments(
+    request: Request,
+    response: Response,
+    where: Where = Depends(payment_filters),
+    page: PageParams = Depends(page_params("id", "payment_date", default_order="desc")),
+):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await fetch_page(
+            conn, PAYMENTS_SQL, where, page, response
+        )
+    return json_response(rows, response)
+
+@router.get("/segments", response_model=List[ArchiveSegment], summary="Секции архива, выгруженные в файлы")
+async def get_segments(request: Request, table_name: Optional[str] = None):
+    where = Where().add("table_name = {}", table_name)
+    rows = await request.app.state.pool.fetch(
+        f"SELECT {SEGMENT_COLUMNS} FROM archive_segments{where.sql()} ORDER BY month, id", *where.args
+    )
+    return json_response(rows)
+
+@router.get("/segments/{segment_id}", response_class=FileResponse, summary="Скачать выгруженную секцию (CSV, gzip)")
+async def download_segment(segment_id: int, request: Request):
+    path = await request.app.state.pool.fetchval("SELECT path FROM archive_segments WHERE id = $1", segment_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Секция не найдена")
+    if not Path(path).is_file():
+        # файл на другом сервере или перенесён в хранилище вне API
+        raise HTTPException(status_code=410, detail="Файл секции недоступен на этом сервере")
+    return FileResponse(path, media_type="application/gzip", filename=Path(path).name)
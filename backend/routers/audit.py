@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Request, Response, Depends, Query
+from pydantic import BaseModel
+from datetime import datetime, timedelta
+from typing import List, Optional
+from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+
+router = APIRouter(
+    prefix="/audit",
+    tags=["Audit"],
+    dependencies=[Depends(get_current_user)]
+)
+
+# Без явного периода — последние сутки: диапазон по timestamp всегда есть и попадает в BRIN-индекс
+DEFAULT_PERIOD = timedelta(days=1)
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+AUDIT_SQL = "SELECT id, user_id, action, table_name, record_id, timestamp FROM audit_logs"
+
+class AuditEntry(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    action: str
+    table_name: str
+    record_id: Optional[int] = None
+    timestamp: datetime
+
+def audit_filters(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = Query(None, description="не включительно"),
+    table_name: Optional[str] = None,
+    record_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+) -> Where:
+    date_to = date_to or datetime.utcnow()
+    date_from = date_from or date_to - DEFAULT_PERIOD
+    return (
+        Where()
+        .add("timestamp >= {}", date_from)
+        .add("timestamp < {}", date_to)
+        .add("table_name = {}", table_name)
+        .add("record_id = {}", record_id)
+        .add("user_id = {}", user_id)
+        .add("action = {}", action)
+    )
+
+
+@router.get("", response_model=List[AuditEntry], summary="Журнал изменений за период")
+async def get_audit_log(
+    request: Request,
+    response: Response,
+    where: Where = Depends(audit_filters),
+    page: PageParams = Depends(page_params("id", "timestamp", default_order="desc")),
+):
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        rows = await fetch_page(
+            conn, AUDIT_SQL, where, page, response
+        )
+    return json_response(rows, response)
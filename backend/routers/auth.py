@@ -1,16 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 import jwt
 import config
 from pydantic import BaseModel
 from passlib.hash import bcrypt
+import time
+from cache import TTLCache
+from hashing import hash_password, verify_password
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Проверенные пользователи по токену, чтобы не ходить в users на каждый запрос
+user_cache = TTLCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL)
+
+USER_FIELDS = ("id", "username", "full_name", "email", "role")
+CURRENT_USER_SQL = "SELECT id, username, full_name, email, role FROM users WHERE username=$1"
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
@@ -23,10 +30,11 @@ class UserLogin(BaseModel):
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), request: Request = None):
     pool = request.app.state.pool
     user = await pool.fetchrow("SELECT * FROM users WHERE username=$1", form_data.username)
-    if not user or not pwd_context.verify(form_data.password, user["password_hash"]):
+    if not user or not await verify_password(form_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Неверные учетные данные")
     access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"sub": user["username"]}
+    # uid и role подписаны вместе с sub: в режиме AUTH_STATELESS по ним проверяется доступ без обращения к БД
+    to_encode = {"sub": user["username"], "uid": user["id"], "role": user["role"]}
     expire = datetime.utcnow() + access_token_expires
     to_encode.update({"exp": expire})
     token = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
@@ -39,23 +47,14 @@ async def register(data: RegisterRequest, request: Request):
     existing = await pool.fetchrow("SELECT id FROM users WHERE username=$1", data.username)
     if existing:
         raise HTTPException(status_code=400, detail="Пользователь уже существует")
-    hash_ = pwd_context.hash(data.password)
+    hash_ = await hash_password(data.password)
     await pool.execute("INSERT INTO users (username, password_hash) VALUES ($1, $2)", data.username, hash_)
     return {"msg": "Пользователь успешно зарегистрирован"}
 
-# Логин пользователя
-@router.post("/auth/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), request: Request = None):
-    pool = request.app.state.pool
-    user = await pool.fetchrow("SELECT * FROM users WHERE username=$1", form_data.username)
-    if not user or not pwd_context.verify(form_data.password, user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Неверные учетные данные")
-    access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"sub": user["username"]}
-    expire = datetime.utcnow() + access_token_expires
-    to_encode.update({"exp": expire})
-    token = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
-    return {"access_token": token, "token_type": "bearer"}
+def invalidate_user(username: str) -> int:
+    # Вызывать при изменении или удалении пользователя: сбрасывает все его закэшированные токены
+    return user_cache.discard_where(lambda token, user: user["username"] == username)
+
 
 # Получение текущего пользователя
 async def get_current_user(token: str = Depends(oauth2_scheme), request: Request = None):
@@ -70,9 +69,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme), request: Request
             raise credentials_exception
     except Exception:
         raise credentials_exception
+    if config.AUTH_STATELESS and "uid" in payload:
+        user = {"id": payload["uid"], "username": username, "full_name": None, "email": None, "role": payload.get("role")}
+        request.state.user = user
+        return user
+    cached = user_cache.get(token)
+    if cached is not None:
+        request.state.user = cached
+        return cached
     # Проверяем что пользователь есть в базе
     pool = request.app.state.pool
-    user = await pool.fetchrow("SELECT * FROM users WHERE username=$1", username)
+    user = await pool.fetchrow(CURRENT_USER_SQL, username)
     if not user:
         raise credentials_exception
+    user = {field: user[field] for field in USER_FIELDS}
+    # запись не переживает сам токен
+    user_cache.set(token, user, ttl=payload.get("exp", 0) - time.time() if "exp" in payload else None)
+    # для audit.record: автор изменения
+    request.state.user = user
     return user
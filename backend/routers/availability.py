@@ -0,0 +1,85 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from pydantic import BaseModel
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+import schedule
+
+router = APIRouter(prefix="/availability", tags=["Availability"])
+
+class EmployeeSlots(BaseModel):
+    employee_id: int
+    slots: List[datetime]
+
+class DayAvailability(BaseModel):
+    date: date
+    service_id: int
+    duration: int
+    employees: List[EmployeeSlots]
+
+class FreeSlot(BaseModel):
+    employee_id: int
+    start: datetime
+    end: datetime
+
+async def _service_length(conn, service_id: int) -> timedelta:
+    row = await conn.fetchrow("SELECT duration FROM services WHERE id=$1", service_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return schedule.service_length(row["duration"])
+
+def _employees(day_schedule, employee_id: Optional[int]) -> list:
+    # Только мастера, которые принимают записи (config.BOOKABLE_ROLES); у неизвестного id расписания нет
+    if employee_id is None:
+        return day_schedule.employees
+    if employee_id not in day_schedule.employees:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return [employee_id]
+
+@router.get("", response_model=DayAvailability, summary="Свободное время сотрудников на день")
+async def get_availability(
+    request: Request,
+    service_id: int,
+    day: date = Query(..., alias="date"),
+    employee_id: Optional[int] = None,
+):
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        length = await _service_length(conn, service_id)
+        day_schedule = await schedule.get_day(conn, day)
+    employees = _employees(day_schedule, employee_id)
+    now = datetime.now()
+    return {
+        "date": day,
+        "service_id": service_id,
+        "duration": int(length.total_seconds() // 60),
+        "employees": [
+            {"employee_id": emp, "slots": day_schedule.free_slots(emp, length, not_before=now)}
+            for emp in employees
+        ],
+    }
+
+@router.get("/next", response_model=FreeSlot, summary="Ближайшее свободное время")
+async def get_next_slot(
+    request: Request,
+    service_id: int,
+    start: Optional[datetime] = Query(None, alias="from", description="не раньше этого момента (по умолчанию — сейчас)"),
+    days: int = Query(7, ge=1, le=31),
+    employee_id: Optional[int] = None,
+):
+    start = max(start or datetime.now(), datetime.now())
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        length = await _service_length(conn, service_id)
+        for offset in range(days):
+            day_schedule = await schedule.get_day(conn, start.date() + timedelta(days=offset))
+            employees = _employees(day_schedule, employee_id)
+            candidates = [
+                (slots[0], emp)
+                for emp in employees
+                for slots in [day_schedule.free_slots(emp, length, not_before=start)]
+                if slots
+            ]
+            if candidates:
+                slot, emp = min(candidates)
+                return {"employee_id": emp, "start": slot, "end": slot + length}
+    raise HTTPException(status_code=404, detail="Свободного времени в указанном периоде нет")
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
 from pydantic import BaseModel
 import asyncpg
-from typing import Optional
+from typing import List, Optional
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+import audit
+import bulk
+import updates
 
 router = APIRouter()
 
@@ -16,13 +21,22 @@ class CarModel(BaseModel):
     mileage: Optional[int] = 0
     status: Optional[str] = "active"
 
+class CarDB(CarModel):
+    id: int
+    version: Optional[int] = None
+
 class CarUpdate(BaseModel):
     make: str = None
     model: str = None
     year: int = None
     license_plate: str = None
 
-@router.post("/cars", summary="Добавление автомобиля клиента")
+CarPatch = updates.partial_model(CarModel, "CarPatch")
+CAR_COLUMNS = "id, client_id, make, model, year, license_plate, vin, color, mileage, status, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+CARS_SQL = "SELECT id, client_id, make, model, year, license_plate, vin, color, mileage, status FROM cars"
+
+@router.post("/cars", response_model=CarDB, summary="Добавление автомобиля клиента")
 async def create_car(car: CarModel, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
@@ -38,67 +52,95 @@ async def create_car(car: CarModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
+    audit.record(request, "insert", "cars", result["id"])
     return dict(result)
 
-@router.get("/cars", summary="Список всех автомобилей")
-async def get_cars(request: Request):
+def car_filters(
+    ids: Optional[List[int]] = Query(None, alias="id", description="только эти id (?id=1&id=2)"),
+    client_id: Optional[int] = None,
+    status: Optional[str] = None,
+    make: Optional[str] = None,
+) -> Where:
+    return (
+        Where()
+        .add("id = ANY({})", ids)
+        .add("client_id = {}", client_id)
+        .add("status = {}", status)
+        .add("make = {}", make)
+    )
+
+
+@router.post("/cars/bulk", summary="Массовая загрузка автомобилей (JSON-массив или CSV)")
+async def create_cars_bulk(request: Request, upsert: bool = True):
+    # upsert=true: автомобили с уже существующим VIN обновляются, остальные добавляются
+    return await bulk.import_rows(
+        request, "cars", CarModel,
+        ["client_id", "make", "model", "year", "license_plate", "vin", "color", "mileage", "status"],
+        key="vin" if upsert else None,
+        foreign_keys={"client_id": "clients"},
+    )
+
+@router.get("/cars", response_model=List[CarDB], summary="Список всех автомобилей")
+async def get_cars(
+    request: Request,
+    response: Response,
+    where: Where = Depends(car_filters),
+    page: PageParams = Depends(page_params("id", "make", "model")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, client_id, make, model, year, license_plate, vin, color, mileage, status FROM cars"
+        rows = await fetch_page(
+            conn, CARS_SQL, where, page, response
         )
-    return [dict(row) for row in rows]
+    return json_response(rows, response)
 
-@router.get("/cars/{car_id}", summary="Информация об автомобиле")
+@router.get("/cars/{car_id}", response_model=CarDB, summary="Информация об автомобиле")
 async def get_car(car_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         car = await conn.fetchrow(
-            "SELECT id, client_id, make, model, year, license_plate, vin, color, mileage, status FROM cars WHERE id=$1",
+            f"SELECT {CAR_COLUMNS} FROM cars WHERE id=$1",
             car_id
         )
         if not car:
             raise HTTPException(status_code=404, detail="Car not found")
-    return dict(car)
+    return json_response(car)
 
-@router.get("/clients/{client_id}/cars", summary="Автомобили клиента")
-async def get_cars_by_client(client_id: int, request: Request):
+@router.get("/clients/{client_id}/cars", response_model=List[CarDB], summary="Автомобили клиента")
+async def get_cars_by_client(
+    client_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params("id")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, client_id, make, model, year, license_plate, vin, color, mileage, status FROM cars WHERE client_id=$1",
-            client_id
+        rows = await fetch_page(
+            conn, CARS_SQL, Where().add("client_id = {}", client_id), page, response
         )
-    return [dict(row) for row in rows]
+    return json_response(rows, response)
 
 
-@router.put("/cars/{car_id}", summary="Обновление данных автомобиля")
-async def update_car(car_id: int, car: CarUpdate, request: Request):
+async def _update_car(request: Request, car_id: int, fields: dict, version: Optional[int]):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT * FROM cars WHERE id=$1", car_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Car not found")
-        update_fields = []
-        values = []
-        if car.make is not None:
-            update_fields.append("make=$" + str(len(values)+1))
-            values.append(car.make)
-        if car.model is not None:
-            update_fields.append("model=$" + str(len(values)+1))
-            values.append(car.model)
-        if car.year is not None:
-            update_fields.append("year=$" + str(len(values)+1))
-            values.append(car.year)
-        if car.license_plate is not None:
-            update_fields.append("license_plate=$" + str(len(values)+1))
-            values.append(car.license_plate)
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        values.append(car_id)
-        query = f"UPDATE cars SET {', '.join(update_fields)} WHERE id=${len(values)}"
-        await conn.execute(query, *values)
-    return {"message": "Car updated successfully"}
+        updated = await updates.update_row(
+            conn, "cars", car_id, fields, CAR_COLUMNS, version=version, not_found="Car not found"
+        )
+    audit.record(request, "update", "cars", updated["id"])
+    return json_response(updated)
+
+@router.put("/cars/{car_id}", response_model=CarDB, summary="Обновление данных автомобиля")
+async def update_car(car_id: int, car: CarUpdate, request: Request,
+                     version: Optional[int] = Depends(updates.if_match)):
+    # Как и раньше, незаполненные поля CarUpdate не меняются
+    fields = {name: value for name, value in updates.changes(car, partial=False).items() if value is not None}
+    return await _update_car(request, car_id, fields, version)
+
+@router.patch("/cars/{car_id}", response_model=CarDB, summary="Частичное обновление автомобиля")
+async def patch_car(car_id: int, car: CarPatch, request: Request,
+                    version: Optional[int] = Depends(updates.if_match)):
+    return await _update_car(request, car_id, updates.changes(car), version)
 
 @router.delete("/cars/{car_id}", summary="Удаление автомобиля")
 async def delete_car(car_id: int, request: Request):
@@ -107,4 +149,5 @@ async def delete_car(car_id: int, request: Request):
         result = await conn.execute("DELETE FROM cars WHERE id=$1", car_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Car not found")
+    audit.record(request, "delete", "cars", car_id)
     return {"message": "Car deleted successfully"}
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from pydantic import BaseModel, constr
 from typing import List, Optional
 from routers.auth import get_current_user
-from fastapi.responses import JSONResponse
+from pagination import Where, PageParams, page_params, fetch_page
+import response_cache
+import audit
+import updates
 
 router = APIRouter(
     prefix="/categories",
@@ -16,6 +19,9 @@ class CategoryModel(BaseModel):
 
 class CategoryDB(CategoryModel):
     id: int
+    version: Optional[int] = None
+
+CategoryPatch = updates.partial_model(CategoryModel, "CategoryPatch")
 
 @router.post("/", response_model=CategoryDB, summary="Создать категорию")
 async def create_category(category: CategoryModel, request: Request):
@@ -32,50 +38,64 @@ async def create_category(category: CategoryModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Ошибка при создании категории: {str(e)}")
+    await response_cache.invalidate(request, "categories")
+    audit.record(request, "insert", "categories", row["id"])
     return dict(row)
 
 @router.get("/", response_model=List[CategoryDB], summary="Получить список категорий")
-async def get_categories(request: Request):
+async def get_categories(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params("id", "name")),
+):
+    cached = response_cache.lookup(request, "categories")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, name, description FROM categories ORDER BY id"
+        rows = await fetch_page(
+            conn,
+            "SELECT id, name, description FROM categories",
+            Where(), page, response
         )
-    return JSONResponse(content=[dict(row) for row in rows])
+    return response_cache.store(request, response, "categories", rows)
 
 @router.get("/{category_id}", response_model=CategoryDB, summary="Получить категорию по ID")
-async def get_category(category_id: int, request: Request):
+async def get_category(category_id: int, request: Request, response: Response):
+    cached = response_cache.lookup(request, "categories")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         category = await conn.fetchrow(
-            "SELECT id, name, description FROM categories WHERE id = $1",
+            "SELECT id, name, description, version FROM categories WHERE id = $1",
             category_id
         )
         if not category:
             raise HTTPException(status_code=404, detail="Категория не найдена")
-    return dict(category)
+    return response_cache.store(request, response, "categories", category)
 
-@router.put("/{category_id}", response_model=CategoryDB, summary="Обновить категорию")
-async def update_category(category_id: int, category: CategoryModel, request: Request):
+async def _update_category(request: Request, category_id: int, fields: dict, version: Optional[int]):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT id FROM categories WHERE id = $1", category_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Категория не найдена")
-        await conn.execute(
-            """
-            UPDATE categories
-            SET name=$1, description=$2
-            WHERE id=$3
-            """,
-            category.name, category.description, category_id
-        )
-        updated = await conn.fetchrow(
-            "SELECT id, name, description FROM categories WHERE id = $1",
-            category_id
+        updated = await updates.update_row(
+            conn, "categories", category_id, fields, "id, name, description, version",
+            version=version, not_found="Категория не найдена"
         )
+    await response_cache.invalidate(request, "categories")
+    audit.record(request, "update", "categories", updated["id"])
     return dict(updated)
 
+@router.put("/{category_id}", response_model=CategoryDB, summary="Обновить категорию")
+async def update_category(category_id: int, category: CategoryModel, request: Request,
+                          version: Optional[int] = Depends(updates.if_match)):
+    return await _update_category(request, category_id, updates.changes(category, partial=False), version)
+
+@router.patch("/{category_id}", response_model=CategoryDB, summary="Частично обновить категорию")
+async def patch_category(category_id: int, category: CategoryPatch, request: Request,
+                         version: Optional[int] = Depends(updates.if_match)):
+    return await _update_category(request, category_id, updates.changes(category), version)
+
 @router.delete("/{category_id}", summary="Удалить категорию")
 async def delete_category(category_id: int, request: Request):
     pool = request.app.state.pool
@@ -83,4 +103,6 @@ async def delete_category(category_id: int, request: Request):
         result = await conn.execute("DELETE FROM categories WHERE id = $1", category_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Категория не найдена")
+    await response_cache.invalidate(request, "categories")
+    audit.record(request, "delete", "categories", category_id)
     return {"message": "Категория успешно удалена"}
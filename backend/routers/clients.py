@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
 from pydantic import BaseModel
 import asyncpg
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+from pagination import Where, PageParams, page_params, fetch_page, encode_cursor, decode_cursor
+from serialization import json_response
+import audit
+import bulk
+import config
+import updates
 
 router = APIRouter()
 
@@ -13,7 +20,56 @@ class ClientModel(BaseModel):
     client_type: Optional[str] = None
     discount: Optional[float] = 0.0
 
-@router.post("/clients", summary="Регистрация клиента")
+class ClientDB(ClientModel):
+    id: int
+    created_at: Optional[datetime] = None
+    version: Optional[int] = None
+
+ClientPatch = updates.partial_model(ClientModel, "ClientPatch")
+CLIENT_COLUMNS = "id, first_name, last_name, phone, email, client_type, discount, created_at, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+CLIENTS_SQL = "SELECT id, first_name, last_name, phone, email, client_type, discount, created_at FROM clients"
+
+class ServiceHistoryItem(BaseModel):
+    id: int
+    appointment_date: datetime
+    service_name: str
+    make: str
+    model: str
+    license_plate: Optional[str] = None
+
+class ClientDetail(ClientDB):
+    visit_count: int
+    last_visit: Optional[datetime] = None
+    total_spent: float
+    avg_rating: Optional[float] = None
+    service_history: List[ServiceHistoryItem]
+    history_next_cursor: Optional[str] = None
+
+# История обслуживаний: keyset по (appointment_date, id) от новых к старым
+HISTORY_SORT = "a.appointment_date"
+HISTORY_SQL = """SELECT a.id, a.appointment_date, s.name AS service_name,
+                        c.make, c.model, c.license_plate
+                 FROM appointments a
+                 JOIN services s ON a.service_id = s.id
+                 JOIN cars c ON a.car_id = c.id"""
+# Профиль, агрегаты из client_stats и первая страница истории — одним запросом; $1 id, $2 размер страницы + 1
+CLIENT_DETAIL_SQL = f"""SELECT c.id, c.first_name, c.last_name, c.phone, c.email, c.client_type, c.discount, c.created_at, c.version,
+                               COALESCE(st.visit_count, 0) AS visit_count, st.last_visit,
+                               COALESCE(st.total_spent, 0) AS total_spent, st.avg_rating,
+                               (SELECT COALESCE(json_agg(h ORDER BY h.appointment_date DESC, h.id DESC), '[]'::json)
+                                FROM ({HISTORY_SQL} WHERE a.client_id = c.id
+                                      ORDER BY a.appointment_date DESC, a.id DESC LIMIT $2) h) AS service_history
+                        FROM clients c
+                        LEFT JOIN client_stats st ON st.client_id = c.id
+                        WHERE c.id = $1"""
+
+
+def history_filters(client_id: int) -> Where:
+    return Where().add("a.client_id = {}", client_id)
+
+
+@router.post("/clients", response_model=ClientDB, summary="Регистрация клиента")
 async def create_client(client: ClientModel, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
@@ -28,36 +84,99 @@ async def create_client(client: ClientModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
+    audit.record(request, "insert", "clients", result["id"])
     return dict(result)
 
 
-@router.get("/clients", summary="Список клиентов")
-async def get_clients(request: Request):
+@router.post("/clients/bulk", summary="Массовая загрузка клиентов (JSON-массив или CSV)")
+async def create_clients_bulk(request: Request):
+    return await bulk.import_rows(
+        request, "clients", ClientModel,
+        ["first_name", "last_name", "phone", "email", "client_type", "discount"],
+    )
+
+
+def client_filters(
+    ids: Optional[List[int]] = Query(None, alias="id", description="только эти id (?id=1&id=2)"),
+    client_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> Where:
+    return (
+        Where()
+        .add("id = ANY({})", ids)
+        .add("client_type = {}", client_type)
+        .add("created_at >= {}", date_from)
+        .add("created_at < {}", date_to)
+    )
+
+
+@router.get("/clients", response_model=List[ClientDB], summary="Список клиентов")
+async def get_clients(
+    request: Request,
+    response: Response,
+    where: Where = Depends(client_filters),
+    page: PageParams = Depends(page_params("id", "last_name")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT id, first_name, last_name, phone, email, client_type, discount, created_at FROM clients")
-    return [dict(row) for row in rows]
+        rows = await fetch_page(
+            conn, CLIENTS_SQL, where, page, response
+        )
+    return json_response(rows, response)
 
-@router.get("/clients/{client_id}", summary="Информация о клиенте и история обслуживаний")
+@router.get("/clients/{client_id}", response_model=ClientDetail, summary="Информация о клиенте и история обслуживаний")
 async def get_client(client_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        client = await conn.fetchrow(
-            "SELECT id, first_name, last_name, phone, email, client_type, discount, created_at FROM clients WHERE id=$1",
-            client_id
-        )
+        client = await conn.fetchrow(CLIENT_DETAIL_SQL, client_id, config.CLIENT_HISTORY_PREVIEW + 1)
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
-        history_rows = await conn.fetch(
-            """SELECT a.id, a.appointment_date, s.name AS service_name,
-                      c.make, c.model, c.license_plate
-               FROM appointments a
-               JOIN services s ON a.service_id = s.id
-               JOIN cars c ON a.car_id = c.id
-               WHERE a.client_id = $1
-               ORDER BY a.appointment_date DESC""",
-            client_id
-        )
     client_dict = dict(client)
-    client_dict["service_history"] = [dict(row) for row in history_rows]
-    return client_dict
+    history = client_dict["service_history"]
+    client_dict["history_next_cursor"] = None
+    if len(history) > config.CLIENT_HISTORY_PREVIEW:
+        history = history[:config.CLIENT_HISTORY_PREVIEW]
+        last = history[-1]
+        client_dict["history_next_cursor"] = encode_cursor(
+            HISTORY_SORT, [datetime.fromisoformat(last["appointment_date"]), last["id"]]
+        )
+    client_dict["service_history"] = history
+    return json_response(client_dict)
+
+
+async def _update_client(request: Request, client_id: int, fields: dict, version: Optional[int]):
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        updated = await updates.update_row(
+            conn, "clients", client_id, fields, CLIENT_COLUMNS, version=version, not_found="Client not found"
+        )
+    audit.record(request, "update", "clients", updated["id"])
+    return json_response(updated)
+
+@router.put("/clients/{client_id}", response_model=ClientDB, summary="Обновление данных клиента")
+async def update_client(client_id: int, client: ClientModel, request: Request,
+                        version: Optional[int] = Depends(updates.if_match)):
+    return await _update_client(request, client_id, updates.changes(client, partial=False), version)
+
+@router.patch("/clients/{client_id}", response_model=ClientDB, summary="Частичное обновление данных клиента")
+async def patch_client(client_id: int, client: ClientPatch, request: Request,
+                       version: Optional[int] = Depends(updates.if_match)):
+    return await _update_client(request, client_id, updates.changes(client), version)
+
+
+@router.get("/clients/{client_id}/history", response_model=List[ServiceHistoryItem], summary="История обслуживаний клиента")
+async def get_client_history(
+    client_id: int,
+    request: Request,
+    response: Response,
+    before: Optional[str] = Query(None, description="history_next_cursor профиля или X-Next-Cursor предыдущей страницы"),
+    limit: int = Query(config.PAGE_DEFAULT_LIMIT, ge=1, le=config.PAGE_MAX_LIMIT),
+):
+    page = PageParams(limit, HISTORY_SORT, "desc", decode_cursor(before, HISTORY_SORT) if before else None)
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        rows = await fetch_page(
+            conn, HISTORY_SQL, history_filters(client_id), page, response, id_column="a.id"
+        )
+    return json_response(rows, response)
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+import response_cache
+import schedule
+import audit
+import updates
 
 router = APIRouter(
     prefix="/employees",
@@ -18,6 +23,9 @@ class EmployeeModel(BaseModel):
 
 class EmployeeDB(EmployeeModel):
     id: int
+    version: Optional[int] = None
+
+EmployeePatch = updates.partial_model(EmployeeModel, "EmployeePatch")
 
 @router.post("/", response_model=EmployeeDB, summary="Создать сотрудника")
 async def create_employee(employee: EmployeeModel, request: Request):
@@ -38,55 +46,71 @@ async def create_employee(employee: EmployeeModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Ошибка при создании сотрудника: {str(e)}")
+    await response_cache.invalidate(request, "employees")
+    audit.record(request, "insert", "employees", row["id"])
     return dict(row)
 
+def employee_filters(role: Optional[str] = None) -> Where:
+    return Where().add("role = {}", role)
+
+
 @router.get("/", response_model=List[EmployeeDB], summary="Получить список сотрудников")
-async def get_employees(request: Request):
+async def get_employees(
+    request: Request,
+    response: Response,
+    where: Where = Depends(employee_filters),
+    page: PageParams = Depends(page_params("id")),
+):
+    cached = response_cache.lookup(request, "employees")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, first_name, last_name, role, phone, email FROM employees ORDER BY id"
+        rows = await fetch_page(
+            conn,
+            "SELECT id, first_name, last_name, role, phone, email FROM employees",
+            where, page, response
         )
-    return [dict(row) for row in rows]
+    return response_cache.store(request, response, "employees", rows)
 
 @router.get("/{employee_id}", response_model=EmployeeDB, summary="Получить сотрудника по ID")
-async def get_employee(employee_id: int, request: Request):
+async def get_employee(employee_id: int, request: Request, response: Response):
+    cached = response_cache.lookup(request, "employees")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         employee = await conn.fetchrow(
-            "SELECT id, first_name, last_name, role, phone, email FROM employees WHERE id = $1",
+            "SELECT id, first_name, last_name, role, phone, email, version FROM employees WHERE id = $1",
             employee_id
         )
         if not employee:
             raise HTTPException(status_code=404, detail="Сотрудник не найден")
-    return dict(employee)
+    return response_cache.store(request, response, "employees", employee)
 
-@router.put("/{employee_id}", response_model=EmployeeDB, summary="Обновить данные сотрудника")
-async def update_employee(employee_id: int, employee: EmployeeModel, request: Request):
+async def _update_employee(request: Request, employee_id: int, fields: dict, version: Optional[int]):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT id FROM employees WHERE id = $1", employee_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Сотрудник не найден")
-        await conn.execute(
-            """
-            UPDATE employees
-            SET first_name = $1, last_name = $2, role = $3, phone = $4, email = $5
-            WHERE id = $6
-            """,
-            employee.first_name,
-            employee.last_name,
-            employee.role,
-            employee.phone,
-            employee.email,
-            employee_id
-        )
-        updated = await conn.fetchrow(
-            "SELECT id, first_name, last_name, role, phone, email FROM employees WHERE id = $1",
-            employee_id
+        updated = await updates.update_row(
+            conn, "employees", employee_id, fields, "id, first_name, last_name, role, phone, email, version",
+            version=version, not_found="Сотрудник не найден"
         )
+    await response_cache.invalidate(request, "employees")
+    if "role" in fields:
+        schedule.reset()
+    audit.record(request, "update", "employees", updated["id"])
     return dict(updated)
 
+@router.put("/{employee_id}", response_model=EmployeeDB, summary="Обновить данные сотрудника")
+async def update_employee(employee_id: int, employee: EmployeeModel, request: Request,
+                          version: Optional[int] = Depends(updates.if_match)):
+    return await _update_employee(request, employee_id, updates.changes(employee, partial=False), version)
+
+@router.patch("/{employee_id}", response_model=EmployeeDB, summary="Частично обновить данные сотрудника")
+async def patch_employee(employee_id: int, employee: EmployeePatch, request: Request,
+                         version: Optional[int] = Depends(updates.if_match)):
+    return await _update_employee(request, employee_id, updates.changes(employee), version)
+
 @router.delete("/{employee_id}", summary="Удалить сотрудника")
 async def delete_employee(employee_id: int, request: Request):
     pool = request.app.state.pool
@@ -94,4 +118,6 @@ async def delete_employee(employee_id: int, request: Request):
         result = await conn.execute("DELETE FROM employees WHERE id = $1", employee_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Сотрудник не найден")
+    await response_cache.invalidate(request, "employees")
+    audit.record(request, "delete", "employees", employee_id)
     return {"message": "Сотрудник успешно удален"}
@@ -0,0 +1,136 @@
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+import csv
+import io
+import json
+import config
+from routers.auth import get_current_user
+from routers.appointments import appointment_filters
+from routers.clients import client_filters
+from pagination import Where
+
+router = APIRouter(
+    prefix="/export",
+    tags=["Export"],
+    dependencies=[Depends(get_current_user)]
+)
+
+APPOINTMENT_COLUMNS = ["id", "client_id", "car_id", "service_id", "employee_id", "appointment_date", "status", "created_at"]
+CLIENT_COLUMNS = ["id", "first_name", "last_name", "phone", "email", "client_type", "discount", "created_at"]
+PAYMENT_COLUMNS = ["id", "appointment_id", "amount", "payment_date", "payment_method", "status"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def payment_filters(
+    appointment_id: Optional[int] = None,
+    status: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = Query(None, description="не включительно"),
+) -> Where:
+    return (
+        Where()
+        .add("appointment_id = {}", appointment_id)
+        .add("status = {}", status)
+        .add("payment_method = {}", payment_method)
+        .add("payment_date >= {}", date_from)
+        .add("payment_date < {}", date_to)
+    )
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # строкой, чтобы не терять точность денежных сумм
+        return str(value)
+    raise TypeError(f"Не удаётся сериализовать {type(value).__name__}")
+
+
+def ndjson_chunk(rows, columns) -> str:
+    return "".join(
+        json.dumps({col: row[col] for col in columns}, default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def csv_chunk(rows, columns) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            row[col].isoformat() if isinstance(row[col], (datetime, date)) else row[col]
+            for col in columns
+        ])
+    return buf.getvalue()
+
+
+def csv_header(columns) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(columns)
+    return buf.getvalue()
+
+
+async def _stream_rows(pool, query: str, args: list, columns: list, fmt: str):
+    # Серверный курсор внутри транзакции: в памяти держим не больше одной пачки строк
+    encode = csv_chunk if fmt == "csv" else ndjson_chunk
+    if fmt == "csv":
+        yield csv_header(columns)
+    async with pool.acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            cur = await conn.cursor(query, *args)
+            while True:
+                rows = await cur.fetch(config.EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield encode(rows, columns)
+
+
+def export_query(table: str, columns: list, where: Where) -> str:
+    return f"SELECT {', '.join(columns)} FROM {table}{where.sql()} ORDER BY id"
+
+
+def _export_response(request: Request, table: str, columns: list, where: Where, fmt: str) -> StreamingResponse:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format должен быть ndjson или csv")
+    query = export_query(table, columns, where)
+    filename = f"{table}_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}"
+    return StreamingResponse(
+        _stream_rows(request.app.state.pool, query, where.args, columns, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/appointments", summary="Выгрузка записей (NDJSON/CSV)")
+async def export_appointments(
+    request: Request,
+    where: Where = Depends(appointment_filters),
+    format: str = Query("ndjson", description="ndjson или csv"),
+):
+    return _export_response(request, "appointments", APPOINTMENT_COLUMNS, where, format)
+
+
+@router.get("/clients", summary="Выгрузка клиентов (NDJSON/CSV)")
+async def export_clients(
+    request: Request,
+    where: Where = Depends(client_filters),
+    format: str = Query("ndjson", description="ndjson или csv"),
+):
+    return _export_response(request, "clients", CLIENT_COLUMNS, where, format)
+
+
+@router.get("/payments", summary="Выгрузка платежей (NDJSON/CSV)")
+async def export_payments(
+    request: Request,
+    where: Where = Depends(payment_filters),
+    format: str = Query("ndjson", description="ndjson или csv"),
+):
+    return _export_response(request, "payments", PAYMENT_COLUMNS, where, format)
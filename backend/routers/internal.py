@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from routers.auth import get_current_user
+import os
+import admission
+import appointment_stream
+import archive
+import audit
+import config
+import hashing
+import instrumentation
+import replicas
+import response_cache
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(get_current_user)]
+)
+
+@router.get("/hashing", summary="Метрики пула хэширования паролей")
+async def hashing_stats():
+    return hashing.snapshot()
+
+@router.get("/pool", summary="Состояние пула соединений с БД")
+async def pool_stats(request: Request):
+    # статистика отдельного воркера: суммарный размер пулов считается по всем pid
+    return {"pid": os.getpid(), **request.app.state.pool.stats()}
+
+@router.get("/response-cache", summary="Состояние кэша ответов справочников")
+async def response_cache_stats():
+    return response_cache.stats()
+
+@router.get("/audit", summary="Очередь и запись журнала аудита")
+async def audit_stats():
+    return audit.snapshot()
+
+@router.get("/appointment-stream", summary="Подписчики и события потока записей")
+async def appointment_stream_stats(request: Request):
+    listener = request.app.state.listener
+    return {**appointment_stream.snapshot(), "listener_reconnects": listener.reconnects if listener else None}
+
+@router.get("/admission", summary="Лимиты запросов и допуск к обработке")
+async def admission_stats():
+    return {"pid": os.getpid(), **admission.snapshot()}
+
+@router.get("/archive", summary="Состояние архивирования закрытых записей")
+async def archive_stats():
+    return archive.snapshot()
+
+@router.post("/archive/run", summary="Запустить архивирование сейчас")
+async def archive_run(request: Request):
+    result = await archive.run(request.app.state.pool)
+    if result["moved"] is None:
+        raise HTTPException(status_code=409, detail="Архивирование уже выполняется")
+    return result
+
+@router.get("/replicas", summary="Реплики для чтения: доступность, отставание, распределение GET")
+async def replica_stats():
+    return {"pid": os.getpid(), **replicas.snapshot()}
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="Метрики воркера в формате Prometheus")
+async def prometheus_metrics(request: Request):
+    # время запросов по маршрутам, SQL по нормализованному тексту, ожидание пула, сериализация
+    return PlainTextResponse(
+        instrumentation.prometheus(request.app.state.pool) + admission.prometheus() + replicas.prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@router.post("/profile", response_class=PlainTextResponse, summary="Выборочное профилирование воркера")
+async def profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+):
+    # Стеки потока цикла событий в формате collapsed (flamegraph.pl, speedscope); включается PROFILER_ENABLED
+    if not config.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Профилировщик выключен (PROFILER_ENABLED)")
+    if seconds > config.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Не дольше {config.PROFILER_MAX_SECONDS:g} секунд")
+    stacks = await instrumentation.profile(seconds, interval_ms / 1000)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="Профилирование уже выполняется")
+    return PlainTextResponse(stacks, headers={"X-Profile-Pid": str(os.getpid())})
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Request, Response, Depends
+from pydantic import BaseModel
+from typing import List, Optional
+from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+import audit
+import inventory
+
+router = APIRouter(
+    prefix="/inventory",
+    tags=["Inventory"],
+    dependencies=[Depends(get_current_user)]
+)
+
+class StockChange(BaseModel):
+    part_id: int
+    quantity: Optional[int] = None
+    ok: bool = True
+    stock_qty: Optional[int] = None
+    reserved_qty: Optional[int] = None
+
+class StockAdjustment(BaseModel):
+    delta: int
+
+class LowStockPart(BaseModel):
+    id: int
+    name: str
+    sku: str
+    stock_qty: int
+    reserved_qty: int
+    low_stock_threshold: int
+    available: int
+
+@router.post("/appointments/{appointment_id}/reserve", response_model=List[StockChange],
+             summary="Зарезервировать запчасти по норме услуги записи")
+async def reserve_parts(appointment_id: int, request: Request):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await inventory.reserve(conn, appointment_id)
+    audit.record_many(request, "update", "parts", [row["part_id"] for row in rows])
+    return json_response(rows)
+
+@router.post("/appointments/{appointment_id}/consume", response_model=List[StockChange],
+             summary="Списать запчасти по записи (все позиции услуги за один запрос)")
+async def consume_parts(appointment_id: int, request: Request):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await inventory.consume(conn, appointment_id)
+    audit.record_many(request, "update", "parts", [row["part_id"] for row in rows])
+    return json_response(rows)
+
+@router.post("/appointments/{appointment_id}/release", response_model=List[StockChange],
+             summary="Снять резерв запчастей по записи")
+async def release_parts(appointment_id: int, request: Request):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await inventory.release(conn, appointment_id)
+    audit.record_many(request, "update", "parts", [row["part_id"] for row in rows])
+    return json_response(rows)
+
+@router.post("/parts/{part_id}/adjust", response_model=StockChange, summary="Приход или списание остатка")
+async def adjust_stock(part_id: int, adjustment: StockAdjustment, request: Request):
+    async with request.app.state.pool.acquire() as conn:
+        row = await inventory.adjust(conn, part_id, adjustment.delta)
+    audit.record(request, "update", "parts", part_id)
+    return json_response(row)
+
+def low_stock_filters(margin: int = 0) -> Where:
+    # margin — запас сверх порога, чтобы видеть позиции, которые скоро закончатся
+    return Where().add("stock_qty - reserved_qty <= low_stock_threshold + {}", margin)
+
+@router.get("/low-stock", response_model=List[LowStockPart], summary="Запчасти с остатком не выше порога")
+async def get_low_stock(
+    request: Request,
+    response: Response,
+    where: Where = Depends(low_stock_filters),
+    page: PageParams = Depends(page_params("id", "sku")),
+):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await fetch_page(
+            conn,
+            "SELECT id, name, sku, stock_qty, reserved_qty, low_stock_threshold, "
+            "stock_qty - reserved_qty AS available FROM parts",
+            where, page, response
+        )
+    return json_response(rows, response)
+
+@router.get("/alerts", summary="Последние уведомления о низком остатке (этого воркера)")
+async def get_alerts():
+    return list(inventory.recent_alerts)
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from pydantic import BaseModel, constr
 from typing import Optional, List
 from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+import audit
+import bulk
+import updates
 
 router = APIRouter(
     prefix="/parts",
@@ -9,6 +14,10 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
+PART_COLUMNS = "id, name, sku, stock_qty, purchase_price, sale_price, car_id, reserved_qty, low_stock_threshold, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+PARTS_SQL = f"SELECT {PART_COLUMNS} FROM parts"
+
 class PartModel(BaseModel):
     name: str
     sku: str
@@ -16,65 +25,103 @@ class PartModel(BaseModel):
     purchase_price: float
     sale_price: float
     car_id: int
+    low_stock_threshold: int = 0
 
 class PartDB(PartModel):
     id: int
+    car_id: Optional[int] = None
+    reserved_qty: int = 0
+    version: Optional[int] = None
+
+PartPatch = updates.partial_model(PartModel, "PartPatch")
 
-@router.post("/", summary="Создать запчасть")
+@router.post("/", response_model=PartDB, summary="Создать запчасть")
 async def create_part(part: PartModel, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         try:
             result = await conn.fetchrow(
-                "INSERT INTO parts (name, sku, stock_qty, purchase_price, sale_price, car_id) "
-                "VALUES ($1, $2, $3, $4, $5, $6) "
-                "RETURNING id, name, sku, stock_qty, purchase_price, sale_price, car_id",
-                part.name, part.sku, part.stock_qty, part.purchase_price, part.sale_price, part.car_id
+                "INSERT INTO parts (name, sku, stock_qty, purchase_price, sale_price, car_id, low_stock_threshold) "
+                "VALUES ($1, $2, $3, $4, $5, $6, $7) "
+                f"RETURNING {PART_COLUMNS}",
+                part.name, part.sku, part.stock_qty, part.purchase_price, part.sale_price, part.car_id,
+                part.low_stock_threshold
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
+    audit.record(request, "insert", "parts", result["id"])
     return dict(result)
 
-@router.get("/", summary="Список запчастей")
-async def get_parts(request: Request):
+@router.post("/bulk", summary="Массовая загрузка запчастей (JSON-массив или CSV)")
+async def create_parts_bulk(request: Request, upsert: bool = True):
+    # upsert=true: запчасти с уже существующим SKU обновляются, остальные добавляются
+    return await bulk.import_rows(
+        request, "parts", PartModel,
+        ["name", "sku", "stock_qty", "purchase_price", "sale_price", "car_id"],
+        key="sku" if upsert else None,
+        foreign_keys={"car_id": "cars"},
+    )
+
+def part_filters(
+    car_id: Optional[int] = None,
+    sku: Optional[str] = None,
+    max_stock: Optional[int] = None,
+) -> Where:
+    return (
+        Where()
+        .add("car_id = {}", car_id)
+        .add("sku = {}", sku)
+        .add("stock_qty <= {}", max_stock)
+    )
+
+
+@router.get("/", response_model=List[PartDB], summary="Список запчастей")
+async def get_parts(
+    request: Request,
+    response: Response,
+    where: Where = Depends(part_filters),
+    page: PageParams = Depends(page_params("id", "name", "sku")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT id, name, sku, stock_qty, purchase_price, sale_price, car_id FROM parts")
-    return [dict(row) for row in rows]
+        rows = await fetch_page(
+            conn, PARTS_SQL, where, page, response
+        )
+    return json_response(rows, response)
 
 @router.get("/{part_id}", response_model=PartDB, summary="Получить запчасть по ID")
 async def get_part(part_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         part = await conn.fetchrow(
-            "SELECT id, name, sku, stock_qty, purchase_price, sale_price, car_id FROM parts WHERE id = $1",
+            f"SELECT {PART_COLUMNS} FROM parts WHERE id = $1",
             part_id
         )
         if not part:
             raise HTTPException(status_code=404, detail="Запчасть не найдена")
-    return dict(part)
+    return json_response(part)
 
-@router.put("/{part_id}", response_model=PartDB, summary="Обновить информацию о запчасти")
-async def update_part(part_id: int, part: PartModel, request: Request):
+async def _update_part(request: Request, part_id: int, fields: dict, version: Optional[int]):
+    # Остаток ниже резерва отклоняет ограничение parts_reserved_qty_check (409).
+    # Для прихода и списания есть атомарные /inventory/parts/{id}/adjust и /inventory/appointments/*
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT id FROM parts WHERE id = $1", part_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Запчасть не найдена")
-        await conn.execute(
-            """
-            UPDATE parts
-            SET name=$1, sku=$2, stock_qty=$3, purchase_price=$4, sale_price=$5, car_id=$6
-            WHERE id=$7
-            """,
-            part.name, part.sku, part.stock_qty, part.purchase_price, part.sale_price, part.car_id, part_id
-        )
-        updated = await conn.fetchrow(
-            "SELECT id, name, sku, stock_qty, purchase_price, sale_price, car_id FROM parts WHERE id = $1",
-            part_id
+        updated = await updates.update_row(
+            conn, "parts", part_id, fields, PART_COLUMNS, version=version, not_found="Запчасть не найдена"
         )
+    audit.record(request, "update", "parts", updated["id"])
     return dict(updated)
 
+@router.put("/{part_id}", response_model=PartDB, summary="Обновить информацию о запчасти")
+async def update_part(part_id: int, part: PartModel, request: Request,
+                      version: Optional[int] = Depends(updates.if_match)):
+    return await _update_part(request, part_id, updates.changes(part, partial=False), version)
+
+@router.patch("/{part_id}", response_model=PartDB, summary="Частично обновить запчасть")
+async def patch_part(part_id: int, part: PartPatch, request: Request,
+                     version: Optional[int] = Depends(updates.if_match)):
+    return await _update_part(request, part_id, updates.changes(part), version)
+
 @router.delete("/{part_id}", summary="Удалить запчасть")
 async def delete_part(part_id: int, request: Request):
     pool = request.app.state.pool
@@ -82,4 +129,5 @@ async def delete_part(part_id: int, request: Request):
         result = await conn.execute("DELETE FROM parts WHERE id = $1", part_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Запчасть не найдена")
+    audit.record(request, "delete", "parts", part_id)
     return {"message": "Запчасть успешно удалена"}
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Header, Request, Response, Depends, Query
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+from routers.auth import get_current_user
+from routers.export import payment_filters
+from pagination import Where, PageParams, page_params, fetch_page, decode_cursor
+from schedule import CANCELLED_STATUSES
+from serialization import json_response
+import audit
+import bulk
+import config
+import payments
+
+router = APIRouter(
+    prefix="/payments",
+    tags=["Payments"],
+    dependencies=[Depends(get_current_user)]
+)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Подзапрос без агрегатов на верхнем уровне PostgreSQL разворачивает: фильтры и ORDER BY ... LIMIT
+# доходят до appointments и её индексов
+BALANCES_SQL = f"SELECT * FROM ({payments.BALANCE_SQL}) b"
+BALANCE_SORT = "appointment_id"
+
+class PaymentModel(BaseModel):
+    appointment_id: int
+    amount: float = Field(..., gt=0)
+    payment_date: Optional[datetime] = None
+    payment_method: Optional[str] = None
+    status: str = payments.PAID_STATUS
+
+class PaymentDB(PaymentModel):
+    id: int
+    terminal_ref: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+# Строка файла сверки терминала; terminal_ref — номер операции, повторная загрузка файла обновляет строки
+class SettlementRow(BaseModel):
+    terminal_ref: str = Field(..., min_length=1)
+    appointment_id: int
+    amount: float = Field(..., gt=0)
+    payment_date: datetime
+    payment_method: str = "card"
+    status: str = payments.PAID_STATUS
+
+class Balance(BaseModel):
+    appointment_id: int
+    client_id: int
+    appointment_date: datetime
+    status: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    due: float
+    paid: float
+    balance: float
+
+@router.post("", response_model=PaymentDB, summary="Принять платёж по записи")
+async def create_payment(
+    payment: PaymentModel,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=200,
+                                            description="повтор с тем же ключом вернёт уже созданный платёж"),
+):
+    async with request.app.state.pool.acquire() as conn:
+        row, replayed = await payments.create(conn, payment, idempotency_key)
+    if replayed:
+        return json_response(row, Response(headers={REPLAYED_HEADER: "true"}))
+    audit.record(request, "insert", "payments", row["id"])
+    return json_response(row)
+
+@router.post("/settlements", summary="Загрузка файла сверки терминала (JSON-массив или CSV)")
+async def import_settlements(request: Request):
+    # Все строки и отметки об оплате записей — в одной транзакции
+    return await bulk.import_rows(
+        request, "payments", SettlementRow,
+        ["terminal_ref", "appointment_id", "amount", "payment_date", "payment_method", "status"],
+        key="terminal_ref",
+        foreign_keys={"appointment_id": "appointments"},
+        after=payments.settle,
+    )
+
+@router.get("", response_model=List[PaymentDB], summary="Список платежей")
+async def get_payments(
+    request: Request,
+    response: Response,
+    where: Where = Depends(payment_filters),
+    page: PageParams = Depends(page_params("id", "payment_date", default_order="desc")),
+):
+    async with request.app.state.pool.acquire() as conn:
+        rows = await fetch_page(
+            conn, f"SELECT {payments.PAYMENT_COLUMNS} FROM payments", where, page, response
+        )
+    return json_response(rows, response)
+
+def balance_filters(client_id: Optional[int], unpaid: bool) -> Where:
+    where = Where().add("client_id = {}", client_id)
+    if unpaid:
+        # paid_at IS NULL литералом — чтобы подходил частичный индекс idx_appointments_unpaid
+        where.add("paid_at IS NULL AND COALESCE(status, '') <> ALL({})", list(CANCELLED_STATUSES))
+    return where
+
+@router.get("/balances", response_model=List[Balance], summary="Долги по записям")
+async def get_balances(
+    request: Request,
+    response: Response,
+    client_id: Optional[int] = None,
+    unpaid: bool = Query(False, description="только неоплаченные и не отменённые"),
+    cursor: Optional[str] = Query(None, description="Значение X-Next-Cursor предыдущей страницы"),
+    limit: int = Query(config.PAGE_DEFAULT_LIMIT, ge=1, le=config.PAGE_MAX_LIMIT),
+):
+    where = balance_filters(client_id, unpaid)
+    page = PageParams(limit, BALANCE_SORT, "asc", decode_cursor(cursor, BALANCE_SORT) if cursor else None)
+    async with request.app.state.pool.acquire() as conn:
+        rows = await fetch_page(conn, BALANCES_SQL, where, page, response, id_column=BALANCE_SORT)
+    return json_response(rows, response)
+
+@router.get("/balances/{appointment_id}", response_model=Balance, summary="Долг по записи")
+async def get_balance(appointment_id: int, request: Request):
+    row = await request.app.state.pool.fetchrow(f"{payments.BALANCE_SQL} WHERE a.id = $1", appointment_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return json_response(row)
+
+@router.get("/{payment_id}", response_model=PaymentDB, summary="Платёж по ID")
+async def get_payment(payment_id: int, request: Request):
+    row = await request.app.state.pool.fetchrow(
+        f"SELECT {payments.PAYMENT_COLUMNS} FROM payments WHERE id = $1", payment_id
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return json_response(row)
@@ -0,0 +1,179 @@
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from fastapi.responses import Response
+from datetime import date, datetime, timedelta
+from typing import Optional
+import config
+import rollups
+import schedule
+from cache import TTLCache
+from routers.auth import get_current_user
+from routers.export import MEDIA_TYPES, ndjson_chunk, csv_chunk, csv_header
+from serialization import json_response
+
+# Отчёты читают только дневные агрегаты report_*_daily (см. rollups.py) и небольшие справочники,
+# поэтому не нагружают appointments/payments/reviews в рабочее время.
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"],
+    dependencies=[Depends(get_current_user)]
+)
+
+REFRESHED_AT_HEADER = "X-Report-Refreshed-At"
+DEFAULT_PERIOD_DAYS = 30
+
+# Готовые результаты; в ключ входит номер пересчёта из report_refresh_state (rollups.state), поэтому
+# после обновления агрегатов любым воркером старые снимки больше не выдаются
+_cache = TTLCache(maxsize=config.REPORTS_CACHE_SIZE, ttl=config.REPORTS_CACHE_TTL)
+
+# $1 date_from, $2 date_to (не включительно)
+REVENUE_SQL = {
+    "service": """
+        SELECT s.id AS service_id, s.name AS service_name,
+               sum(r.appointments) AS appointments, sum(r.completed) AS completed, sum(r.revenue) AS revenue
+        FROM report_service_daily r
+        JOIN services s ON s.id = r.service_id
+        WHERE r.day >= $1 AND r.day < $2
+        GROUP BY s.id, s.name
+        ORDER BY revenue DESC, s.id
+    """,
+    "category": """
+        SELECT c.id AS category_id, c.name AS category_name,
+               sum(r.appointments) AS appointments, sum(r.completed) AS completed, sum(r.revenue) AS revenue
+        FROM report_service_daily r
+        JOIN services s ON s.id = r.service_id
+        LEFT JOIN categories c ON c.id = s.category_id
+        WHERE r.day >= $1 AND r.day < $2
+        GROUP BY c.id, c.name
+        ORDER BY revenue DESC, c.id
+    """,
+}
+
+# $3 рабочих минут за период, $4 роли, которые принимают записи
+UTILIZATION_SQL = """
+    SELECT e.id AS employee_id, e.first_name, e.last_name,
+           COALESCE(sum(r.appointments), 0) AS appointments,
+           COALESCE(sum(r.booked_minutes), 0) AS booked_minutes,
+           round(COALESCE(sum(r.booked_minutes), 0)::numeric / $3, 3) AS utilization
+    FROM employees e
+    LEFT JOIN report_employee_daily r ON r.employee_id = e.id AND r.day >= $1 AND r.day < $2
+    WHERE e.role = ANY($4::text[])
+    GROUP BY e.id, e.first_name, e.last_name
+    ORDER BY utilization DESC, e.id
+"""
+
+PARTS_MARGIN_SQL = """
+    SELECT p.id AS part_id, p.name, p.sku,
+           sum(r.quantity) AS quantity, sum(r.revenue) AS revenue, sum(r.cost) AS cost,
+           sum(r.revenue) - sum(r.cost) AS margin
+    FROM report_parts_daily r
+    JOIN parts p ON p.id = r.part_id
+    WHERE r.day >= $1 AND r.day < $2
+    GROUP BY p.id, p.name, p.sku
+    ORDER BY margin DESC, p.id
+"""
+
+# $3 'day' или 'month'
+RATINGS_SQL = """
+    SELECT date_trunc($3, r.day)::date AS period, s.id AS service_id, s.name AS service_name,
+           sum(r.reviews) AS reviews, round(sum(r.rating_sum)::numeric / sum(r.reviews), 2) AS avg_rating
+    FROM report_rating_daily r
+    JOIN services s ON s.id = r.service_id
+    WHERE r.day >= $1 AND r.day < $2
+    GROUP BY 1, s.id, s.name
+    ORDER BY period, s.id
+"""
+
+
+def _workday_minutes() -> int:
+    start = datetime.combine(date.min, schedule.WORKDAY_START)
+    end = datetime.combine(date.min, schedule.WORKDAY_END)
+    return int((end - start).total_seconds() // 60)
+
+
+def _period(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = Query(None, description="не включительно"),
+) -> tuple:
+    # По умолчанию — последние 30 дней, включая сегодняшний
+    date_to = date_to or date.today() + timedelta(days=1)
+    date_from = date_from or date_to - timedelta(days=DEFAULT_PERIOD_DAYS)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from должен быть раньше date_to")
+    return date_from, date_to
+
+
+def utilization_args(date_from: date, date_to: date) -> list:
+    available = max((date_to - date_from).days * _workday_minutes(), 1)
+    return [date_from, date_to, available, tuple(config.BOOKABLE_ROLES)]
+
+
+async def _report(request: Request, name: str, query: str, args: list, fmt: str):
+    if fmt != "json" and fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format должен быть json, ndjson или csv")
+    async with request.app.state.pool.acquire() as conn:
+        state = await rollups.state(conn)
+        key = (name, tuple(args), state["generation"])
+        rows = _cache.get(key)
+        if rows is None:
+            rows = [dict(row) for row in await conn.fetch(query, *args)]
+            _cache.set(key, rows)
+    refreshed_at = state["refreshed_at"]
+    headers = {REFRESHED_AT_HEADER: refreshed_at.isoformat()} if refreshed_at else {}
+    if fmt == "json":
+        return json_response(rows, Response(headers=headers))
+    columns = list(rows[0]) if rows else []
+    body = csv_header(columns) + csv_chunk(rows, columns) if fmt == "csv" else ndjson_chunk(rows, columns)
+    filename = f"report_{name}_{args[0]:%Y%m%d}_{args[1]:%Y%m%d}.{fmt}"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/revenue", summary="Выручка по услугам или категориям")
+async def revenue_report(
+    request: Request,
+    period: tuple = Depends(_period),
+    group_by: str = Query("service", description="service или category"),
+    format: str = Query("json", description="json, ndjson или csv"),
+):
+    if group_by not in REVENUE_SQL:
+        raise HTTPException(status_code=400, detail="group_by должен быть service или category")
+    return await _report(request, f"revenue_{group_by}", REVENUE_SQL[group_by], list(period), format)
+
+
+@router.get("/utilization", summary="Загрузка мастеров")
+async def utilization_report(
+    request: Request,
+    period: tuple = Depends(_period),
+    format: str = Query("json", description="json, ndjson или csv"),
+):
+    return await _report(request, "utilization", UTILIZATION_SQL, utilization_args(*period), format)
+
+
+@router.get("/parts-margin", summary="Маржа по запчастям")
+async def parts_margin_report(
+    request: Request,
+    period: tuple = Depends(_period),
+    format: str = Query("json", description="json, ndjson или csv"),
+):
+    return await _report(request, "parts_margin", PARTS_MARGIN_SQL, list(period), format)
+
+
+@router.get("/ratings", summary="Динамика оценок по услугам")
+async def ratings_report(
+    request: Request,
+    period: tuple = Depends(_period),
+    bucket: str = Query("month", description="day или month"),
+    format: str = Query("json", description="json, ndjson или csv"),
+):
+    if bucket not in ("day", "month"):
+        raise HTTPException(status_code=400, detail="bucket должен быть day или month")
+    return await _report(request, f"ratings_{bucket}", RATINGS_SQL, [*period, bucket], format)
+
+
+@router.post("/refresh", summary="Пересчитать изменённые дни сейчас")
+async def refresh_reports(request: Request):
+    pool = request.app.state.pool
+    days = await rollups.refresh(pool)
+    async with pool.acquire() as conn:
+        state = await rollups.state(conn)
+    return {"days": days, "generation": state["generation"]}
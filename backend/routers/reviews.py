@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from pydantic import BaseModel, Field, constr
 from typing import List, Optional
 from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+from serialization import json_response
+import audit
+import updates
 
 router = APIRouter(
     prefix="/reviews",
@@ -19,6 +23,12 @@ class ReviewModel(BaseModel):
 
 class ReviewDB(ReviewModel):
     id: int
+    version: Optional[int] = None
+
+ReviewPatch = updates.partial_model(ReviewModel, "ReviewPatch")
+REVIEW_COLUMNS = "id, client_id, appointment_id, service_id, rating, comment, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+REVIEWS_SQL = "SELECT id, client_id, appointment_id, service_id, rating, comment FROM reviews"
 
 @router.post("/", response_model=ReviewDB, summary="Создать отзыв")
 async def create_review(review: ReviewModel, request: Request):
@@ -35,51 +45,70 @@ async def create_review(review: ReviewModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Ошибка при создании отзыва: {str(e)}")
+    audit.record(request, "insert", "reviews", row["id"])
     return dict(row)
 
 
+def review_filters(
+    client_id: Optional[int] = None,
+    appointment_id: Optional[int] = None,
+    service_id: Optional[int] = None,
+    min_rating: Optional[int] = None,
+) -> Where:
+    return (
+        Where()
+        .add("client_id = {}", client_id)
+        .add("appointment_id = {}", appointment_id)
+        .add("service_id = {}", service_id)
+        .add("rating >= {}", min_rating)
+    )
+
+
 @router.get("/", response_model=List[ReviewDB], summary="Получить список всех отзывов")
-async def get_reviews(request: Request):
+async def get_reviews(
+    request: Request,
+    response: Response,
+    where: Where = Depends(review_filters),
+    page: PageParams = Depends(page_params("id", default_order="desc")),
+):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT id, client_id, appointment_id, service_id, rating, comment FROM reviews ORDER BY id DESC"
+        rows = await fetch_page(
+            conn, REVIEWS_SQL, where, page, response
         )
-    return [dict(row) for row in rows]
+    return json_response(rows, response)
 
 @router.get("/{review_id}", response_model=ReviewDB, summary="Получить отзыв по ID")
 async def get_review(review_id: int, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         review = await conn.fetchrow(
-            "SELECT id, client_id, appointment_id, service_id, rating, comment FROM reviews WHERE id = $1",
+            f"SELECT {REVIEW_COLUMNS} FROM reviews WHERE id = $1",
             review_id
         )
         if not review:
             raise HTTPException(status_code=404, detail="Отзыв не найден")
-    return dict(review)
+    return json_response(review)
 
-@router.put("/{review_id}", response_model=ReviewDB, summary="Обновить отзыв")
-async def update_review(review_id: int, review: ReviewModel, request: Request):
+async def _update_review(request: Request, review_id: int, fields: dict, version: Optional[int]):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT id FROM reviews WHERE id = $1", review_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Отзыв не найден")
-        await conn.execute(
-            """
-            UPDATE reviews
-            SET client_id=$1, appointment_id=$2, service_id=$3, rating=$4, comment=$5
-            WHERE id=$6
-            """,
-            review.client_id, review.appointment_id, review.service_id, review.rating, review.comment, review_id
-        )
-        updated = await conn.fetchrow(
-            "SELECT id, client_id, appointment_id, service_id, rating, comment FROM reviews WHERE id = $1",
-            review_id
+        updated = await updates.update_row(
+            conn, "reviews", review_id, fields, REVIEW_COLUMNS, version=version, not_found="Отзыв не найден"
         )
+    audit.record(request, "update", "reviews", updated["id"])
     return dict(updated)
 
+@router.put("/{review_id}", response_model=ReviewDB, summary="Обновить отзыв")
+async def update_review(review_id: int, review: ReviewModel, request: Request,
+                        version: Optional[int] = Depends(updates.if_match)):
+    return await _update_review(request, review_id, updates.changes(review, partial=False), version)
+
+@router.patch("/{review_id}", response_model=ReviewDB, summary="Частично обновить отзыв")
+async def patch_review(review_id: int, review: ReviewPatch, request: Request,
+                       version: Optional[int] = Depends(updates.if_match)):
+    return await _update_review(request, review_id, updates.changes(review), version)
+
 @router.delete("/{review_id}", summary="Удалить отзыв")
 async def delete_review(review_id: int, request: Request):
     pool = request.app.state.pool
@@ -87,4 +116,5 @@ async def delete_review(review_id: int, request: Request):
         result = await conn.execute("DELETE FROM reviews WHERE id = $1", review_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Отзыв не найден")
+    audit.record(request, "delete", "reviews", review_id)
     return {"message": "Отзыв успешно удалён"}
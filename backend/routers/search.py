@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Request, Depends, Query
+from pydantic import BaseModel
+from typing import List
+import re
+from routers.auth import get_current_user
+from serialization import json_response
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"],
+    dependencies=[Depends(get_current_user)]
+)
+
+class SearchResult(BaseModel):
+    type: str
+    id: int
+    title: str
+    subtitle: str = None
+    rank: float
+
+# Параметры подзапросов: {q} и {q_upper} — запрос как есть и в верхнем регистре, {prefix}/{contains} —
+# шаблоны 'q%'/'%q%', {prefix_upper}/{contains_upper} — они же в верхнем регистре,
+# {digits_prefix}/{digits_contains} — шаблоны по цифрам телефона (NULL, если цифр меньше трёх), {limit}.
+# Номера $N выдаёт _Params только параметрам выбранных подзапросов: параметр, которого нет в тексте
+# запроса, PostgreSQL отвергает ("could not determine data type of parameter").
+# Ранг: совпадение с начала (typeahead) > вхождение > нечёткое совпадение (pg_trgm similarity).
+SEARCH_SQL = {
+    "clients": r"""
+        (SELECT 'client' AS type, id, first_name || ' ' || last_name AS title, phone AS subtitle,
+                GREATEST(similarity(last_name, {q}), similarity(first_name, {q}))
+                + CASE WHEN last_name ILIKE {prefix} OR first_name ILIKE {prefix} OR regexp_replace(phone, '\D', '', 'g') LIKE {digits_prefix} THEN 1
+                       WHEN last_name ILIKE {contains} OR first_name ILIKE {contains} OR email ILIKE {contains} OR regexp_replace(phone, '\D', '', 'g') LIKE {digits_contains} THEN 0.5
+                       ELSE 0 END AS rank
+         FROM clients
+         WHERE last_name ILIKE {contains} OR first_name ILIKE {contains} OR email ILIKE {contains}
+            OR regexp_replace(phone, '\D', '', 'g') LIKE {digits_contains}
+            OR last_name % {q}
+         ORDER BY rank DESC, id
+         LIMIT {limit})""",
+    "cars": """
+        (SELECT 'car' AS type, id, make || ' ' || model AS title,
+                concat_ws(' / ', license_plate, vin) AS subtitle,
+                GREATEST(similarity(upper(license_plate), {q_upper}), similarity(upper(vin), {q_upper}))
+                + CASE WHEN upper(license_plate) LIKE {prefix_upper} OR upper(vin) LIKE {prefix_upper} THEN 1
+                       WHEN upper(license_plate) LIKE {contains_upper} OR upper(vin) LIKE {contains_upper} THEN 0.5
+                       ELSE 0 END AS rank
+         FROM cars
+         WHERE upper(license_plate) LIKE {contains_upper} OR upper(vin) LIKE {contains_upper} OR upper(license_plate) % {q_upper}
+         ORDER BY rank DESC, id
+         LIMIT {limit})""",
+    "parts": """
+        (SELECT 'part' AS type, id, name AS title, sku AS subtitle,
+                GREATEST(similarity(upper(sku), {q_upper}), similarity(name, {q}))
+                + CASE WHEN upper(sku) LIKE {prefix_upper} OR name ILIKE {prefix} THEN 1
+                       WHEN upper(sku) LIKE {contains_upper} OR name ILIKE {contains} THEN 0.5
+                       ELSE 0 END AS rank
+         FROM parts
+         WHERE upper(sku) LIKE {contains_upper} OR name ILIKE {contains} OR name % {q}
+         ORDER BY rank DESC, id
+         LIMIT {limit})""",
+}
+
+
+class _Params(dict):
+    def __init__(self, values: dict):
+        super().__init__()
+        self.values = values
+        self.args = []
+
+    def __missing__(self, name):
+        self.args.append(self.values[name])
+        self[name] = f"${len(self.args)}"
+        return self[name]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_query(q: str, selected: list, limit: int) -> tuple:
+    # (запрос, параметры) для подзапросов selected; его же план проверяет plan_check
+    escaped = _escape_like(q)
+    digits = re.sub(r"\D", "", q)
+    params = _Params({
+        "q": q, "q_upper": q.upper(),
+        "prefix": f"{escaped}%", "contains": f"%{escaped}%",
+        "prefix_upper": f"{escaped.upper()}%", "contains_upper": f"%{escaped.upper()}%",
+        "digits_prefix": f"{digits}%" if len(digits) >= 3 else None,
+        "digits_contains": f"%{digits}%" if len(digits) >= 3 else None,
+        "limit": limit,
+    })
+    query = (" UNION ALL ".join(SEARCH_SQL[name] for name in selected)
+             + " ORDER BY rank DESC, type, id LIMIT {limit}").format_map(params)
+    return query, params.args
+
+
+@router.get("", response_model=List[SearchResult], summary="Поиск по клиентам, автомобилям и запчастям")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=100),
+    types: str = Query("clients,cars,parts", description="через запятую: clients, cars, parts"),
+    limit: int = Query(20, ge=1, le=50),
+):
+    q = q.strip()
+    selected = [name for name in SEARCH_SQL if name in {t.strip() for t in types.split(",")}]
+    if not q or not selected:
+        return json_response([])
+    query, args = search_query(q, selected, limit)
+    pool = request.app.state.pool
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(query, *args)
+    return json_response(rows)
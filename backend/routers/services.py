@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
 from pydantic import BaseModel
+from typing import List, Optional
 import asyncpg
 from routers.auth import get_current_user
+from pagination import Where, PageParams, page_params, fetch_page
+import response_cache
+import schedule
+import audit
+import updates
 
 router = APIRouter(dependencies=[Depends(get_current_user)])
 
@@ -12,7 +18,17 @@ class ServiceModel(BaseModel):
     category_id: int
     duration: int = None
 
-@router.post("/services", summary="Создание услуги")
+class ServiceDB(ServiceModel):
+    id: int
+    category_id: Optional[int] = None
+    version: Optional[int] = None
+
+ServicePatch = updates.partial_model(ServiceModel, "ServicePatch")
+SERVICE_COLUMNS = "id, name, description, price, category_id, duration, version"
+# Запрос списка (страницы добавляет fetch_page); plan_check проверяет план этого же текста
+SERVICES_SQL = "SELECT id, name, description, price, category_id, duration FROM services"
+
+@router.post("/services", response_model=ServiceDB, summary="Создание услуги")
 async def create_service(service: ServiceModel, request: Request):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
@@ -27,41 +43,69 @@ async def create_service(service: ServiceModel, request: Request):
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
+    await response_cache.invalidate(request, "services")
+    audit.record(request, "insert", "services", result["id"])
     return dict(result)
 
 
-@router.get("/services", summary="Список услуг")
-async def get_services(request: Request):
+def service_filters(category_id: Optional[int] = None) -> Where:
+    return Where().add("category_id = {}", category_id)
+
+
+@router.get("/services", response_model=List[ServiceDB], summary="Список услуг")
+async def get_services(
+    request: Request,
+    response: Response,
+    where: Where = Depends(service_filters),
+    page: PageParams = Depends(page_params("id", "name", "price")),
+):
+    cached = response_cache.lookup(request, "services")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT id, name, description, price, category_id, duration FROM services")
-    return [dict(row) for row in rows]
+        rows = await fetch_page(
+            conn, SERVICES_SQL, where, page, response
+        )
+    return response_cache.store(request, response, "services", rows)
 
 
-@router.get("/services/{service_id}", summary="Получить услугу")
-async def get_service(service_id: int, request: Request):
+@router.get("/services/{service_id}", response_model=ServiceDB, summary="Получить услугу")
+async def get_service(service_id: int, request: Request, response: Response):
+    cached = response_cache.lookup(request, "services")
+    if cached is not None:
+        return cached
     pool = request.app.state.pool
     async with pool.acquire() as conn:
         service = await conn.fetchrow(
-            "SELECT id, name, description, price FROM services WHERE id=$1",
+            f"SELECT {SERVICE_COLUMNS} FROM services WHERE id=$1",
             service_id
         )
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
-    return dict(service)
+    return response_cache.store(request, response, "services", service)
 
-@router.put("/services/{service_id}", summary="Обновление услуги")
-async def update_service(service_id: int, service: ServiceModel, request: Request):
+async def _update_service(request: Request, service_id: int, fields: dict, version: Optional[int]):
     pool = request.app.state.pool
     async with pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT * FROM services WHERE id=$1", service_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Service not found")
-        await conn.execute(
-            "UPDATE services SET title=$1, description=$2, price=$3 WHERE id=$4",
-            service.name, service.description, service.price, service_id
+        updated = await updates.update_row(
+            conn, "services", service_id, fields, SERVICE_COLUMNS, version=version, not_found="Service not found"
         )
-    return {"message": "Service updated successfully"}
+    await response_cache.invalidate(request, "services")
+    if "duration" in fields:
+        schedule.reset()
+    audit.record(request, "update", "services", updated["id"])
+    return dict(updated)
+
+@router.put("/services/{service_id}", response_model=ServiceDB, summary="Обновление услуги")
+async def update_service(service_id: int, service: ServiceModel, request: Request,
+                         version: Optional[int] = Depends(updates.if_match)):
+    return await _update_service(request, service_id, updates.changes(service, partial=False), version)
+
+@router.patch("/services/{service_id}", response_model=ServiceDB, summary="Частичное обновление услуги")
+async def patch_service(service_id: int, service: ServicePatch, request: Request,
+                        version: Optional[int] = Depends(updates.if_match)):
+    return await _update_service(request, service_id, updates.changes(service), version)
 
 @router.delete("/services/{service_id}", summary="Удаление услуги")
 async def delete_service(service_id: int, request: Request):
@@ -70,4 +114,6 @@ async def delete_service(service_id: int, request: Request):
         result = await conn.execute("DELETE FROM services WHERE id=$1", service_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Service not found")
+    await response_cache.invalidate(request, "services")
+    audit.record(request, "delete", "services", service_id)
     return {"message": "Service deleted successfully"}
@@ -0,0 +1,149 @@
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional
+from routers.auth import get_current_user
+from pagination import Where
+
+router = APIRouter(
+    prefix="/views",
+    tags=["Views"],
+    dependencies=[Depends(get_current_user)]
+)
+
+# Составные представления для страниц фронтенда: один запрос к БД собирает JSON целиком
+# (json_agg + json_build_object), и ответ отдаётся текстом из PostgreSQL без разбора и повторной
+# сериализации. Вложенные объекты и их поля выбираются параметром fields; таблицы, поля которых не
+# запрошены, не присоединяются.
+
+# Раздел -> (alias таблицы, условие JOIN, {поле: колонка}); "" — поля самой записи
+VIEW_FIELDS = {
+    "": ("a", None, {
+        "id": "a.id",
+        "appointment_date": "a.appointment_date",
+        "status": "a.status",
+        "client_id": "a.client_id",
+        "car_id": "a.car_id",
+        "service_id": "a.service_id",
+        "employee_id": "a.employee_id",
+        "paid_at": "a.paid_at",
+        "version": "a.version",
+    }),
+    "client": ("c", "JOIN clients c ON c.id = a.client_id", {
+        "id": "c.id",
+        "first_name": "c.first_name",
+        "last_name": "c.last_name",
+        "phone": "c.phone",
+        "email": "c.email",
+        "client_type": "c.client_type",
+        "discount": "c.discount",
+    }),
+    "car": ("car", "JOIN cars car ON car.id = a.car_id", {
+        "id": "car.id",
+        "make": "car.make",
+        "model": "car.model",
+        "year": "car.year",
+        "license_plate": "car.license_plate",
+        "vin": "car.vin",
+        "color": "car.color",
+    }),
+    "service": ("s", "JOIN services s ON s.id = a.service_id", {
+        "id": "s.id",
+        "name": "s.name",
+        "price": "s.price",
+        "duration": "s.duration",
+        "category_id": "s.category_id",
+    }),
+    "employee": ("e", "LEFT JOIN employees e ON e.id = a.employee_id", {
+        "id": "e.id",
+        "first_name": "e.first_name",
+        "last_name": "e.last_name",
+        "role": "e.role",
+    }),
+}
+
+# Что рисует дневная доска, если fields не передан
+DEFAULT_DAY_FIELDS = (
+    "id,appointment_date,status,version,"
+    "client.id,client.first_name,client.last_name,client.phone,"
+    "car.id,car.make,car.model,car.license_plate,"
+    "service.id,service.name,service.duration,"
+    "employee.id,employee.first_name,employee.last_name"
+)
+
+
+def parse_fields(fields: str) -> tuple:
+    # "status,client,car.license_plate" -> (("", ("status",)), ("car", ("license_plate",)), ("client", (...все...)))
+    selected = {}
+    for item in (part.strip() for part in fields.split(",")):
+        if not item:
+            continue
+        section, _, name = item.rpartition(".") if "." in item else ("", "", item)
+        if section == "" and name in VIEW_FIELDS and name != "":
+            section, name = name, ""
+        if section not in VIEW_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Неизвестный раздел: {section}")
+        columns = VIEW_FIELDS[section][2]
+        if name and name not in columns:
+            raise HTTPException(status_code=400, detail=f"Неизвестное поле: {item}")
+        selected.setdefault(section, set()).update([name] if name else columns)
+    if not selected:
+        raise HTTPException(status_code=400, detail="Не выбрано ни одного поля")
+    return tuple(sorted((section, tuple(sorted(names))) for section, names in selected.items()))
+
+
+def _object(section: str, names: tuple) -> str:
+    columns = VIEW_FIELDS[section][2]
+    pairs = ", ".join(f"'{name}', {columns[name]}" for name in names)
+    return f"json_build_object({pairs})"
+
+
+@lru_cache(maxsize=128)
+def day_query(selection: tuple, conditions: tuple) -> str:
+    # selection — результат parse_fields, conditions — условия WHERE с $n; текст запроса кэшируется
+    sections = dict(selection)
+    pairs = [
+        f"'{name}', {VIEW_FIELDS[''][2][name]}" for name in sections.get("", ())
+    ]
+    joins = []
+    for section, names in selection:
+        if section == "":
+            continue
+        alias, join, _ = VIEW_FIELDS[section]
+        joins.append(join)
+        item = _object(section, names)
+        if join.startswith("LEFT"):
+            # у записи может не быть мастера: null вместо объекта из null-полей
+            item = f"CASE WHEN {alias}.id IS NULL THEN NULL ELSE {item} END"
+        pairs.append(f"'{section}', {item}")
+    return (
+        f"SELECT COALESCE(json_agg(json_build_object({', '.join(pairs)}) "
+        f"ORDER BY a.appointment_date, a.id), '[]')::text "
+        f"FROM appointments a {' '.join(joins)} WHERE {' AND '.join(conditions)}"
+    )
+
+
+def day_filters(
+    day: date = Query(..., alias="date"),
+    employee_id: Optional[int] = None,
+    status: Optional[str] = None,
+) -> Where:
+    start = datetime.combine(day, time.min)
+    return (
+        Where()
+        .add("a.appointment_date >= {}", start)
+        .add("a.appointment_date < {}", start + timedelta(days=1))
+        .add("a.employee_id = {}", employee_id)
+        .add("a.status = {}", status)
+    )
+
+
+@router.get("/day", summary="Записи дня с клиентом, автомобилем, услугой и мастером")
+async def get_day_view(
+    request: Request,
+    where: Where = Depends(day_filters),
+    fields: str = Query(DEFAULT_DAY_FIELDS, description="поля через запятую: status, client, car.license_plate, ..."),
+):
+    query = day_query(parse_fields(fields), tuple(where.conditions))
+    body = await request.app.state.pool.fetchval(query, *where.args)
+    return Response(content=body, media_type="application/json")
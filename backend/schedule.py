@@ -0,0 +1,177 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+import config
+from cache import TTLCache
+
+# Индекс занятости сотрудников по дням: для каждого дня — отсортированные непересекающиеся интервалы
+# занятости каждого сотрудника. День загружается из БД при первом обращении и живёт AVAILABILITY_TTL
+# секунд (записи, сделанные другими воркерами, станут видны после перезагрузки дня). Изменения этого
+# воркера применяются сразу. Окончательная проверка конфликта при записи выполняется в БД
+# (см. check_conflict), индекс нужен только для быстрых ответов о свободном времени.
+
+CANCELLED_STATUSES = ("cancelled", "отменено")
+
+
+def _parse_time(value: str) -> time:
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+WORKDAY_START = _parse_time(config.WORKDAY_START)
+WORKDAY_END = _parse_time(config.WORKDAY_END)
+SLOT_STEP = timedelta(minutes=config.SLOT_STEP_MINUTES)
+
+
+def service_length(duration: Optional[int]) -> timedelta:
+    return timedelta(minutes=duration or config.DEFAULT_SERVICE_DURATION)
+
+
+class DaySchedule:
+    def __init__(self, day: date, employees: list):
+        self.day = day
+        self.employees = employees
+        # appointment_id -> (employee_id, start, end)
+        self.appointments = {}
+        # employee_id -> [[start, end], ...] слитые интервалы, по возрастанию
+        self.busy = {employee_id: [] for employee_id in employees}
+
+    def rebuild(self, employee_id: int):
+        intervals = sorted(
+            (start, end) for emp, start, end in self.appointments.values() if emp == employee_id
+        )
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.busy[employee_id] = merged
+
+    def add(self, appointment_id: int, employee_id: int, start: datetime, end: datetime):
+        self.appointments[appointment_id] = (employee_id, start, end)
+        self.rebuild(employee_id)
+
+    def remove(self, appointment_id: int):
+        item = self.appointments.pop(appointment_id, None)
+        if item is not None:
+            self.rebuild(item[0])
+
+    def free_slots(self, employee_id: int, length: timedelta, not_before: Optional[datetime] = None) -> list:
+        # Проход по сетке слотов и интервалам занятости одновременно: O(слоты + интервалы)
+        day_start = datetime.combine(self.day, WORKDAY_START)
+        day_end = datetime.combine(self.day, WORKDAY_END)
+        intervals = self.busy.get(employee_id, [])
+        slots = []
+        start = day_start
+        if not_before is not None and not_before > start:
+            steps = -(-(not_before - day_start) // SLOT_STEP)
+            start = day_start + steps * SLOT_STEP
+        i = 0
+        while start + length <= day_end:
+            while i < len(intervals) and intervals[i][1] <= start:
+                i += 1
+            if i < len(intervals) and intervals[i][0] < start + length:
+                # пропускаем до конца занятого интервала, выравнивая по сетке
+                steps = -(-(intervals[i][1] - day_start) // SLOT_STEP)
+                start = day_start + steps * SLOT_STEP
+                continue
+            slots.append(start)
+            start += SLOT_STEP
+        return slots
+
+
+_days = TTLCache(maxsize=config.AVAILABILITY_DAYS_CACHED, ttl=config.AVAILABILITY_TTL)
+
+
+async def _load_day(conn, day: date) -> DaySchedule:
+    employees = await conn.fetch(
+        "SELECT id FROM employees WHERE role = ANY($1::text[]) ORDER BY id", config.BOOKABLE_ROLES
+    )
+    schedule = DaySchedule(day, [row["id"] for row in employees])
+    day_start = datetime.combine(day, time.min)
+    rows = await conn.fetch(
+        """
+        SELECT a.id, a.employee_id, a.appointment_date, s.duration
+        FROM appointments a
+        JOIN services s ON s.id = a.service_id
+        WHERE a.employee_id IS NOT NULL
+          AND a.appointment_date >= $1 AND a.appointment_date < $2
+          AND COALESCE(a.status, '') <> ALL($3::text[])
+        """,
+        day_start - timedelta(days=1), day_start + timedelta(days=1), list(CANCELLED_STATUSES)
+    )
+    for row in rows:
+        end = row["appointment_date"] + service_length(row["duration"])
+        if end > day_start:
+            schedule.appointments[row["id"]] = (row["employee_id"], row["appointment_date"], end)
+    for employee_id in {emp for emp, _, _ in schedule.appointments.values()}:
+        schedule.rebuild(employee_id)
+    return schedule
+
+
+async def get_day(conn, day: date) -> DaySchedule:
+    schedule = _days.get(day)
+    if schedule is None:
+        schedule = await _load_day(conn, day)
+        _days.set(day, schedule)
+    return schedule
+
+
+def _days_of(start: datetime, end: datetime):
+    day = start.date()
+    while datetime.combine(day, time.min) < end:
+        yield day
+        day += timedelta(days=1)
+
+
+def booked(appointment_id: int, employee_id: Optional[int], start: datetime, length: timedelta):
+    # Инкрементальное обновление уже загруженных дней после успешной записи
+    if employee_id is None:
+        return
+    for day in _days_of(start, start + length):
+        schedule = _days.get(day)
+        if schedule is not None:
+            schedule.add(appointment_id, employee_id, start, start + length)
+
+
+def released(appointment_id: int, start: datetime):
+    for day in (start.date(), start.date() + timedelta(days=1)):
+        schedule = _days.get(day)
+        if schedule is not None:
+            schedule.remove(appointment_id)
+
+
+def reset():
+    # Изменились длительности услуг или состав мастеров: дни перечитываются из БД
+    _days.clear()
+
+
+async def check_conflict(conn, employee_id: int, start: datetime, length: timedelta,
+                         exclude_id: Optional[int] = None) -> Optional[int]:
+    # Вызывать внутри транзакции записи: advisory lock на (сотрудник, день) сериализует параллельные записи
+    # к одному мастеру, затем ищется пересечение с уже существующими записями. Возвращает id конфликта.
+    # Блокируются все дни от start - 1 день до конца записи, по возрастанию: пересекающиеся записи,
+    # начинающиеся в разные дни (23:30 и 00:15 следующего дня), берут хотя бы один общий ключ, а
+    # одинаковый порядок не даёт им заблокировать друг друга крест-накрест.
+    days = [day.toordinal() for day in _days_of(start - timedelta(days=1), start + length)]
+    await conn.execute("SELECT pg_advisory_xact_lock($1, day) FROM unnest($2::int[]) AS day", employee_id, days)
+    return await conn.fetchval(
+        """
+        SELECT a.id
+        FROM appointments a
+        JOIN services s ON s.id = a.service_id
+        WHERE a.employee_id = $1
+          AND a.appointment_date < $3::timestamp
+          AND a.appointment_date >= $2::timestamp - interval '1 day'
+          AND a.appointment_date + make_interval(mins => COALESCE(s.duration, $4)) > $2::timestamp
+          AND COALESCE(a.status, '') <> ALL($5::text[])
+          AND a.id IS DISTINCT FROM $6
+        LIMIT 1
+        """,
+        employee_id, start, start + length, config.DEFAULT_SERVICE_DURATION, list(CANCELLED_STATUSES), exclude_id
+    )
+
+
+def stats() -> dict:
+    return _days.stats()
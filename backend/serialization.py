@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import asyncpg
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import instrumentation
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него работает стандартный json
+    orjson = None
+
+# Заголовки временного Response из обработчика, которые переносятся в готовый ответ
+_SKIP_HEADERS = {"content-length", "content-type"}
+
+
+def _default(value):
+    if isinstance(value, asyncpg.Record):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _plain(value):
+    # Для jsonable_encoder: записи asyncpg, в том числе вложенные, -> dict. custom_encoder={Record: dict}
+    # не обходил значения записи, и datetime/Decimal доходили до json.dumps
+    if isinstance(value, (asyncpg.Record, dict)):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def dumps(content) -> bytes:
+    # Записи asyncpg, Decimal и datetime сериализуются напрямую, без списка промежуточных dict и jsonable_encoder
+    started = time.perf_counter()
+    if orjson is not None:
+        body = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        body = JSONResponse(content=jsonable_encoder(_plain(content))).body
+    instrumentation.serialized(time.perf_counter() - started)
+    return body
+
+
+def json_response(content, response: Response = None, status_code: int = 200) -> Response:
+    # Ответ из списка/одной записи; заголовки, выставленные обработчиком в response (X-Next-Cursor и т.п.), сохраняются
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _SKIP_HEADERS}
+    return Response(content=dumps(content), status_code=status_code, media_type="application/json", headers=headers)
+
+
+class FastJSONResponse(JSONResponse):
+    # Класс ответа по умолчанию для приложения: orjson, если установлен
+    def render(self, content) -> bytes:
+        return dumps(content)
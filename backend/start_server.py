@@ -1,4 +1,39 @@
+import argparse
+import importlib.util
+import os
 import uvicorn
 
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Запуск Auto Service API")
+    parser.add_argument("--dev", action="store_true", help="один процесс с автоперезагрузкой (как раньше)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="сколько секунд ждать завершения текущих запросов при остановке")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    args = parse_args()
+    if args.dev:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+    else:
+        # Воркеры читают WEB_CONCURRENCY из окружения, чтобы поделить DB_CONNECTION_BUDGET между собой
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop" if _has("uvloop") else "asyncio",
+            http="httptools" if _has("httptools") else "h11",
+            timeout_graceful_shutdown=args.graceful_timeout,
+            proxy_headers=True,
+            access_log=False,
+        )
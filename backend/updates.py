@@ -0,0 +1,74 @@
+from typing import Optional
+
+import asyncpg
+from fastapi import Header, HTTPException
+from pydantic import BaseModel, create_model
+from pydantic.fields import FieldInfo
+
+# Обновление строки одним оператором UPDATE ... RETURNING: без предварительного SELECT и повторного
+# чтения. Отсутствие строки определяется по пустому RETURNING. Оптимистичная блокировка — по колонке
+# version (миграция 0006): клиент передаёт значение поля version из ответа в If-Match, и UPDATE
+# применяется, только если строку никто не изменил после чтения. GET одной строки справочника отдаёт
+# ETag: "<version>" (response_cache), так что ETag из ответа подходит для If-Match как есть.
+
+
+def partial_model(model: type, name: str) -> type:
+    # Модель для PATCH: те же поля и ограничения, но все необязательные
+    fields = {
+        field_name: (Optional[field.annotation], FieldInfo.merge_field_infos(field, default=None))
+        for field_name, field in model.model_fields.items()
+    }
+    return create_model(name, **fields)
+
+
+def changes(item: BaseModel, partial: bool = True) -> dict:
+    # partial=True — только переданные в запросе поля (PATCH), иначе все поля модели (PUT)
+    if partial:
+        return {name: getattr(item, name) for name in item.model_fields_set}
+    return {name: getattr(item, name) for name in type(item).model_fields}
+
+
+def if_match(if_match: Optional[str] = Header(None, description='Версия строки: "<version>"')) -> Optional[int]:
+    # Зависимость FastAPI: ожидаемая версия строки или None, если заголовка нет (или "*")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=412, detail="If-Match должен содержать версию строки")
+
+
+async def update_row(
+    conn,
+    table: str,
+    row_id: int,
+    fields: dict,
+    returning: str,
+    version: Optional[int] = None,
+    not_found: str = "Запись не найдена",
+):
+    # fields — {колонка: значение}; имена колонок берутся из полей pydantic-модели, не из запроса
+    if not fields:
+        raise HTTPException(status_code=400, detail="Нет полей для обновления")
+    args = list(fields.values()) + [row_id]
+    assignments = ", ".join(f"{column}=${number}" for number, column in enumerate(fields, start=1))
+    query = f"UPDATE {table} SET {assignments} WHERE id=${len(args)}"
+    if version is not None:
+        args.append(version)
+        query += f" AND version=${len(args)}"
+    try:
+        row = await conn.fetchrow(f"{query} RETURNING {returning}", *args)
+    except asyncpg.CheckViolationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except asyncpg.IntegrityConstraintViolationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if row is None:
+        # Строки нет или её версия изменилась: второй запрос только на этом (редком) пути
+        if version is not None and await conn.fetchval(f"SELECT 1 FROM {table} WHERE id=$1", row_id):
+            raise HTTPException(status_code=412, detail="Строка изменена другим запросом, перечитайте её")
+        raise HTTPException(status_code=404, detail=not_found)
+    return row
+
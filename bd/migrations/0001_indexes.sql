@@ -0,0 +1,32 @@
+-- no-transaction
+-- Индексы под фильтры роутеров. CONCURRENTLY не блокирует запись, но не работает внутри транзакции.
+-- users.username уже проиндексирован ограничением UNIQUE из init.sql.
+
+-- get_cars_by_client, фильтр client_id в /cars
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cars_client_id ON cars (client_id);
+-- массовая загрузка с upsert по VIN
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cars_vin ON cars (vin);
+
+-- история обслуживания клиента (get_client) и фильтр client_id в /appointments
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_client_date ON appointments (client_id, appointment_date DESC);
+-- фильтр по периоду и сортировка по appointment_date в /appointments и /export/appointments
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_date ON appointments (appointment_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_car_id ON appointments (car_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointments_employee_date ON appointments (employee_id, appointment_date);
+
+-- поиск и upsert по SKU
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parts_sku ON parts (sku);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parts_car_id ON parts (car_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_appointment_id ON reviews (appointment_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_client_id ON reviews (client_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_appointment_id ON payments (appointment_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_date ON payments (payment_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_services_category_id ON services (category_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_parts_part_id ON service_parts (part_id);
+
+-- keyset-пагинация по колонкам сортировки
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_last_name ON clients (last_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parts_name ON parts (name, id);
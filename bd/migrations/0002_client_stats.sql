@@ -0,0 +1,78 @@
+-- Агрегаты профиля клиента, поддерживаемые триггерами: число визитов, последний визит,
+-- сумма оплат и средняя оценка. Профиль читает одну строку вместо пересчёта по истории.
+CREATE TABLE IF NOT EXISTS client_stats (
+                                            client_id INTEGER PRIMARY KEY REFERENCES clients(id) ON DELETE CASCADE,
+                                            visit_count INTEGER NOT NULL DEFAULT 0,
+                                            last_visit TIMESTAMP,
+                                            total_spent NUMERIC(12,2) NOT NULL DEFAULT 0,
+                                            avg_rating NUMERIC(3,2),
+                                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Пересчёт одного клиента: дешёвый благодаря индексам по client_id / appointment_id
+CREATE OR REPLACE FUNCTION refresh_client_stats(p_client_id INTEGER) RETURNS VOID AS $$
+BEGIN
+    IF p_client_id IS NULL OR NOT EXISTS (SELECT 1 FROM clients WHERE id = p_client_id) THEN
+        RETURN;
+    END IF;
+    INSERT INTO client_stats (client_id, visit_count, last_visit, total_spent, avg_rating, updated_at)
+    SELECT p_client_id,
+           (SELECT count(*) FROM appointments a
+             WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено')),
+           (SELECT max(a.appointment_date) FROM appointments a
+             WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено')),
+           (SELECT COALESCE(sum(p.amount), 0) FROM payments p
+              JOIN appointments a ON a.id = p.appointment_id
+             WHERE a.client_id = p_client_id AND p.status = 'paid'),
+           (SELECT round(avg(r.rating), 2) FROM reviews r WHERE r.client_id = p_client_id),
+           CURRENT_TIMESTAMP
+    ON CONFLICT (client_id) DO UPDATE
+        SET visit_count = EXCLUDED.visit_count,
+            last_visit = EXCLUDED.last_visit,
+            total_spent = EXCLUDED.total_spent,
+            avg_rating = EXCLUDED.avg_rating,
+            updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION client_stats_by_client() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_client_stats(NEW.client_id);
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.client_id IS DISTINCT FROM NEW.client_id) THEN
+        PERFORM refresh_client_stats(OLD.client_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION client_stats_by_payment() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_client_stats((SELECT client_id FROM appointments WHERE id = NEW.appointment_id));
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.appointment_id IS DISTINCT FROM NEW.appointment_id) THEN
+        PERFORM refresh_client_stats((SELECT client_id FROM appointments WHERE id = OLD.appointment_id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_client_stats_appointments ON appointments;
+CREATE TRIGGER trg_client_stats_appointments
+    AFTER INSERT OR DELETE OR UPDATE OF client_id, status, appointment_date ON appointments
+    FOR EACH ROW EXECUTE FUNCTION client_stats_by_client();
+
+DROP TRIGGER IF EXISTS trg_client_stats_reviews ON reviews;
+CREATE TRIGGER trg_client_stats_reviews
+    AFTER INSERT OR DELETE OR UPDATE OF client_id, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION client_stats_by_client();
+
+DROP TRIGGER IF EXISTS trg_client_stats_payments ON payments;
+CREATE TRIGGER trg_client_stats_payments
+    AFTER INSERT OR DELETE OR UPDATE OF appointment_id, amount, status ON payments
+    FOR EACH ROW EXECUTE FUNCTION client_stats_by_payment();
+
+-- Начальное заполнение
+SELECT refresh_client_stats(id) FROM clients;
@@ -0,0 +1,15 @@
+-- no-transaction
+-- Триграммные GIN-индексы для /search: ILIKE '%q%', префиксный поиск (typeahead) и нечёткое сравнение (%)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_last_name_trgm ON clients USING gin (last_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_first_name_trgm ON clients USING gin (first_name gin_trgm_ops);
+-- телефон ищется по цифрам, без пробелов, скобок и дефисов
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_phone_digits_trgm ON clients USING gin ((regexp_replace(phone, '\D', '', 'g')) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_email_trgm ON clients USING gin (email gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cars_license_plate_trgm ON cars USING gin (upper(license_plate) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cars_vin_trgm ON cars USING gin (upper(vin) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parts_sku_trgm ON parts USING gin (upper(sku) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parts_name_trgm ON parts USING gin (name gin_trgm_ops);
@@ -0,0 +1,110 @@
+-- Дневные агрегаты для /reports. Триггеры отмечают затронутые дни в report_dirty_days,
+-- фоновая задача (rollups.py) пересчитывает только эти дни.
+CREATE TABLE IF NOT EXISTS report_dirty_days (
+                                                 day DATE PRIMARY KEY,
+                                                 marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Выручка и число записей по услугам
+CREATE TABLE IF NOT EXISTS report_service_daily (
+                                                    day DATE NOT NULL,
+                                                    service_id INTEGER NOT NULL,
+                                                    appointments INTEGER NOT NULL,
+                                                    completed INTEGER NOT NULL,
+                                                    revenue NUMERIC(12,2) NOT NULL,
+                                                    PRIMARY KEY (day, service_id)
+);
+
+-- Загрузка мастеров: число записей и занятые минуты
+CREATE TABLE IF NOT EXISTS report_employee_daily (
+                                                     day DATE NOT NULL,
+                                                     employee_id INTEGER NOT NULL,
+                                                     appointments INTEGER NOT NULL,
+                                                     booked_minutes INTEGER NOT NULL,
+                                                     PRIMARY KEY (day, employee_id)
+);
+
+-- Расход запчастей по выполненным записям (по норме service_parts) и маржа
+CREATE TABLE IF NOT EXISTS report_parts_daily (
+                                                  day DATE NOT NULL,
+                                                  part_id INTEGER NOT NULL,
+                                                  quantity INTEGER NOT NULL,
+                                                  revenue NUMERIC(12,2) NOT NULL,
+                                                  cost NUMERIC(12,2) NOT NULL,
+                                                  PRIMARY KEY (day, part_id)
+);
+
+-- Оценки по услугам (по дню отзыва)
+CREATE TABLE IF NOT EXISTS report_rating_daily (
+                                                   day DATE NOT NULL,
+                                                   service_id INTEGER NOT NULL,
+                                                   reviews INTEGER NOT NULL,
+                                                   rating_sum INTEGER NOT NULL,
+                                                   PRIMARY KEY (day, service_id)
+);
+
+CREATE OR REPLACE FUNCTION mark_report_day(p_day DATE) RETURNS VOID AS $$
+BEGIN
+    IF p_day IS NOT NULL THEN
+        INSERT INTO report_dirty_days (day) VALUES (p_day) ON CONFLICT (day) DO NOTHING;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION report_mark_appointment() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_report_day(NEW.appointment_date::date);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM mark_report_day(OLD.appointment_date::date);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION report_mark_payment() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_report_day((SELECT appointment_date::date FROM appointments WHERE id = NEW.appointment_id));
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM mark_report_day((SELECT appointment_date::date FROM appointments WHERE id = OLD.appointment_id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION report_mark_review() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM mark_report_day(NEW.created_at::date);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM mark_report_day(OLD.created_at::date);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_report_appointments ON appointments;
+CREATE TRIGGER trg_report_appointments
+    AFTER INSERT OR DELETE OR UPDATE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION report_mark_appointment();
+
+DROP TRIGGER IF EXISTS trg_report_payments ON payments;
+CREATE TRIGGER trg_report_payments
+    AFTER INSERT OR DELETE OR UPDATE ON payments
+    FOR EACH ROW EXECUTE FUNCTION report_mark_payment();
+
+DROP TRIGGER IF EXISTS trg_report_reviews ON reviews;
+CREATE TRIGGER trg_report_reviews
+    AFTER INSERT OR DELETE OR UPDATE ON reviews
+    FOR EACH ROW EXECUTE FUNCTION report_mark_review();
+
+-- Начальное заполнение: все дни с данными считаются изменёнными
+INSERT INTO report_dirty_days (day)
+SELECT DISTINCT appointment_date::date FROM appointments
+UNION
+SELECT DISTINCT created_at::date FROM reviews WHERE created_at IS NOT NULL
+ON CONFLICT (day) DO NOTHING;
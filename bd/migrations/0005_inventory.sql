@@ -0,0 +1,56 @@
+-- Склад: резерв запчастей под записи и списание по норме service_parts.
+-- Доступный остаток = stock_qty - reserved_qty; ограничения не дают уйти в минус даже при гонке.
+ALTER TABLE parts ADD COLUMN IF NOT EXISTS reserved_qty INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE parts ADD COLUMN IF NOT EXISTS low_stock_threshold INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE parts ADD CONSTRAINT parts_stock_qty_check CHECK (stock_qty >= 0);
+ALTER TABLE parts ADD CONSTRAINT parts_reserved_qty_check CHECK (reserved_qty >= 0 AND reserved_qty <= stock_qty);
+
+-- Резерв/списание по записи: одна строка на запчасть, статус reserved -> consumed | released
+CREATE TABLE IF NOT EXISTS part_reservations (
+                                                 appointment_id INTEGER NOT NULL REFERENCES appointments(id) ON DELETE CASCADE,
+                                                 part_id INTEGER NOT NULL REFERENCES parts(id) ON DELETE CASCADE,
+                                                 quantity INTEGER NOT NULL CHECK (quantity > 0),
+                                                 status TEXT NOT NULL DEFAULT 'reserved',
+                                                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                                 PRIMARY KEY (appointment_id, part_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_part_reservations_part ON part_reservations (part_id) WHERE status = 'reserved';
+
+-- Удаление записи каскадом удаляет резерв: возвращаем зарезервированное в доступный остаток
+CREATE OR REPLACE FUNCTION part_reservations_release_deleted() RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.status = 'reserved' THEN
+        UPDATE parts SET reserved_qty = reserved_qty - OLD.quantity WHERE id = OLD.part_id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_part_reservations_release_deleted ON part_reservations;
+CREATE TRIGGER trg_part_reservations_release_deleted
+    AFTER DELETE ON part_reservations
+    FOR EACH ROW EXECUTE FUNCTION part_reservations_release_deleted();
+
+-- Уведомление о низком остатке: только в момент перехода через порог, а не на каждое списание
+CREATE OR REPLACE FUNCTION parts_notify_low_stock() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.stock_qty - NEW.reserved_qty <= NEW.low_stock_threshold
+       AND OLD.stock_qty - OLD.reserved_qty > OLD.low_stock_threshold THEN
+        PERFORM pg_notify('low_stock', json_build_object(
+            'part_id', NEW.id,
+            'sku', NEW.sku,
+            'name', NEW.name,
+            'stock_qty', NEW.stock_qty,
+            'reserved_qty', NEW.reserved_qty,
+            'low_stock_threshold', NEW.low_stock_threshold
+        )::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_parts_notify_low_stock ON parts;
+CREATE TRIGGER trg_parts_notify_low_stock
+    AFTER UPDATE OF stock_qty, reserved_qty, low_stock_threshold ON parts
+    FOR EACH ROW EXECUTE FUNCTION parts_notify_low_stock();
@@ -0,0 +1,24 @@
+-- Номер версии строки для оптимистичной блокировки (If-Match в PUT/PATCH).
+-- Увеличивается триггером при любом UPDATE, в том числе из массовой загрузки и склада.
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['clients', 'cars', 'categories', 'services', 'employees', 'appointments', 'parts', 'reviews']
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_version ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_version BEFORE UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION bump_row_version()',
+            t, t
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,5 @@
+-- Запросы к журналу аудита идут по диапазону времени: audit_logs только дописывается, поэтому
+-- BRIN по timestamp почти ничего не весит; выборки по конкретной строке — через btree.
+CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp_brin ON audit_logs USING brin (timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_record ON audit_logs (table_name, record_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs (user_id, timestamp);
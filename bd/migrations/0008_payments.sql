@@ -0,0 +1,17 @@
+-- Платежи: ключ идемпотентности для повторных POST, номер операции терминала для сверки,
+-- отметка об оплате записи (ставится одним UPDATE по остатку долга, см. backend/payments.py)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS request_hash TEXT;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS terminal_ref TEXT;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE payments ADD CONSTRAINT payments_amount_check CHECK (amount > 0);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_idempotency_key ON payments (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_terminal_ref ON payments (terminal_ref)
+    WHERE terminal_ref IS NOT NULL;
+
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS paid_at TIMESTAMP;
+
+-- Неоплаченные выполненные записи клиента — список долгов для ресепшена
+CREATE INDEX IF NOT EXISTS idx_appointments_unpaid ON appointments (client_id, id) WHERE paid_at IS NULL;
@@ -0,0 +1,47 @@
+-- Журнал изменений записей для /appointments/stream: триггер пишет событие и отправляет его в канал
+-- appointment_events (уведомление уходит только после коммита). Журнал нужен для продолжения потока
+-- после переподключения (Last-Event-ID = id события); старые события удаляет appointment_stream.prune.
+CREATE TABLE IF NOT EXISTS appointment_events (
+                                                  id BIGSERIAL PRIMARY KEY,
+                                                  appointment_id INTEGER NOT NULL,
+                                                  op TEXT NOT NULL,
+                                                  day DATE,
+                                                  old_day DATE,
+                                                  employee_id INTEGER,
+                                                  old_employee_id INTEGER,
+                                                  row JSONB NOT NULL,
+                                                  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_appointment_events_created_brin ON appointment_events USING brin (created_at);
+
+-- old_day/old_employee_id — прежние значения при UPDATE: перенос записи должен дойти и до подписчиков
+-- старого дня или мастера, чтобы запись пропала с их доски
+CREATE OR REPLACE FUNCTION appointment_events_capture() RETURNS TRIGGER AS $$
+DECLARE
+    r appointments;
+    prev_day DATE;
+    prev_employee INTEGER;
+    event appointment_events;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        prev_day := OLD.appointment_date::date;
+        prev_employee := OLD.employee_id;
+    END IF;
+    INSERT INTO appointment_events (appointment_id, op, day, old_day, employee_id, old_employee_id, row)
+    VALUES (r.id, lower(TG_OP), r.appointment_date::date, prev_day, r.employee_id, prev_employee, to_jsonb(r))
+    RETURNING * INTO event;
+    PERFORM pg_notify('appointment_events', to_jsonb(event)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_appointment_events ON appointments;
+CREATE TRIGGER trg_appointment_events
+    AFTER INSERT OR UPDATE OR DELETE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION appointment_events_capture();
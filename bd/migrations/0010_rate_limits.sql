@@ -0,0 +1,35 @@
+-- Общие для всех воркеров счётчики ограничения запросов (RATE_LIMIT_BACKEND=postgres).
+-- UNLOGGED: не пишется в WAL и не реплицируется, после сбоя очищается — для счётчиков это допустимо.
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+                                                    key TEXT PRIMARY KEY,
+                                                    tokens DOUBLE PRECISION NOT NULL,
+                                                    updated_at TIMESTAMPTZ NOT NULL
+);
+
+-- Token bucket за один вызов: пополнение за прошедшее время, списание cost, если хватает.
+-- Строка блокируется FOR UPDATE, поэтому параллельные запросы одного ключа списывают по очереди;
+-- при самой первой вставке двумя запросами сразу один из них может пройти сверх запаса.
+CREATE OR REPLACE FUNCTION rate_limit_take(p_key TEXT, p_rate DOUBLE PRECISION, p_burst DOUBLE PRECISION,
+                                           p_cost DOUBLE PRECISION)
+    RETURNS TABLE (allowed BOOLEAN, tokens DOUBLE PRECISION) AS $$
+DECLARE
+    now_ts TIMESTAMPTZ := clock_timestamp();
+    current_tokens DOUBLE PRECISION;
+    last_ts TIMESTAMPTZ;
+BEGIN
+    SELECT r.tokens, r.updated_at INTO current_tokens, last_ts FROM rate_limits r WHERE r.key = p_key FOR UPDATE;
+    IF NOT FOUND THEN
+        current_tokens := p_burst;
+        last_ts := now_ts;
+    END IF;
+    current_tokens := LEAST(p_burst, current_tokens + extract(epoch FROM now_ts - last_ts) * p_rate);
+    allowed := current_tokens >= p_cost;
+    IF allowed THEN
+        current_tokens := current_tokens - p_cost;
+    END IF;
+    INSERT INTO rate_limits AS r (key, tokens, updated_at) VALUES (p_key, current_tokens, now_ts)
+    ON CONFLICT (key) DO UPDATE SET tokens = EXCLUDED.tokens, updated_at = EXCLUDED.updated_at;
+    tokens := current_tokens;
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,119 @@
+-- Архив закрытых записей и платежей (backend/archive.py). Оперативные appointments и payments остаются
+-- обычными таблицами: на них ссылаются внешние ключи payments, reviews и part_reservations, по ним
+-- работают уникальные ключи платежей и поиск по id. Вместо секционирования горячих таблиц закрытые
+-- месяцы переносятся в архив, поэтому размер appointments/payments не растёт вместе с историей.
+-- Архивные таблицы секционированы по месяцам: выборка за период читает только свои секции.
+-- Месячные секции создаёт archive.ensure_partitions (заранее), DEFAULT — на случай пропуска.
+CREATE TABLE IF NOT EXISTS appointments_archive (
+    LIKE appointments,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, appointment_date)
+) PARTITION BY RANGE (appointment_date);
+
+CREATE TABLE IF NOT EXISTS appointments_archive_default PARTITION OF appointments_archive DEFAULT;
+CREATE INDEX IF NOT EXISTS idx_appointments_archive_date ON appointments_archive (appointment_date);
+CREATE INDEX IF NOT EXISTS idx_appointments_archive_client_date ON appointments_archive (client_id, appointment_date);
+
+-- payment_date может быть NULL (такие строки попадают в DEFAULT), поэтому без первичного ключа
+CREATE TABLE IF NOT EXISTS payments_archive (
+    LIKE payments,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (payment_date);
+
+CREATE TABLE IF NOT EXISTS payments_archive_default PARTITION OF payments_archive DEFAULT;
+CREATE INDEX IF NOT EXISTS idx_payments_archive_id ON payments_archive (id);
+CREATE INDEX IF NOT EXISTS idx_payments_archive_appointment ON payments_archive (appointment_id);
+CREATE INDEX IF NOT EXISTS idx_payments_archive_date ON payments_archive (payment_date);
+
+CREATE TABLE IF NOT EXISTS part_reservations_archive (
+    LIKE part_reservations,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_part_reservations_archive_appointment ON part_reservations_archive (appointment_id);
+
+-- Холодный уровень: секции архива, выгруженные в сжатые CSV-файлы и удалённые из БД. Месяц может
+-- выгружаться повторно, если позже в архив ушли ещё записи этого месяца (например, поздняя оплата)
+CREATE TABLE IF NOT EXISTS archive_segments (
+                                                id SERIAL PRIMARY KEY,
+                                                table_name TEXT NOT NULL,
+                                                month DATE NOT NULL,
+                                                path TEXT NOT NULL,
+                                                row_count BIGINT NOT NULL,
+                                                bytes BIGINT NOT NULL,
+                                                exported_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_segments_month ON archive_segments (table_name, month);
+
+-- Визиты и оплаты, ушедшие в архив, копятся в client_stats: пересчёт клиента читает только горячие таблицы
+ALTER TABLE client_stats ADD COLUMN IF NOT EXISTS archived_visits INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE client_stats ADD COLUMN IF NOT EXISTS archived_last_visit TIMESTAMP;
+ALTER TABLE client_stats ADD COLUMN IF NOT EXISTS archived_spent NUMERIC(12,2) NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION refresh_client_stats(p_client_id INTEGER) RETURNS VOID AS $$
+BEGIN
+    IF p_client_id IS NULL OR NOT EXISTS (SELECT 1 FROM clients WHERE id = p_client_id) THEN
+        RETURN;
+    END IF;
+    INSERT INTO client_stats AS cs (client_id, visit_count, last_visit, total_spent, avg_rating, updated_at)
+    SELECT p_client_id,
+           (SELECT count(*) FROM appointments a
+             WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено')),
+           (SELECT max(a.appointment_date) FROM appointments a
+             WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено')),
+           (SELECT COALESCE(sum(p.amount), 0) FROM payments p
+              JOIN appointments a ON a.id = p.appointment_id
+             WHERE a.client_id = p_client_id AND p.status = 'paid'),
+           (SELECT round(avg(r.rating), 2) FROM reviews r WHERE r.client_id = p_client_id),
+           CURRENT_TIMESTAMP
+    ON CONFLICT (client_id) DO UPDATE
+        SET visit_count = EXCLUDED.visit_count + cs.archived_visits,
+            last_visit = GREATEST(EXCLUDED.last_visit, cs.archived_last_visit),
+            total_spent = EXCLUDED.total_spent + cs.archived_spent,
+            avg_rating = EXCLUDED.avg_rating,
+            updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Горячие и архивные записи вместе — для пересчёта отчётов за дни, часть которых уже в архиве.
+-- Условие по appointment_date доходит до обеих частей и отсекает лишние секции архива;
+-- archived подсказывает, в какой из таблиц платежей искать оплаты записи.
+CREATE OR REPLACE VIEW appointments_all AS
+SELECT id, client_id, car_id, service_id, employee_id, appointment_date, status, paid_at, false AS archived
+FROM appointments
+UNION ALL
+SELECT id, client_id, car_id, service_id, employee_id, appointment_date, status, paid_at, true AS archived
+FROM appointments_archive;
+
+-- Перенос в архив удаляет строки из горячих таблиц, но для агрегатов, отчётов и потока записей это
+-- не удаление: archive.py выставляет SET LOCAL app.archiving = 'on', и эти триггеры не срабатывают
+DROP TRIGGER IF EXISTS trg_client_stats_appointments ON appointments;
+CREATE TRIGGER trg_client_stats_appointments
+    AFTER INSERT OR DELETE OR UPDATE OF client_id, status, appointment_date ON appointments
+    FOR EACH ROW WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_client();
+
+DROP TRIGGER IF EXISTS trg_client_stats_payments ON payments;
+CREATE TRIGGER trg_client_stats_payments
+    AFTER INSERT OR DELETE OR UPDATE OF appointment_id, amount, status ON payments
+    FOR EACH ROW WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_payment();
+
+DROP TRIGGER IF EXISTS trg_report_appointments ON appointments;
+CREATE TRIGGER trg_report_appointments
+    AFTER INSERT OR DELETE OR UPDATE ON appointments
+    FOR EACH ROW WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION report_mark_appointment();
+
+DROP TRIGGER IF EXISTS trg_report_payments ON payments;
+CREATE TRIGGER trg_report_payments
+    AFTER INSERT OR DELETE OR UPDATE ON payments
+    FOR EACH ROW WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION report_mark_payment();
+
+DROP TRIGGER IF EXISTS trg_appointment_events ON appointments;
+CREATE TRIGGER trg_appointment_events
+    AFTER INSERT OR UPDATE OR DELETE ON appointments
+    FOR EACH ROW WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION appointment_events_capture();
@@ -0,0 +1,153 @@
+-- Пересчёт client_stats без потерянных обновлений и один раз на клиента за оператор.
+-- Раньше итоги считались по снимку оператора и записывались ON CONFLICT DO UPDATE: из двух параллельных
+-- платежей клиента второй дожидался блокировки строки и затирал её итогами, в которых нет первого.
+-- Теперь строка client_stats блокируется до подсчёта: в READ COMMITTED каждый оператор функции берёт
+-- новый снимок, и после ожидания блокировки видны изменения зафиксированной параллельной транзакции.
+CREATE OR REPLACE FUNCTION refresh_client_stats(p_client_id INTEGER) RETURNS VOID AS $$
+BEGIN
+    IF p_client_id IS NULL OR NOT EXISTS (SELECT 1 FROM clients WHERE id = p_client_id) THEN
+        RETURN;
+    END IF;
+    INSERT INTO client_stats (client_id) VALUES (p_client_id) ON CONFLICT (client_id) DO NOTHING;
+    PERFORM 1 FROM client_stats WHERE client_id = p_client_id FOR UPDATE;
+    UPDATE client_stats cs
+    SET visit_count = (SELECT count(*) FROM appointments a
+                        WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено'))
+                      + cs.archived_visits,
+        last_visit = GREATEST((SELECT max(a.appointment_date) FROM appointments a
+                                WHERE a.client_id = p_client_id AND COALESCE(a.status, '') NOT IN ('cancelled', 'отменено')),
+                              cs.archived_last_visit),
+        total_spent = (SELECT COALESCE(sum(p.amount), 0) FROM payments p
+                         JOIN appointments a ON a.id = p.appointment_id
+                        WHERE a.client_id = p_client_id AND p.status = 'paid')
+                      + cs.archived_spent,
+        avg_rating = (SELECT round(avg(r.rating), 2) FROM reviews r WHERE r.client_id = p_client_id),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE cs.client_id = p_client_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Клиенты по возрастанию id: параллельные операторы блокируют строки в одном порядке
+CREATE OR REPLACE FUNCTION refresh_client_stats_many(p_client_ids INTEGER[]) RETURNS VOID AS $$
+DECLARE
+    v_client_id INTEGER;
+BEGIN
+    FOR v_client_id IN
+        SELECT DISTINCT id FROM unnest(p_client_ids) AS id WHERE id IS NOT NULL ORDER BY id
+    LOOP
+        PERFORM refresh_client_stats(v_client_id);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры уровня оператора с таблицами переходов: загрузка файла сверки из тысяч платежей одного
+-- клиента пересчитывает его один раз, а не на каждую строку. Таблицы переходов не допускаются
+-- при нескольких событиях и списке колонок UPDATE OF, поэтому триггеров по три на таблицу,
+-- а изменение нужных колонок проверяется сравнением old_rows и new_rows.
+CREATE OR REPLACE FUNCTION client_stats_by_appointments() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_client_stats_many(ARRAY(SELECT client_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_client_stats_many(ARRAY(SELECT client_id FROM old_rows));
+    ELSE
+        PERFORM refresh_client_stats_many(ARRAY(
+            SELECT unnest(ARRAY[o.client_id, n.client_id])
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (o.client_id, o.status, o.appointment_date) IS DISTINCT FROM (n.client_id, n.status, n.appointment_date)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION client_stats_by_reviews() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_client_stats_many(ARRAY(SELECT client_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_client_stats_many(ARRAY(SELECT client_id FROM old_rows));
+    ELSE
+        PERFORM refresh_client_stats_many(ARRAY(
+            SELECT unnest(ARRAY[o.client_id, n.client_id])
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (o.client_id, o.rating) IS DISTINCT FROM (n.client_id, n.rating)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION client_stats_by_payments() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_client_stats_many(ARRAY(
+            SELECT a.client_id FROM new_rows p JOIN appointments a ON a.id = p.appointment_id
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_client_stats_many(ARRAY(
+            SELECT a.client_id FROM old_rows p JOIN appointments a ON a.id = p.appointment_id
+        ));
+    ELSE
+        PERFORM refresh_client_stats_many(ARRAY(
+            SELECT a.client_id
+            FROM old_rows o JOIN new_rows n ON n.id = o.id
+            JOIN appointments a ON a.id IN (o.appointment_id, n.appointment_id)
+            WHERE (o.appointment_id, o.amount, o.status) IS DISTINCT FROM (n.appointment_id, n.amount, n.status)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_client_stats_appointments ON appointments;
+DROP TRIGGER IF EXISTS trg_client_stats_reviews ON reviews;
+DROP TRIGGER IF EXISTS trg_client_stats_payments ON payments;
+DROP FUNCTION IF EXISTS client_stats_by_client();
+DROP FUNCTION IF EXISTS client_stats_by_payment();
+
+-- Перенос в архив (app.archiving = 'on') агрегаты не пересчитывает, как и в миграции 0011
+DROP TRIGGER IF EXISTS trg_client_stats_appointments_insert ON appointments;
+CREATE TRIGGER trg_client_stats_appointments_insert
+    AFTER INSERT ON appointments REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_appointments();
+DROP TRIGGER IF EXISTS trg_client_stats_appointments_update ON appointments;
+CREATE TRIGGER trg_client_stats_appointments_update
+    AFTER UPDATE ON appointments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_appointments();
+DROP TRIGGER IF EXISTS trg_client_stats_appointments_delete ON appointments;
+CREATE TRIGGER trg_client_stats_appointments_delete
+    AFTER DELETE ON appointments REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_appointments();
+
+DROP TRIGGER IF EXISTS trg_client_stats_reviews_insert ON reviews;
+CREATE TRIGGER trg_client_stats_reviews_insert
+    AFTER INSERT ON reviews REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION client_stats_by_reviews();
+DROP TRIGGER IF EXISTS trg_client_stats_reviews_update ON reviews;
+CREATE TRIGGER trg_client_stats_reviews_update
+    AFTER UPDATE ON reviews REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION client_stats_by_reviews();
+DROP TRIGGER IF EXISTS trg_client_stats_reviews_delete ON reviews;
+CREATE TRIGGER trg_client_stats_reviews_delete
+    AFTER DELETE ON reviews REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION client_stats_by_reviews();
+
+DROP TRIGGER IF EXISTS trg_client_stats_payments_insert ON payments;
+CREATE TRIGGER trg_client_stats_payments_insert
+    AFTER INSERT ON payments REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_payments();
+DROP TRIGGER IF EXISTS trg_client_stats_payments_update ON payments;
+CREATE TRIGGER trg_client_stats_payments_update
+    AFTER UPDATE ON payments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_payments();
+DROP TRIGGER IF EXISTS trg_client_stats_payments_delete ON payments;
+CREATE TRIGGER trg_client_stats_payments_delete
+    AFTER DELETE ON payments REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT WHEN (current_setting('app.archiving', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION client_stats_by_payments();
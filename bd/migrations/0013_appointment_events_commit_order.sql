@@ -0,0 +1,33 @@
+-- id события выдаёт последовательность в порядке вставки, а не коммита: транзакция с id 100 может
+-- зафиксироваться позже транзакции с id 101, и клиент, продолживший поток с Last-Event-ID = 101,
+-- никогда не получил бы событие 100. Поэтому у события хранятся xid его транзакции и xmin снимка, в
+-- котором оно вставлено: любое событие с меньшим id, ещё не зафиксированное к моменту коммита этого,
+-- принадлежит транзакции с xid >= xact_xmin (appointment_stream.backlog досылает такие события).
+ALTER TABLE appointment_events ADD COLUMN IF NOT EXISTS xact_id xid8;
+ALTER TABLE appointment_events ADD COLUMN IF NOT EXISTS xact_xmin xid8;
+
+CREATE OR REPLACE FUNCTION appointment_events_capture() RETURNS TRIGGER AS $$
+DECLARE
+    r appointments;
+    prev_day DATE;
+    prev_employee INTEGER;
+    event appointment_events;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        prev_day := OLD.appointment_date::date;
+        prev_employee := OLD.employee_id;
+    END IF;
+    INSERT INTO appointment_events (appointment_id, op, day, old_day, employee_id, old_employee_id, row,
+                                    xact_id, xact_xmin)
+    VALUES (r.id, lower(TG_OP), r.appointment_date::date, prev_day, r.employee_id, prev_employee, to_jsonb(r),
+            pg_current_xact_id(), pg_snapshot_xmin(pg_current_snapshot()))
+    RETURNING * INTO event;
+    PERFORM pg_notify('appointment_events', to_jsonb(event)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
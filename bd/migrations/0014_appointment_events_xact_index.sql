@@ -0,0 +1,3 @@
+-- no-transaction
+-- Досылка событий транзакций, не зафиксированных к моменту курсора (appointment_stream.backlog)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_appointment_events_xact_id ON appointment_events (xact_id);
@@ -0,0 +1,10 @@
+-- Номер и время последнего пересчёта агрегатов отчётов — общие для всех воркеров: пересчёт выполняет
+-- тот, кто взял advisory lock (rollups.refresh), а кэш отчётов и X-Report-Refreshed-At нужны в каждом
+CREATE TABLE IF NOT EXISTS report_refresh_state (
+                                                    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                                                    generation BIGINT NOT NULL DEFAULT 0,
+                                                    refreshed_at TIMESTAMP,
+                                                    last_days INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO report_refresh_state (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
@@ -17,9 +17,9 @@ INSERT INTO categories (name) VALUES
 
 -- Услуги
 INSERT INTO services (category_id, name, description, price, duration) VALUES
-                                                                           (1, 'Oil Change', 'Engine oil and filter change', 29.99, '01:00:00'),
-                                                                           (2, 'Tire Rotation', 'Rotation of all four tires', 19.99, '00:30:00'),
-                                                                           (3, 'Brake Inspection', 'Brake pads and fluids inspection', 39.99, '01:15:00');
+                                                                           (1, 'Oil Change', 'Engine oil and filter change', 29.99, 60),
+                                                                           (2, 'Tire Rotation', 'Rotation of all four tires', 19.99, 30),
+                                                                           (3, 'Brake Inspection', 'Brake pads and fluids inspection', 39.99, 75);
 
 -- Сотрудники
 INSERT INTO employees (first_name, last_name, role, phone, email) VALUES
@@ -50,9 +50,9 @@ INSERT INTO payments (appointment_id, amount, payment_date, payment_method, stat
                                                                                         (2, 19.99, NULL, 'cash', 'pending');
 
 -- Отзывы
-INSERT INTO reviews (appointment_id, rating, comment, created_at) VALUES
-                                                                      (1, 5, 'Отличное обслуживание!', '2023-07-02 10:00'),
-                                                                      (2, 4, 'Все хорошо, но немного долго.', '2023-07-11 16:00');
+INSERT INTO reviews (appointment_id, client_id, rating, comment, created_at) VALUES
+                                                                      (1, 1, 5, 'Отличное обслуживание!', '2023-07-02 10:00'),
+                                                                      (2, 1, 4, 'Все хорошо, но немного долго.', '2023-07-11 16:00');
 
 -- Пользователи системы (пример)
 INSERT INTO users (username, password_hash, full_name, email, role) VALUES
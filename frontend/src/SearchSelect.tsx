@@ -0,0 +1,85 @@
+import React, { useEffect, useRef, useState } from "react";
+import { search } from "./api";
+import { SearchResult } from "./types";
+
+// Выбор клиента или автомобиля по поиску (GET /search) вместо <select> со всей таблицей
+const MIN_QUERY = 2;
+const DEBOUNCE_MS = 250;
+
+interface SearchSelectProps {
+    type: "client" | "car" | "part";
+    placeholder: string;
+    value: SearchResult | null;
+    onChange: (value: SearchResult | null) => void;
+}
+
+const SEARCH_TYPES = { client: "clients", car: "cars", part: "parts" };
+
+const SearchSelect: React.FC<SearchSelectProps> = ({ type, placeholder, value, onChange }) => {
+    const [query, setQuery] = useState("");
+    const [options, setOptions] = useState<SearchResult[]>([]);
+    const [open, setOpen] = useState(false);
+    const typing = useRef(false);
+
+    // Сброс выбора снаружи (после отправки формы) очищает и поле; сброс из-за ввода — нет
+    useEffect(() => {
+        if (value === null && !typing.current) setQuery("");
+        typing.current = false;
+    }, [value]);
+
+    useEffect(() => {
+        const q = query.trim();
+        if (!open || q.length < MIN_QUERY) {
+            setOptions([]);
+            return;
+        }
+        let cancelled = false;
+        const timer = setTimeout(() => {
+            search(q, [SEARCH_TYPES[type]], 10)
+                .then(results => { if (!cancelled) setOptions(results); })
+                .catch(() => { if (!cancelled) setOptions([]); });
+        }, DEBOUNCE_MS);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [query, open, type]);
+
+    const choose = (option: SearchResult) => {
+        onChange(option);
+        setQuery(option.subtitle ? `${option.title} (${option.subtitle})` : option.title);
+        setOpen(false);
+    };
+
+    return (
+        <div className="search-select">
+            <input
+                type="text"
+                placeholder={placeholder}
+                value={query}
+                onChange={e => {
+                    setQuery(e.target.value);
+                    setOpen(true);
+                    if (value) {
+                        typing.current = true;
+                        onChange(null);
+                    }
+                }}
+                onFocus={() => setOpen(true)}
+                onBlur={() => setTimeout(() => setOpen(false), 150)}
+            />
+            {open && options.length > 0 && (
+                <ul className="search-select-options">
+                    {options.map(option => (
+                        <li key={option.id} onMouseDown={() => choose(option)}>
+                            {option.title}
+                            {option.subtitle && <span className="search-select-subtitle"> {option.subtitle}</span>}
+                        </li>
+                    ))}
+                </ul>
+            )}
+        </div>
+    );
+};
+
+export default SearchSelect;
@@ -1,5 +1,5 @@
 // src/api.ts
-import { Employee, Part } from './types';
+import { Employee, Part, Category, SearchResult, DayViewAppointment } from './types';
 import { Client, Car, Service, Appointment, LoginResponse, Review } from './types';
 
 export const API_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
@@ -16,6 +16,103 @@ function getToken(): string | null {
     return null;
 }
 
+// ----------- РЕПЛИКИ ------------
+// Ответ на изменение несёт метку X-Read-After; чтения передают её обратно, и сервер не отправит их
+// на реплику, которая ещё не получила это изменение
+export const READ_AFTER_HEADER = "X-Read-After";
+
+let readAfter: string | null = null;
+
+function rememberWrite(resp: Response): void {
+    const mark = resp.headers.get(READ_AFTER_HEADER);
+    if (mark) readAfter = mark;
+}
+
+function readHeaders(): Record<string, string> {
+    const headers: Record<string, string> = { "Authorization": `Bearer ${getToken()}` };
+    if (readAfter) headers[READ_AFTER_HEADER] = readAfter;
+    return headers;
+}
+
+// ----------- ПАГИНАЦИЯ ------------
+export const NEXT_CURSOR_HEADER = "X-Next-Cursor";
+// id последнего события потока записей на момент чтения списка (только GET /appointments)
+export const STREAM_CURSOR_HEADER = "X-Stream-Cursor";
+
+export type QueryParams = Record<string, string | number | number[] | undefined | null>;
+
+export interface Page<T> {
+    items: T[];
+    nextCursor: string | null;
+    streamCursor?: string | null;
+}
+
+function buildQuery(params: QueryParams): string {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+        if (Array.isArray(value)) value.forEach(item => query.append(key, String(item)));
+        else if (value !== undefined && value !== null && value !== "") query.append(key, String(value));
+    });
+    const str = query.toString();
+    return str ? `?${str}` : "";
+}
+
+// Одна страница списка: фильтры и limit/sort/order передаются в params, курсор следующей страницы приходит в заголовке
+export async function fetchPage<T>(path: string, params: QueryParams = {}, cursor?: string | null): Promise<Page<T>> {
+    const resp = await fetch(`${API_URL}${path}${buildQuery({ ...params, cursor })}`, {
+        headers: readHeaders()
+    });
+    if (!resp.ok) throw new Error(`Ошибка сервера: ${resp.status}`);
+    return {
+        items: await resp.json(),
+        nextCursor: resp.headers.get(NEXT_CURSOR_HEADER),
+        streamCursor: resp.headers.get(STREAM_CURSOR_HEADER),
+    };
+}
+
+// Все страницы подряд — только для небольших справочников (услуги, категории, сотрудники);
+// таблицы клиентов, авто, записей, запчастей и отзывов читаются по странице (usePagedList)
+export async function fetchAll<T>(path: string, params: QueryParams = {}): Promise<T[]> {
+    const items: T[] = [];
+    let cursor: string | null = null;
+    do {
+        const page: Page<T> = await fetchPage<T>(path, params, cursor);
+        items.push(...page.items);
+        cursor = page.nextCursor;
+    } while (cursor);
+    return items;
+}
+
+async function fetchList<T>(path: string, params: QueryParams, errorMessage: string): Promise<T[]> {
+    try {
+        return await fetchAll<T>(path, params);
+    } catch {
+        throw new Error(errorMessage);
+    }
+}
+
+async function fetchOnePage<T>(
+    path: string, params: QueryParams, cursor: string | null | undefined, errorMessage: string
+): Promise<Page<T>> {
+    try {
+        return await fetchPage<T>(path, params, cursor);
+    } catch {
+        throw new Error(errorMessage);
+    }
+}
+
+// Строки по списку id (?id=1&id=2) — подписи для видимой страницы таблицы без загрузки всего справочника
+const IDS_PER_REQUEST = 100;
+
+async function fetchByIds<T>(path: string, ids: number[], errorMessage: string): Promise<T[]> {
+    const chunks: number[][] = [];
+    for (let i = 0; i < ids.length; i += IDS_PER_REQUEST) chunks.push(ids.slice(i, i + IDS_PER_REQUEST));
+    const pages = await Promise.all(
+        chunks.map(chunk => fetchOnePage<T>(path, { id: chunk, limit: chunk.length }, null, errorMessage))
+    );
+    return pages.flatMap(page => page.items);
+}
+
 // ----------- АВТОРИЗАЦИЯ ------------
 export async function login(username: string, password: string): Promise<LoginResponse> {
     const response = await fetch(`${API_URL}/auth/login`, {
@@ -34,16 +131,17 @@ export async function register(username: string, password: string): Promise<any>
         body: JSON.stringify({ username, password }),
     });
     if (!resp.ok) throw new Error("Ошибка регистрации");
+    rememberWrite(resp);
     return resp.json();
 }
 
 // ----------- КЛИЕНТЫ ------------
-export async function getClients(): Promise<Client[]> {
-    const resp = await fetch(`${API_URL}/clients`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки клиентов");
-    return resp.json();
+export async function getClients(params: QueryParams = {}, cursor?: string | null): Promise<Page<Client>> {
+    return fetchOnePage<Client>("/clients", params, cursor, "Ошибка загрузки клиентов");
+}
+
+export async function getClientsByIds(ids: number[]): Promise<Client[]> {
+    return fetchByIds<Client>("/clients", ids, "Ошибка загрузки клиентов");
 }
 
 export async function createClient(
@@ -60,16 +158,17 @@ export async function createClient(
         body: JSON.stringify({ first_name, last_name, phone, email, client_type, discount }),
     });
     if (!resp.ok) throw new Error('Не удалось создать клиента');
+    rememberWrite(resp);
     return resp.json();
 }
 
 // ----------- АВТО ------------
-export async function getCars() {
-    const resp = await fetch(`${API_URL}/cars`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки авто");
-    return resp.json();
+export async function getCars(params: QueryParams = {}, cursor?: string | null): Promise<Page<Car>> {
+    return fetchOnePage<Car>("/cars", params, cursor, "Ошибка загрузки авто");
+}
+
+export async function getCarsByIds(ids: number[]): Promise<Car[]> {
+    return fetchByIds<Car>("/cars", ids, "Ошибка загрузки авто");
 }
 
 export async function createCar(
@@ -92,17 +191,14 @@ export async function createCar(
         body: JSON.stringify({ client_id, make, model, year, license_plate, vin, color, mileage, status }),
     });
     if (!resp.ok) throw new Error("Ошибка создания авто");
+    rememberWrite(resp);
     return resp.json();
 }
 
 
 // ----------- УСЛУГИ ------------
-export async function getServices(): Promise<Service[]> {
-    const resp = await fetch(`${API_URL}/services`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки услуг. Проверьте авторизацию.");
-    return resp.json();
+export async function getServices(params: QueryParams = {}): Promise<Service[]> {
+    return fetchList<Service>("/services", params, "Ошибка загрузки услуг. Проверьте авторизацию.");
 }
 
 export async function createService(
@@ -121,20 +217,19 @@ export async function createService(
         body: JSON.stringify({ name, price, description, category_id, duration }),
     });
     if (!resp.ok) throw new Error("Ошибка создания услуги");
+    rememberWrite(resp);
     return resp.json();
 }
 
 
 // ----------- ЗАПИСИ ------------
-export async function getAppointments(): Promise<Appointment[]> {
-    const resp = await fetch(`${API_URL}/appointments`, {
-        headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${getToken()}`,
-        },
-    });
-    if (!resp.ok) throw new Error('Не удалось загрузить список записей');
-    return resp.json();
+export async function getAppointments(params: QueryParams = {}, cursor?: string | null): Promise<Page<Appointment>> {
+    return fetchOnePage<Appointment>("/appointments", params, cursor, 'Не удалось загрузить список записей');
+}
+
+// Все записи одного клиента — для выбора записи в форме отзыва
+export async function getClientAppointments(clientId: number): Promise<Appointment[]> {
+    return fetchList<Appointment>("/appointments", { client_id: clientId }, 'Не удалось загрузить записи клиента');
 }
 
 export async function createAppointment(
@@ -153,18 +248,45 @@ export async function createAppointment(
         }),
     });
     if (!resp.ok) throw new Error(`Ошибка сервера: ${resp.status}`);
+    rememberWrite(resp);
     return resp.json();
 }
 
-// ----------- СОТРУДНИКИ ------------
-export async function getEmployees() {
-    const resp = await fetch(`${API_URL}/employees`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
+export interface AppointmentEvent {
+    op: "insert" | "update" | "delete";
+    appointment: Appointment;
+}
+
+// Поток изменений вместо опроса списка. EventSource сам переподключается и передаёт Last-Event-ID,
+// сервер досылает пропущенное; onReset — пропущено слишком много, список нужно перечитать.
+// params.cursor — streamCursor первой страницы списка: изменения между чтением списка и подпиской
+// приходят из журнала, а не теряются.
+export function subscribeAppointments(
+    params: QueryParams,
+    onEvent: (event: AppointmentEvent) => void,
+    onReset: () => void
+): () => void {
+    const source = new EventSource(`${API_URL}/appointments/stream${buildQuery(params)}`);
+    source.addEventListener("appointment", e => onEvent(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener("reset", () => onReset());
+    return () => source.close();
+}
+
+// Записи дня одним запросом: клиент, автомобиль, услуга и мастер уже вложены в каждую запись.
+// fields — какие поля вернуть ("status,client.last_name,car.license_plate"), по умолчанию — поля доски.
+export async function getDayView(date: string, params: QueryParams = {}): Promise<DayViewAppointment[]> {
+    const resp = await fetch(`${API_URL}/views/day${buildQuery({ ...params, date })}`, {
+        headers: readHeaders(),
     });
-    if (!resp.ok) throw new Error("Ошибка загрузки сотрудников");
+    if (!resp.ok) throw new Error('Не удалось загрузить записи дня');
     return resp.json();
 }
 
+// ----------- СОТРУДНИКИ ------------
+export async function getEmployees(params: QueryParams = {}): Promise<Employee[]> {
+    return fetchList<Employee>("/employees", params, "Ошибка загрузки сотрудников");
+}
+
 export async function createEmployee(
     first_name: string,
     last_name: string,
@@ -181,17 +303,14 @@ export async function createEmployee(
         body: JSON.stringify({ first_name, last_name, role, phone, email }),
     });
     if (!resp.ok) throw new Error("Ошибка создания сотрудника");
+    rememberWrite(resp);
     return resp.json();
 }
 
 
 // ----------- ЗАПЧАСТИ ------------
-export async function getParts() {
-    const resp = await fetch(`${API_URL}/parts`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки запчастей");
-    return resp.json();
+export async function getParts(params: QueryParams = {}, cursor?: string | null): Promise<Page<Part>> {
+    return fetchOnePage<Part>("/parts", params, cursor, "Ошибка загрузки запчастей");
 }
 
 export async function createPart(
@@ -211,17 +330,14 @@ export async function createPart(
         body: JSON.stringify({ name, sku, stock_qty, purchase_price, sale_price, car_id }),
     });
     if (!resp.ok) throw new Error("Ошибка создания запчасти");
+    rememberWrite(resp);
     return resp.json();
 }
 
 
 // ----------- КАТЕГОРИИ ------------
-export async function getCategories() {
-    const resp = await fetch(`${API_URL}/categories`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки категорий");
-    return resp.json();
+export async function getCategories(params: QueryParams = {}): Promise<Category[]> {
+    return fetchList<Category>("/categories", params, "Ошибка загрузки категорий");
 }
 
 export async function createCategory(name: string): Promise<any> {
@@ -234,16 +350,13 @@ export async function createCategory(name: string): Promise<any> {
         body: JSON.stringify({ name }),
     });
     if (!resp.ok) throw new Error("Ошибка создания категории");
+    rememberWrite(resp);
     return resp.json();
 }
 
 // ----------- ОТЗЫВЫ ------------
-export async function getReviews(): Promise<Review[]> {
-    const resp = await fetch(`${API_URL}/reviews`, {
-        headers: { "Authorization": `Bearer ${getToken()}` }
-    });
-    if (!resp.ok) throw new Error("Ошибка загрузки отзывов");
-    return resp.json();
+export async function getReviews(params: QueryParams = {}, cursor?: string | null): Promise<Page<Review>> {
+    return fetchOnePage<Review>("/reviews", params, cursor, "Ошибка загрузки отзывов");
 }
 
 export async function createReview(
@@ -262,9 +375,15 @@ export async function createReview(
         body: JSON.stringify({ appointment_id, client_id, service_id, rating, comment }),
     });
     if (!resp.ok) throw new Error("Ошибка создания отзыва");
+    rememberWrite(resp);
     return resp.json();
 }
 
-
-
-
+// ----------- ПОИСК ------------
+export async function search(q: string, types?: string[], limit: number = 20): Promise<SearchResult[]> {
+    const resp = await fetch(`${API_URL}/search${buildQuery({ q, types: types?.join(","), limit })}`, {
+        headers: readHeaders()
+    });
+    if (!resp.ok) throw new Error("Ошибка поиска");
+    return resp.json();
+}
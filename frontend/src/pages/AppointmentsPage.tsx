@@ -1,15 +1,25 @@
 import React, { useEffect, useState } from "react";
-import { Appointment, Car, Service } from "../types";
-import { getAppointments, getCars, getServices, createAppointment } from "../api";
+import { SearchResult, Service } from "../types";
+import {
+    getAppointments, getCarsByIds, getServices, createAppointment, subscribeAppointments, AppointmentEvent
+} from "../api";
+import { usePagedList, useLookup, LoadMore } from "../paging";
+import SearchSelect from "../SearchSelect";
 import "./AppointmentsPage.css";
 
 const statusOptions = ["запланировано", "выполнено", "отменено"];
 
 const AppointmentsPage: React.FC = () => {
-    const [appointments, setAppointments] = useState<Appointment[]>([]);
-    const [cars, setCars] = useState<Car[]>([]);
+    // undefined — первая страница ещё не прочитана, подписываться рано
+    const [streamCursor, setStreamCursor] = useState<string | null | undefined>(undefined);
+    const appointments = usePagedList(async cursor => {
+        const page = await getAppointments({}, cursor);
+        if (cursor === null) setStreamCursor(page.streamCursor ?? null);
+        return page;
+    });
+    const cars = useLookup(appointments.items.map(a => a.car_id), getCarsByIds);
     const [services, setServices] = useState<Service[]>([]);
-    const [carId, setCarId] = useState<number | "">("");
+    const [car, setCar] = useState<SearchResult | null>(null);
     const [serviceId, setServiceId] = useState<number | "">("");
     const [date, setDate] = useState("");
     const [status, setStatus] = useState(statusOptions[0]);
@@ -17,18 +27,33 @@ const AppointmentsPage: React.FC = () => {
     const [error, setError] = useState<string | null>(null);
     const [success, setSuccess] = useState<string | null>(null);
 
+    const { setItems: setAppointments, reload: reloadAppointments } = appointments;
+
     useEffect(() => {
-        getAppointments().then(setAppointments).catch(() => setError("Ошибка загрузки записей"));
-        getCars().then(setCars).catch(() => setError("Ошибка загрузки автомобилей"));
         getServices().then(setServices).catch(() => setError("Ошибка загрузки услуг"));
     }, []);
 
+    useEffect(() => {
+        if (streamCursor === undefined) return;
+        // Новые записи и изменения других рабочих мест приходят событиями, без повторной загрузки списка
+        const applyEvent = ({ op, appointment }: AppointmentEvent) =>
+            setAppointments(prev => {
+                if (op === "delete") return prev.filter(a => a.id !== appointment.id);
+                const index = prev.findIndex(a => a.id === appointment.id);
+                if (index === -1) return [...prev, appointment];
+                const next = [...prev];
+                next[index] = appointment;
+                return next;
+            });
+        return subscribeAppointments({ cursor: streamCursor }, applyEvent, reloadAppointments);
+    }, [streamCursor, setAppointments, reloadAppointments]);
+
     const handleAddAppointment = async (e: React.FormEvent) => {
         e.preventDefault();
         setError(null);
         setSuccess(null);
 
-        if (!carId) {
+        if (!car) {
             setError("Выберите автомобиль");
             return;
         }
@@ -43,18 +68,19 @@ const AppointmentsPage: React.FC = () => {
 
         setLoading(true);
         try {
-            const car = cars.find(c => c.id === Number(carId));
-            if (!car) throw new Error("Автомобиль не найден");
+            // Владелец берётся из строки автомобиля: в результате поиска его нет
+            const [selected] = await getCarsByIds([car.id]);
+            if (!selected) throw new Error("Автомобиль не найден");
             const newAppointment = await createAppointment(
-                car.client_id,
-                Number(carId),
+                selected.client_id,
+                car.id,
                 Number(serviceId),
                 date,
                 undefined, // employee_id если будет нужно
                 status
             );
-            setAppointments(prev => [...prev, newAppointment]);
-            setCarId(""); setServiceId(""); setDate(""); setStatus(statusOptions[0]);
+            setAppointments(prev => prev.some(a => a.id === newAppointment.id) ? prev : [...prev, newAppointment]);
+            setCar(null); setServiceId(""); setDate(""); setStatus(statusOptions[0]);
             setSuccess("Запись добавлена!");
             setTimeout(() => setSuccess(null), 2000);
         } catch (e: any) {
@@ -67,21 +93,10 @@ const AppointmentsPage: React.FC = () => {
     return (
         <div className="page-glass">
             <h2 className="page-title">Записи на сервис</h2>
-            {error && <div className="error-message">{error}</div>}
+            {(error || appointments.error) && <div className="error-message">{error || appointments.error}</div>}
             {success && <div className="success-message">{success}</div>}
             <form className="add-form" onSubmit={handleAddAppointment}>
-                <select
-                    value={carId}
-                    onChange={e => setCarId(Number(e.target.value))}
-                    required
-                >
-                    <option value="">Автомобиль</option>
-                    {cars.map(car => (
-                        <option key={car.id} value={car.id}>
-                            {car.make} {car.model} ({car.license_plate || ""})
-                        </option>
-                    ))}
-                </select>
+                <SearchSelect type="car" placeholder="Автомобиль (госномер, VIN)" value={car} onChange={setCar} />
                 <select
                     value={serviceId}
                     onChange={e => setServiceId(Number(e.target.value))}
@@ -119,20 +134,20 @@ const AppointmentsPage: React.FC = () => {
                     </tr>
                     </thead>
                     <tbody>
-                    {appointments.length === 0 ? (
+                    {appointments.items.length === 0 ? (
                         <tr>
                             <td colSpan={5} style={{ textAlign: "center", color: "#888", padding: 16 }}>
                                 Нет записей
                             </td>
                         </tr>
                     ) : (
-                        appointments.map(appt => {
-                            const car = cars.find(c => c.id === appt.car_id);
+                        appointments.items.map(appt => {
+                            const apptCar = cars.get(appt.car_id);
                             const service = services.find(s => s.id === appt.service_id);
                             return (
                                 <tr key={appt.id}>
                                     <td>{appt.id}</td>
-                                    <td>{car ? `${car.make} ${car.model} (${car.license_plate || ""})` : appt.car_id}</td>
+                                    <td>{apptCar ? `${apptCar.make} ${apptCar.model} (${apptCar.license_plate || ""})` : appt.car_id}</td>
                                     <td>{service ? service.name : appt.service_id}</td>
                                     <td>{appt.appointment_date ? new Date(appt.appointment_date).toLocaleString() : ""}</td>
                                     <td>{appt.status}</td>
@@ -143,6 +158,7 @@ const AppointmentsPage: React.FC = () => {
                     </tbody>
                 </table>
             </div>
+            <LoadMore nextCursor={appointments.nextCursor} loading={appointments.loading} onClick={appointments.loadMore} />
         </div>
     );
 };
@@ -1,12 +1,14 @@
-import React, { useEffect, useState } from "react";
-import { Car, Client } from "../types";
-import { getCars, createCar, getClients } from "../api";
+import React, { useState } from "react";
+import { SearchResult } from "../types";
+import { getCars, createCar, getClientsByIds } from "../api";
+import { usePagedList, useLookup, LoadMore } from "../paging";
+import SearchSelect from "../SearchSelect";
 import "./CarsPage.css"; // или ./App.css если общий файл
 
 const CarsPage: React.FC = () => {
-    const [cars, setCars] = useState<Car[]>([]);
-    const [clients, setClients] = useState<Client[]>([]);
-    const [clientId, setClientId] = useState('');
+    const cars = usePagedList(cursor => getCars({}, cursor));
+    const owners = useLookup(cars.items.map(car => car.client_id), getClientsByIds);
+    const [client, setClient] = useState<SearchResult | null>(null);
     const [make, setMake] = useState('');
     const [model, setModel] = useState('');
     const [year, setYear] = useState('');
@@ -19,19 +21,18 @@ const CarsPage: React.FC = () => {
     const [error, setError] = useState<string | null>(null);
     const [success, setSuccess] = useState<string | null>(null);
 
-    useEffect(() => {
-        getCars().then(setCars).catch(() => setError("Ошибка загрузки авто"));
-        getClients().then(setClients).catch(() => setError("Ошибка загрузки клиентов"));
-    }, []);
-
     const handleAddCar = async (e: React.FormEvent) => {
         e.preventDefault();
         setError(null);
         setSuccess(null);
+        if (!client) {
+            setError("Выберите клиента");
+            return;
+        }
         setLoading(true);
         try {
             const newCar = await createCar(
-                parseInt(clientId),
+                client.id,
                 make,
                 model,
                 year ? parseInt(year) : 0,
@@ -41,8 +42,8 @@ const CarsPage: React.FC = () => {
                 mileage ? parseInt(mileage) : 0,
                 status
             );
-            setCars(prev => [...prev, newCar]);
-            setClientId(''); setMake(''); setModel(''); setYear('');
+            cars.setItems(prev => [...prev, newCar]);
+            setClient(null); setMake(''); setModel(''); setYear('');
             setMileage(''); setLicensePlate(''); setVin(''); setColor(''); setStatus('active');
             setSuccess("Авто добавлено!");
             setTimeout(() => setSuccess(null), 2000);
@@ -56,17 +57,10 @@ const CarsPage: React.FC = () => {
     return (
         <div className="page-glass">
             <h2 className="page-title">Автомобили</h2>
-            {error && <div className="error-message">{error}</div>}
+            {(error || cars.error) && <div className="error-message">{error || cars.error}</div>}
             {success && <div className="success-message">{success}</div>}
             <form className="add-form" onSubmit={handleAddCar}>
-                <select value={clientId} onChange={e => setClientId(e.target.value)} required>
-                    <option value="">Клиент</option>
-                    {clients.map(client => (
-                        <option key={client.id} value={client.id}>
-                            {client.first_name} {client.last_name}
-                        </option>
-                    ))}
-                </select>
+                <SearchSelect type="client" placeholder="Клиент" value={client} onChange={setClient} />
                 <input
                     type="text"
                     placeholder="Марка"
@@ -140,15 +134,15 @@ const CarsPage: React.FC = () => {
                     </tr>
                     </thead>
                     <tbody>
-                    {cars.length === 0 ? (
+                    {cars.items.length === 0 ? (
                         <tr>
                             <td colSpan={10} style={{ textAlign: "center", color: "#888", padding: 16 }}>
                                 Нет данных
                             </td>
                         </tr>
                     ) : (
-                        cars.map(car => {
-                            const owner = clients.find(c => c.id === car.client_id);
+                        cars.items.map(car => {
+                            const owner = owners.get(car.client_id);
                             return (
                                 <tr key={car.id}>
                                     <td>{car.id}</td>
@@ -172,6 +166,7 @@ const CarsPage: React.FC = () => {
                     </tbody>
                 </table>
             </div>
+            <LoadMore nextCursor={cars.nextCursor} loading={cars.loading} onClick={cars.loadMore} />
         </div>
     );
 };
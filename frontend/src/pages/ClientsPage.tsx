@@ -1,10 +1,10 @@
-import React, { useEffect, useState } from "react";
-import { Client } from "../types";
+import React, { useState } from "react";
 import { getClients, createClient } from "../api";
+import { usePagedList, LoadMore } from "../paging";
 import "./ClientsPage.css"; // либо ./App.css если всё в одном
 
 const ClientsPage: React.FC = () => {
-    const [clients, setClients] = useState<Client[]>([]);
+    const clients = usePagedList(cursor => getClients({}, cursor));
     const [firstName, setFirstName] = useState('');
     const [lastName, setLastName] = useState('');
     const [phone, setPhone] = useState('');
@@ -15,12 +15,6 @@ const ClientsPage: React.FC = () => {
     const [error, setError] = useState<string | null>(null);
     const [success, setSuccess] = useState<string | null>(null);
 
-    useEffect(() => {
-        getClients()
-            .then(setClients)
-            .catch(() => setError("Ошибка загрузки клиентов"));
-    }, []);
-
     const handleAddClient = async (e: React.FormEvent) => {
         e.preventDefault();
         setError(null);
@@ -30,7 +24,7 @@ const ClientsPage: React.FC = () => {
             const newClient = await createClient(
                 firstName, lastName, phone, email, clientType, discount ? Number(discount) : undefined
             );
-            setClients(prev => [...prev, newClient]);
+            clients.setItems(prev => [...prev, newClient]);
             setFirstName(''); setLastName(''); setPhone(''); setEmail(''); setClientType(''); setDiscount('');
             setSuccess("Клиент успешно добавлен!");
             setTimeout(() => setSuccess(null), 2000);
@@ -44,7 +38,7 @@ const ClientsPage: React.FC = () => {
     return (
         <div className="page-glass">
             <h2 className="page-title">Клиенты</h2>
-            {error && <div className="error-message">{error}</div>}
+            {(error || clients.error) && <div className="error-message">{error || clients.error}</div>}
             {success && <div className="success-message">{success}</div>}
             <form className="add-form" onSubmit={handleAddClient}>
                 <input
@@ -106,14 +100,14 @@ const ClientsPage: React.FC = () => {
                     </tr>
                     </thead>
                     <tbody>
-                    {clients.length === 0 ? (
+                    {clients.items.length === 0 ? (
                         <tr>
                             <td colSpan={8} style={{ textAlign: "center", color: "#888", padding: 16 }}>
                                 Нет клиентов
                             </td>
                         </tr>
                     ) : (
-                        clients.map(client => (
+                        clients.items.map(client => (
                             <tr key={client.id}>
                                 <td>{client.id}</td>
                                 <td>{client.first_name}</td>
@@ -129,6 +123,7 @@ const ClientsPage: React.FC = () => {
                     </tbody>
                 </table>
             </div>
+            <LoadMore nextCursor={clients.nextCursor} loading={clients.loading} onClick={clients.loadMore} />
         </div>
     );
 };
@@ -1,10 +1,13 @@
-import React, { useEffect, useState } from "react";
+import React, { useState } from "react";
 import "./PartsPage.css";
-import { getParts, createPart, getCars } from "../api";
-import { Part, Car } from "../types";
+import { getParts, createPart, getCarsByIds } from "../api";
+import { SearchResult } from "../types";
+import { usePagedList, useLookup, LoadMore } from "../paging";
+import SearchSelect from "../SearchSelect";
 
 const PartsPage: React.FC = () => {
-    const [parts, setParts] = useState<Part[]>([]);
+    const parts = usePagedList(cursor => getParts({}, cursor));
+    const cars = useLookup(parts.items.map(part => part.car_id), getCarsByIds);
     const [name, setName] = useState("");
     const [sku, setSku] = useState("");
     const [quantityInStock, setQuantityInStock] = useState("");
@@ -13,17 +16,15 @@ const PartsPage: React.FC = () => {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState<string | null>(null);
     const [success, setSuccess] = useState<string | null>(null);
-    const [carId, setCarId] = useState<number | "">("");
-    const [cars, setCars] = useState<Car[]>([]);
-
-    useEffect(() => {
-        getParts().then(setParts).catch(() => setError("Ошибка загрузки запчастей"));
-        getCars().then(setCars).catch(() => setError("Ошибка загрузки автомобилей"));
-    }, []);
+    const [car, setCar] = useState<SearchResult | null>(null);
 
     const handleSubmit = async (e: React.FormEvent) => {
         e.preventDefault();
         setError(null);
+        if (!car) {
+            setError("Выберите автомобиль");
+            return;
+        }
         setLoading(true);
         try {
             const newPart = await createPart(
@@ -32,10 +33,10 @@ const PartsPage: React.FC = () => {
                 Number(quantityInStock),
                 Number(purchasePrice),
                 Number(salePrice),
-                Number(carId)
+                car.id
             );
-            setParts(prev => [...prev, newPart]);
-            setName(""); setSku(""); setQuantityInStock(""); setPurchasePrice(""); setSalePrice(""); setCarId("");
+            parts.setItems(prev => [...prev, newPart]);
+            setName(""); setSku(""); setQuantityInStock(""); setPurchasePrice(""); setSalePrice(""); setCar(null);
             setSuccess("Запчасть добавлена!");
             setTimeout(() => setSuccess(null), 2000);
         } catch (e: any) {
@@ -48,7 +49,7 @@ const PartsPage: React.FC = () => {
     return (
         <div className="page-glass">
             <h2 className="page-title">Склад запчастей</h2>
-            {error && <div className="error-message">{error}</div>}
+            {(error || parts.error) && <div className="error-message">{error || parts.error}</div>}
             {success && <div className="success-message">{success}</div>}
             <form className="add-form" onSubmit={handleSubmit}>
                 <input
@@ -87,18 +88,7 @@ const PartsPage: React.FC = () => {
                     value={salePrice}
                     onChange={e => setSalePrice(e.target.value)}
                 />
-                <select
-                    value={carId}
-                    onChange={e => setCarId(Number(e.target.value))}
-                    required
-                >
-                    <option value="">Автомобиль</option>
-                    {cars.map(car => (
-                        <option key={car.id} value={car.id}>
-                            {car.make} {car.model} ({car.license_plate})
-                        </option>
-                    ))}
-                </select>
+                <SearchSelect type="car" placeholder="Автомобиль (госномер, VIN)" value={car} onChange={setCar} />
                 <button type="submit" disabled={loading}>
                     {loading ? "Добавление..." : "Добавить"}
                 </button>
@@ -117,15 +107,15 @@ const PartsPage: React.FC = () => {
                     </tr>
                     </thead>
                     <tbody>
-                    {parts.length === 0 ? (
+                    {parts.items.length === 0 ? (
                         <tr>
                             <td colSpan={7} style={{ textAlign: "center", color: "#888", padding: 16 }}>
                                 Нет запчастей
                             </td>
                         </tr>
                     ) : (
-                        parts.map(part => {
-                            const car = cars.find(c => c.id === part.car_id);
+                        parts.items.map(part => {
+                            const partCar = cars.get(part.car_id);
                             return (
                                 <tr key={part.id}>
                                     <td>{part.id}</td>
@@ -134,7 +124,7 @@ const PartsPage: React.FC = () => {
                                     <td>{part.stock_qty}</td>
                                     <td>{part.purchase_price}</td>
                                     <td>{part.sale_price}</td>
-                                    <td>{car ? `${car.make} ${car.model}` : "—"}</td>
+                                    <td>{partCar ? `${partCar.make} ${partCar.model}` : "—"}</td>
                                 </tr>
                             );
                         })
@@ -142,6 +132,7 @@ const PartsPage: React.FC = () => {
                     </tbody>
                 </table>
             </div>
+            <LoadMore nextCursor={parts.nextCursor} loading={parts.loading} onClick={parts.loadMore} />
         </div>
     );
 };
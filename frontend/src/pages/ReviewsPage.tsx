@@ -1,15 +1,15 @@
 import React, { useEffect, useState } from "react";
-import { getReviews, createReview, getClients, getServices } from "../api";
-import { Review, Client, Service } from "../types";
+import { getReviews, createReview, getClientsByIds, getServices, getClientAppointments } from "../api";
+import { Service, SearchResult, Appointment } from "../types";
 import "./ReviewsPage.css";
-import { getAppointments } from "../api";
-import { Appointment } from "../types";
+import { usePagedList, useLookup, LoadMore } from "../paging";
+import SearchSelect from "../SearchSelect";
 
 const ReviewsPage: React.FC = () => {
-    const [reviews, setReviews] = useState<Review[]>([]);
-    const [clients, setClients] = useState<Client[]>([]);
+    const reviews = usePagedList(cursor => getReviews({}, cursor));
+    const clients = useLookup(reviews.items.map(r => r.client_id), getClientsByIds);
     const [services, setServices] = useState<Service[]>([]);
-    const [clientId, setClientId] = useState<number | "">("");
+    const [client, setClient] = useState<SearchResult | null>(null);
     const [serviceId, setServiceId] = useState<number | "">("");
     const [rating, setRating] = useState<number | "">("");
     const [comment, setComment] = useState("");
@@ -20,25 +20,36 @@ const ReviewsPage: React.FC = () => {
     const [appointments, setAppointments] = useState<Appointment[]>([]);
 
     useEffect(() => {
-        getReviews().then(setReviews).catch(() => setError("Ошибка загрузки отзывов"));
-        getClients().then(setClients).catch(() => setError("Ошибка загрузки клиентов"));
         getServices().then(setServices).catch(() => setError("Ошибка загрузки услуг"));
-        getAppointments().then(setAppointments).catch(() => setError("Ошибка загрузки записей"));
     }, []);
 
+    // Записи для выбора — только выбранного клиента
+    useEffect(() => {
+        setAppointmentId("");
+        if (!client) {
+            setAppointments([]);
+            return;
+        }
+        getClientAppointments(client.id).then(setAppointments).catch(() => setError("Ошибка загрузки записей"));
+    }, [client]);
+
     const handleSubmit = async (e: React.FormEvent) => {
         e.preventDefault();
         setError(null);
+        if (!client) {
+            setError("Выберите клиента");
+            return;
+        }
         setLoading(true);
         try {
             const newReview = await createReview(
                 Number(appointmentId),
-                Number(clientId),
+                client.id,
                 Number(serviceId),
                 Number(rating),
                 comment
             );
-            setReviews(prev => [...prev, newReview]);
+            reviews.setItems(prev => [...prev, newReview]);
             setAppointmentId(""); setRating(""); setComment("");
         } catch (e: any) {
             setError(e.message || "Ошибка добавления");
@@ -50,21 +61,10 @@ const ReviewsPage: React.FC = () => {
     return (
         <div className="page-glass">
             <h2 className="page-title">Отзывы клиентов</h2>
-            {error && <div className="error-message">{error}</div>}
+            {(error || reviews.error) && <div className="error-message">{error || reviews.error}</div>}
             {success && <div className="success-message">{success}</div>}
             <form className="add-form" onSubmit={handleSubmit}>
-                <select
-                    value={clientId}
-                    onChange={e => setClientId(Number(e.target.value))}
-                    required
-                >
-                    <option value="">Клиент</option>
-                    {clients.map(client => (
-                        <option key={client.id} value={client.id}>
-                            {client.first_name} {client.last_name}
-                        </option>
-                    ))}
-                </select>
+                <SearchSelect type="client" placeholder="Клиент" value={client} onChange={setClient} />
                 <select
                     value={appointmentId}
                     onChange={e => setAppointmentId(e.target.value)}
@@ -121,18 +121,18 @@ const ReviewsPage: React.FC = () => {
                     </tr>
                     </thead>
                     <tbody>
-                    {reviews.length === 0 ? (
+                    {reviews.items.length === 0 ? (
                         <tr>
                             <td colSpan={6} style={{ textAlign: "center", color: "#888", padding: 16 }}>
                                 Нет отзывов
                             </td>
                         </tr>
                     ) : (
-                        reviews.map(r => (
+                        reviews.items.map(r => (
                             <tr key={r.id}>
                                 <td>{r.id}</td>
-                                <td>{clients.find(c => c.id === r.client_id)
-                                    ? `${clients.find(c => c.id === r.client_id)?.first_name} ${clients.find(c => c.id === r.client_id)?.last_name}`
+                                <td>{clients.get(r.client_id)
+                                    ? `${clients.get(r.client_id)?.first_name} ${clients.get(r.client_id)?.last_name}`
                                     : "—"}</td>
                                 <td>{services.find(s => s.id === r.service_id)?.name || "—"}</td>
                                 <td>{r.rating}</td>
@@ -144,6 +144,7 @@ const ReviewsPage: React.FC = () => {
                     </tbody>
                 </table>
             </div>
+            <LoadMore nextCursor={reviews.nextCursor} loading={reviews.loading} onClick={reviews.loadMore} />
         </div>
     );
 };
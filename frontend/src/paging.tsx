@@ -0,0 +1,95 @@
+import React, { useCallback, useEffect, useRef, useState } from "react";
+import { Page } from "./api";
+
+// Таблица по страницам: при открытии — первая страница, дальше — «Показать ещё» по X-Next-Cursor.
+// load получает курсор (null — первая страница); reload сбрасывает список и читает его заново.
+export function usePagedList<T extends { id: number }>(load: (cursor: string | null) => Promise<Page<T>>) {
+    const [items, setItems] = useState<T[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loading, setLoading] = useState(false);
+    const [error, setError] = useState<string | null>(null);
+    const loadRef = useRef(load);
+    loadRef.current = load;
+    // Ответ на запрос, начатый до reload, отбрасывается
+    const generation = useRef(0);
+
+    const fetchNext = useCallback(async (cursor: string | null) => {
+        const current = generation.current;
+        setLoading(true);
+        setError(null);
+        try {
+            const page = await loadRef.current(cursor);
+            if (current !== generation.current) return;
+            setItems(prev => {
+                if (cursor === null) return page.items;
+                // строка, добавленная на этой странице раньше (создана здесь или пришла событием), не дублируется
+                const seen = new Set(prev.map(item => item.id));
+                return [...prev, ...page.items.filter(item => !seen.has(item.id))];
+            });
+            setNextCursor(page.nextCursor);
+        } catch (e: any) {
+            if (current === generation.current) setError(e.message || "Ошибка загрузки");
+        } finally {
+            if (current === generation.current) setLoading(false);
+        }
+    }, []);
+
+    const reload = useCallback(() => {
+        generation.current += 1;
+        setNextCursor(null);
+        return fetchNext(null);
+    }, [fetchNext]);
+
+    const loadMore = useCallback(() => {
+        if (nextCursor) fetchNext(nextCursor);
+    }, [fetchNext, nextCursor]);
+
+    useEffect(() => {
+        reload();
+    }, [reload]);
+
+    return { items, setItems, nextCursor, loading, error, loadMore, reload };
+}
+
+// Подписи для строк загруженных страниц (владелец авто, клиент отзыва): недостающие id догружаются
+// одним запросом ?id=..., а не всем справочником
+export function useLookup<T extends { id: number }>(
+    ids: (number | null | undefined)[],
+    loadByIds: (ids: number[]) => Promise<T[]>
+): Map<number, T> {
+    const [known, setKnown] = useState<Map<number, T>>(new Map());
+    const requested = useRef(new Set<number>());
+    const loadRef = useRef(loadByIds);
+    loadRef.current = loadByIds;
+    const key = Array.from(new Set(ids.filter((id): id is number => typeof id === "number")))
+        .sort((a, b) => a - b)
+        .join(",");
+
+    useEffect(() => {
+        const missing = key ? key.split(",").map(Number).filter(id => !requested.current.has(id)) : [];
+        if (missing.length === 0) return;
+        missing.forEach(id => requested.current.add(id));
+        loadRef.current(missing)
+            .then(rows => setKnown(prev => {
+                const next = new Map(prev);
+                rows.forEach(row => next.set(row.id, row));
+                return next;
+            }))
+            .catch(() => missing.forEach(id => requested.current.delete(id)));
+    }, [key]);
+
+    return known;
+}
+
+export const LoadMore: React.FC<{ nextCursor: string | null; loading: boolean; onClick: () => void }> = ({
+    nextCursor, loading, onClick
+}) => {
+    if (!nextCursor) return null;
+    return (
+        <div className="load-more">
+            <button type="button" onClick={onClick} disabled={loading}>
+                {loading ? "Загрузка..." : "Показать ещё"}
+            </button>
+        </div>
+    );
+};
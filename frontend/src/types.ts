@@ -37,11 +37,24 @@ export interface Appointment {
     client_id: number;
     car_id: number;
     service_id: number;
+    employee_id?: number | null;
     appointment_date: string;
     status: string;
     created_at?: string;
 }
 
+// Элемент /views/day: набор полей зависит от параметра fields
+export interface DayViewAppointment {
+    id: number;
+    appointment_date: string;
+    status?: string;
+    version?: number;
+    client?: Pick<Client, "id" | "first_name" | "last_name"> & Partial<Client>;
+    car?: Pick<Car, "id" | "make" | "model"> & Partial<Car>;
+    service?: Pick<Service, "id" | "name"> & Partial<Service>;
+    employee?: Pick<Employee, "id" | "first_name" | "last_name"> | null;
+}
+
 export interface Employee {
     id: number;
     first_name: string;
@@ -60,6 +73,8 @@ export interface Part {
     purchase_price: number;
     sale_price: number;
     car_id: number;
+    reserved_qty?: number;
+    low_stock_threshold?: number;
 }
 
 export interface Category {
@@ -69,11 +84,24 @@ export interface Category {
 
 export interface Payment {
     id: number;
-    client_id: number;
-    appointment_id?: number | null; // опционально: к какой записи относится
+    appointment_id: number;
     amount: number;
     payment_date: string;
-    method?: string;                // наличные, карта, и т.д.
+    payment_method?: string | null; // cash, card, transfer
+    status: string;                 // pending, paid
+    terminal_ref?: string | null;   // номер операции терминала (файл сверки)
+    created_at?: string;
+}
+
+export interface Balance {
+    appointment_id: number;
+    client_id: number;
+    appointment_date: string;
+    status?: string | null;
+    paid_at?: string | null;
+    due: number;
+    paid: number;
+    balance: number;
 }
 
 export interface Review {
@@ -133,3 +161,10 @@ export interface Car {
 
 
 
+export interface SearchResult {
+    type: "client" | "car" | "part";
+    id: number;
+    title: string;
+    subtitle?: string | null;
+    rank: number;
+}